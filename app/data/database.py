@@ -3,8 +3,13 @@ import os
 import qrcode
 from datetime import datetime, date, time, timedelta
 
+from app.utils.rostros_utils import VERSION_ENCODING_INICIAL
+from app.utils.qr_utils import TAMANO_QR_PNG, cache_qr, generar_qr_nitido
+from app.utils.tokens_qr import generar_codigo_qr
+
 import io
 import base64
+import secrets
 import uuid
 
 BASE_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), "../.."))
@@ -137,6 +142,63 @@ class DatabaseManager:
                 FOREIGN KEY (seccion_id) REFERENCES secciones (id)
             );
                              
+            CREATE TABLE IF NOT EXISTS evidencias (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                asistencia_id INTEGER,
+                ruta TEXT NOT NULL,
+                metodo_deteccion TEXT,
+                fecha_creacion DATE DEFAULT CURRENT_DATE,
+                FOREIGN KEY (asistencia_id) REFERENCES asistencias (id) ON DELETE CASCADE
+            );
+
+            -- Contadores diarios del reconocimiento en vivo por estudiante
+            CREATE TABLE IF NOT EXISTS telemetria_reconocimiento (
+                estudiante_id INTEGER NOT NULL,
+                fecha DATE NOT NULL,
+                frames_vistos INTEGER DEFAULT 0,
+                frames_aceptados INTEGER DEFAULT 0,
+                suma_distancia REAL DEFAULT 0,
+                distancia_minima REAL,
+                confirmaciones_rostro INTEGER DEFAULT 0,
+                frames_hasta_confirmar INTEGER DEFAULT 0,
+                registros_qr INTEGER DEFAULT 0,
+                PRIMARY KEY (estudiante_id, fecha),
+                FOREIGN KEY (estudiante_id) REFERENCES estudiantes (id)
+            );
+
+            -- Avance de la re-codificación de la galería (permite reanudar)
+            CREATE TABLE IF NOT EXISTS reencodificacion_progreso (
+                version TEXT NOT NULL,
+                encoding_id INTEGER NOT NULL,
+                estado TEXT NOT NULL,
+                PRIMARY KEY (version, encoding_id)
+            );
+
+            -- Contador de cambios por tabla, lo incrementan los triggers de abajo
+            CREATE TABLE IF NOT EXISTS contadores_cambios (
+                tabla TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            );
+            INSERT OR IGNORE INTO contadores_cambios (tabla, version) VALUES ('estudiantes', 0);
+
+            CREATE TRIGGER IF NOT EXISTS trg_estudiantes_insert AFTER INSERT ON estudiantes
+            BEGIN
+                UPDATE contadores_cambios SET version = version + 1 WHERE tabla = 'estudiantes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_estudiantes_update AFTER UPDATE ON estudiantes
+            BEGIN
+                UPDATE contadores_cambios SET version = version + 1 WHERE tabla = 'estudiantes';
+            END;
+            CREATE TRIGGER IF NOT EXISTS trg_estudiantes_delete AFTER DELETE ON estudiantes
+            BEGIN
+                UPDATE contadores_cambios SET version = version + 1 WHERE tabla = 'estudiantes';
+            END;
+            -- El directorio de estudiantes también guarda el nombre de la sección
+            CREATE TRIGGER IF NOT EXISTS trg_secciones_update AFTER UPDATE OF nombre ON secciones
+            BEGIN
+                UPDATE contadores_cambios SET version = version + 1 WHERE tabla = 'estudiantes';
+            END;
+
             CREATE TABLE IF NOT EXISTS configuracion (
                 id INTEGER PRIMARY KEY CHECK (id = 1),
                 hora_entrada TIME DEFAULT '08:00:00',
@@ -145,6 +207,30 @@ class DatabaseManager:
             );
         """)
 
+        # Columnas agregadas después de la primera versión del esquema
+        self._asegurar_columna(cursor, "configuracion", "horas_entrada_adicionales", "TEXT DEFAULT ''")
+        self._asegurar_columna(cursor, "configuracion", "margen_antes_minutos", "INTEGER DEFAULT 30")
+        self._asegurar_columna(cursor, "configuracion", "margen_despues_minutos", "INTEGER DEFAULT 30")
+        self._asegurar_columna(cursor, "configuracion", "ahorro_energia", "BOOLEAN DEFAULT 1")
+        self._asegurar_columna(cursor, "configuracion", "evidencias_habilitadas", "BOOLEAN DEFAULT 1")
+        self._asegurar_columna(cursor, "configuracion", "evidencias_formato", "TEXT DEFAULT 'jpg'")
+        self._asegurar_columna(cursor, "configuracion", "dias_retencion_evidencias", "INTEGER DEFAULT 30")
+        self._asegurar_columna(cursor, "configuracion", "version_encodings_activa", f"TEXT DEFAULT '{VERSION_ENCODING_INICIAL}'")
+        self._asegurar_columna(cursor, "encodings_faciales", "version", f"TEXT DEFAULT '{VERSION_ENCODING_INICIAL}'")
+        cursor.execute("CREATE INDEX IF NOT EXISTS idx_encodings_version ON encodings_faciales (version, estudiante_id)")
+        self._asegurar_columna(cursor, "configuracion", "max_encodings_por_estudiante", "INTEGER DEFAULT 10")
+        self._asegurar_columna(cursor, "configuracion", "poda_automatica", "INTEGER DEFAULT 0")
+        self._asegurar_columna(cursor, "configuracion", "directorio_imagenes", "TEXT")
+        self._asegurar_columna(cursor, "configuracion", "fragmentos_matcher", "INTEGER DEFAULT 0")
+        self._asegurar_columna(cursor, "configuracion", "decodificador_qr", "TEXT DEFAULT 'pyzbar'")
+        self._asegurar_columna(cursor, "configuracion", "etapas_concurrentes", "BOOLEAN DEFAULT 1")
+        self._asegurar_columna(cursor, "configuracion", "secreto_qr", "TEXT")
+        self._asegurar_columna(cursor, "asistencias", "evento_clave", "TEXT")
+        cursor.execute("""
+            CREATE UNIQUE INDEX IF NOT EXISTS idx_asistencias_evento
+            ON asistencias (evento_clave) WHERE evento_clave IS NOT NULL
+        """)
+
         # Insertar datos básicos
         cursor.execute("""
             INSERT OR IGNORE INTO configuracion (id, hora_entrada, tolerancia_minutos, ultima_actualizacion)
@@ -174,9 +260,37 @@ class DatabaseManager:
             (2, 2, 'Sección Única Secundaria', 'U', 30, 1) 
         ]
         cursor.executemany("INSERT OR IGNORE INTO secciones (id, grado_id, nombre, letra, capacidad, activo) VALUES (?, ?, ?, ?, ?, ?)", secciones_unicas)        
+
+        # Secreto con el que se firman los códigos QR (se genera una sola vez por colegio)
+        cursor.execute("UPDATE configuracion SET secreto_qr = ? WHERE id = 1 AND secreto_qr IS NULL", (secrets.token_hex(16),))
+        cursor.execute("SELECT secreto_qr FROM configuracion WHERE id = 1")
+        self.secreto_qr = cursor.fetchone()[0]
         conn.commit()
         conn.close()
 
+    def _asegurar_columna(self, cursor, tabla, columna, definicion):
+        """Agrega una columna a una tabla existente si todavía no existe"""
+        cursor.execute(f"PRAGMA table_info({tabla})")
+        if columna not in [fila[1] for fila in cursor.fetchall()]:
+            cursor.execute(f"ALTER TABLE {tabla} ADD COLUMN {columna} {definicion}")
+
+    # ---------------- MÉTODOS PARA CONFIGURACIÓN ---------------- #
+
+    def obtener_configuracion(self):
+        """Obtiene la configuración del sistema como diccionario"""
+        conn = self._get_connection()
+        conn.row_factory = sqlite3.Row
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT * FROM configuracion WHERE id = 1")
+            fila = cursor.fetchone()
+            return dict(fila) if fila else {}
+        except Exception as e:
+            print(f"❌ Error obteniendo configuración: {e}")
+            return {}
+        finally:
+            conn.close()
+
     # ---------------- MÉTODOS PARA SECCIONES ---------------- #
     
     def obtener_secciones(self):
@@ -396,15 +510,10 @@ class DatabaseManager:
             
             estudiante_id = cursor.lastrowid
             
-            # Generar y guardar QR único
-            qr_data, qr_img = self.generar_qr_estudiante(estudiante_id, dni, nombre, apellido)
-            
-            if qr_data:
-                cursor.execute("UPDATE estudiantes SET qr_code = ? WHERE id = ?", (qr_data, estudiante_id))
-                print(f"✅ QR guardado para estudiante {estudiante_id}: {qr_data}")
-            else:
-                print(f"⚠️ No se pudo generar QR para estudiante {estudiante_id}")
-                # No hacemos rollback, el estudiante se crea igual pero sin QR
+            # QR derivado del id: único sin consultar la base; la imagen se genera al pedirla
+            qr_data = self.codigo_qr_estudiante(estudiante_id)
+            cursor.execute("UPDATE estudiantes SET qr_code = ? WHERE id = ?", (qr_data, estudiante_id))
+            print(f"✅ QR guardado para estudiante {estudiante_id}: {qr_data}")
             
             conn.commit()
             return estudiante_id
@@ -414,15 +523,8 @@ class DatabaseManager:
             if "dni" in str(e).lower():
                 raise ValueError("El DNI ya existe en la base de datos")
             elif "qr_code" in str(e).lower():
-                # Colisión de QR, intentar nuevamente
-                print("🔄 Colisión de QR, regenerando...")
-                if 'estudiante_id' in locals():
-                    qr_data, qr_img = self.generar_qr_estudiante(estudiante_id, dni, nombre, apellido)
-                    if qr_data:
-                        cursor.execute("UPDATE estudiantes SET qr_code = ? WHERE id = ?", (qr_data, estudiante_id))
-                        conn.commit()
-                        return estudiante_id
-                raise ValueError("Error al generar código QR único")
+                # Solo posible si un código aleatorio antiguo coincide con el derivado
+                raise ValueError("El código QR generado ya pertenece a otro estudiante; corrige los QR duplicados")
             else:
                 raise ValueError(f"Error de integridad en la base de datos: {e}")
         except Exception as e:
@@ -431,6 +533,56 @@ class DatabaseManager:
             raise ValueError(f"Error al agregar estudiante: {e}")
         finally:
             conn.close()
+
+    def agregar_estudiantes_lote(self, filas):
+        """Registra varios estudiantes en una sola transacción
+        
+        filas: tuplas con las mismas columnas que agregar_estudiante (dni, nombre,
+        apellido, fecha_nacimiento, genero, telefono, email, direccion,
+        nombre_contacto_emergencia, telefono_contacto_emergencia, turno,
+        año_escolar, seccion_id). Si algún DNI ya existe o se repite no se
+        registra ninguno. Retorna los ids creados en el orden de las filas.
+        """
+        if not filas:
+            return []
+        dnis = [fila[0] for fila in filas]
+        if len(set(dnis)) != len(dnis):
+            raise ValueError("Hay DNIs repetidos en el lote")
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            existentes = set()
+            for inicio in range(0, len(dnis), 500):
+                bloque = dnis[inicio:inicio + 500]
+                cursor.execute(f"SELECT dni FROM estudiantes WHERE dni IN ({','.join('?' * len(bloque))})", bloque)
+                existentes.update(fila[0] for fila in cursor.fetchall())
+            if existentes:
+                raise ValueError(f"Los DNI ya existen en la base de datos: {', '.join(sorted(existentes))}")
+            
+            cursor.execute("SELECT COALESCE(MAX(id), 0) FROM estudiantes")
+            ultimo_id = cursor.fetchone()[0]
+            cursor.executemany("""
+                INSERT INTO estudiantes (dni, nombre, apellido, fecha_nacimiento, genero, telefono, email, direccion, nombre_contacto_emergencia, telefono_contacto_emergencia, turno, año_escolar, seccion_id)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+            """, filas)
+            
+            # Dentro de la transacción nadie más inserta: los ids nuevos son los mayores a ultimo_id
+            cursor.execute("SELECT id, dni FROM estudiantes WHERE id > ?", (ultimo_id,))
+            ids_por_dni = {dni: estudiante_id for estudiante_id, dni in cursor.fetchall()}
+            cursor.executemany("UPDATE estudiantes SET qr_code = ? WHERE id = ?",
+                               [(self.codigo_qr_estudiante(i), i) for i in ids_por_dni.values()])
+            conn.commit()
+            print(f"✅ {len(filas)} estudiantes registrados en lote")
+            return [ids_por_dni[dni] for dni in dnis]
+        except sqlite3.IntegrityError as e:
+            conn.rollback()
+            raise ValueError(f"Error de integridad en la base de datos: {e}")
+        except ValueError:
+            conn.rollback()
+            raise
+        finally:
+            conn.close()
    
     def obtener_estudiantes(self):
         conn = self._get_connection()
@@ -519,19 +671,19 @@ class DatabaseManager:
         conn.close()
         return data
 
-        def desactivar_estudiante(self, estudiante_id):
-            """Desactiva un estudiante (eliminación lógica)"""
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            try:
-                cursor.execute("UPDATE estudiantes SET activo = 0 WHERE id = ?", (estudiante_id,))
-                conn.commit()
-                return True
-            except Exception as e:
-                print("❌ Error al desactivar estudiante:", e)
-                return False
-            finally:
-                conn.close()
+    def desactivar_estudiante(self, estudiante_id):
+        """Desactiva un estudiante (eliminación lógica)"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("UPDATE estudiantes SET activo = 0 WHERE id = ?", (estudiante_id,))
+            conn.commit()
+            return True
+        except Exception as e:
+            print("❌ Error al desactivar estudiante:", e)
+            return False
+        finally:
+            conn.close()
 
     def obtener_estudiantes_activos(self):
         """Obtiene solo estudiantes activos"""
@@ -628,29 +780,39 @@ class DatabaseManager:
     
     # ---------------- MÉTODOS MODIFICADOS PARA ASISTENCIAS ---------------- #
     
-    def registrar_asistencia(self, estudiante_id, metodo_deteccion, confianza=None):
-        """Registra una asistencia con todos los campos necesarios"""
+    def registrar_asistencia(self, estudiante_id, metodo_deteccion, confianza=None, fecha_hora=None, datos_estudiante=None):
+        """Registra una asistencia con todos los campos necesarios
+        
+        fecha_hora permite registrar con la hora real del evento (p. ej. al
+        procesar una grabación); por defecto se usa la hora actual.
+        datos_estudiante: (seccion_id, nombre_completo) ya conocidos por quien
+        llama (ver DirectorioEstudiantes); evita consultar al estudiante. Solo
+        debe pasarse para estudiantes activos.
+        """
         conn = self._get_connection()
         cursor = conn.cursor()
         
         try:
             # 1. Obtener datos del estudiante y sección
-            cursor.execute("""
-                SELECT e.seccion_id, s.nombre as seccion_nombre
-                FROM estudiantes e
-                LEFT JOIN secciones s ON e.seccion_id = s.id
-                WHERE e.id = ? AND e.activo = 1
-            """, (estudiante_id,))
-            
-            estudiante_data = cursor.fetchone()
-            if not estudiante_data:
-                print(f"❌ Estudiante {estudiante_id} no encontrado o inactivo")
-                return False
+            if datos_estudiante:
+                seccion_id, nombre_completo = datos_estudiante
+            else:
+                cursor.execute("""
+                    SELECT e.seccion_id, e.nombre || ' ' || e.apellido
+                    FROM estudiantes e
+                    WHERE e.id = ? AND e.activo = 1
+                """, (estudiante_id,))
                 
-            seccion_id = estudiante_data[0]
+                estudiante_data = cursor.fetchone()
+                if not estudiante_data:
+                    print(f"❌ Estudiante {estudiante_id} no encontrado o inactivo")
+                    return False
+                    
+                seccion_id, nombre_completo = estudiante_data
             
             # 2. Verificar si ya se registró hoy (para evitar duplicados)
-            hoy = date.today()
+            momento = fecha_hora or datetime.now()
+            hoy = momento.date()
             cursor.execute("""
                 SELECT id FROM asistencias 
                 WHERE estudiante_id = ? AND fecha = ? AND metodo_deteccion = ?
@@ -668,8 +830,8 @@ class DatabaseManager:
             
             # Convertir y calcular tiempos
             hora_entrada = datetime.strptime(hora_entrada_str, '%H:%M:%S').time()
-            # Obtener hora actual como string para SQLite
-            hora_actual = datetime.now()
+            # Obtener hora del evento como string para SQLite
+            hora_actual = momento
             hora_actual_str = hora_actual.strftime('%H:%M:%S')
             hora_actual_time = hora_actual.time()  # Para comparaciones
             estado = 'presente'
@@ -694,11 +856,6 @@ class DatabaseManager:
                 confianza
             ))
             
-            # 5. Obtener nombre del estudiante para el log
-            cursor.execute("SELECT nombre, apellido FROM estudiantes WHERE id = ?", (estudiante_id,))
-            estudiante_info = cursor.fetchone()
-            nombre_completo = f"{estudiante_info[0]} {estudiante_info[1]}" if estudiante_info else "Desconocido"
-            
             conn.commit()
             print(f"✅ Asistencia registrada: {nombre_completo} - {metodo_deteccion} - {estado}")
             return True
@@ -710,6 +867,172 @@ class DatabaseManager:
         finally:
             conn.close()
 
+    def registrar_asistencias_lote(self, registros, metodo_deteccion, fecha_hora=None):
+        """Registra varias asistencias en una sola transacción
+        
+        registros: lista de (estudiante_id, confianza). Retorna los ids
+        efectivamente registrados (omite inactivos y ya registrados ese día).
+        """
+        if not registros:
+            return []
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            momento = fecha_hora or datetime.now()
+            fecha = momento.date()
+            ids = [estudiante_id for estudiante_id, _ in registros]
+            marcadores = ",".join("?" * len(ids))
+            
+            cursor.execute(f"""
+                SELECT id, seccion_id FROM estudiantes
+                WHERE id IN ({marcadores}) AND activo = 1
+            """, ids)
+            secciones = dict(cursor.fetchall())
+            
+            cursor.execute(f"""
+                SELECT estudiante_id FROM asistencias
+                WHERE fecha = ? AND estudiante_id IN ({marcadores})
+            """, [fecha] + ids)
+            ya_registrados = {fila[0] for fila in cursor.fetchall()}
+            
+            cursor.execute("SELECT hora_entrada, tolerancia_minutos FROM configuracion WHERE id=1")
+            config = cursor.fetchone()
+            hora_entrada = datetime.strptime(config[0] if config else '08:00:00', '%H:%M:%S').time()
+            hora_limite = self._calcular_hora_limite(hora_entrada, config[1] if config else 15)
+            estado = 'tardanza' if momento.time() > hora_limite else 'presente'
+            hora_str = momento.strftime('%H:%M:%S')
+            
+            filas = []
+            for estudiante_id, confianza in registros:
+                if estudiante_id not in secciones or estudiante_id in ya_registrados:
+                    continue
+                ya_registrados.add(estudiante_id)
+                filas.append((estudiante_id, secciones[estudiante_id], fecha, hora_str, metodo_deteccion, estado, confianza))
+            
+            cursor.executemany("""
+                INSERT INTO asistencias 
+                (estudiante_id, seccion_id, fecha, hora, metodo_deteccion, estado, confianza)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, filas)
+            conn.commit()
+            print(f"✅ {len(filas)} asistencias registradas en lote - {metodo_deteccion} - {estado}")
+            return [fila[0] for fila in filas]
+            
+        except sqlite3.Error as e:
+            print(f"❌ Error al registrar asistencias en lote: {e}")
+            conn.rollback()
+            return []
+        finally:
+            conn.close()
+
+    def importar_asistencias_externas(self, eventos):
+        """Importa asistencias registradas fuera de línea (kioscos) de forma idempotente
+        
+        eventos: dicts con evento_clave, estudiante_id, fecha_hora (ISO), metodo y
+        confianza. Un evento ya importado o un estudiante que ya tiene asistencia
+        ese día se omiten, así que reenviar el mismo archivo no duplica nada.
+        Retorna la cantidad de asistencias nuevas.
+        """
+        if not eventos:
+            return 0
+        
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            cursor.execute("SELECT id, seccion_id FROM estudiantes WHERE activo = 1")
+            secciones = dict(cursor.fetchall())
+            
+            cursor.execute("SELECT hora_entrada, tolerancia_minutos FROM configuracion WHERE id=1")
+            config = cursor.fetchone()
+            hora_entrada = datetime.strptime(config[0] if config else '08:00:00', '%H:%M:%S').time()
+            hora_limite = self._calcular_hora_limite(hora_entrada, config[1] if config else 15)
+            
+            fechas = sorted({datetime.fromisoformat(e['fecha_hora']).date() for e in eventos})
+            cursor.execute(f"""
+                SELECT estudiante_id, fecha FROM asistencias
+                WHERE fecha IN ({','.join('?' * len(fechas))})
+            """, fechas)
+            ya_registrados = {(fila[0], str(fila[1])) for fila in cursor.fetchall()}
+            
+            filas = []
+            for evento in sorted(eventos, key=lambda e: e['fecha_hora']):
+                momento = datetime.fromisoformat(evento['fecha_hora'])
+                clave_dia = (evento['estudiante_id'], str(momento.date()))
+                if evento['estudiante_id'] not in secciones or clave_dia in ya_registrados:
+                    continue
+                ya_registrados.add(clave_dia)
+                estado = 'tardanza' if momento.time() > hora_limite else 'presente'
+                filas.append((evento['estudiante_id'], secciones[evento['estudiante_id']], momento.date(),
+                              momento.strftime('%H:%M:%S'), evento['metodo'], estado, evento['confianza'],
+                              evento['evento_clave']))
+            
+            antes = conn.total_changes
+            cursor.executemany("""
+                INSERT OR IGNORE INTO asistencias 
+                (estudiante_id, seccion_id, fecha, hora, metodo_deteccion, estado, confianza, evento_clave)
+                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            """, filas)
+            conn.commit()
+            return conn.total_changes - antes
+            
+        except sqlite3.Error as e:
+            print(f"❌ Error importando asistencias externas: {e}")
+            conn.rollback()
+            return 0
+        finally:
+            conn.close()
+
+    # ---------------- MÉTODOS PARA EVIDENCIAS ---------------- #
+
+    def guardar_evidencia(self, estudiante_id, fecha, metodo_deteccion, ruta):
+        """Vincula una imagen de evidencia con la asistencia del estudiante en esa fecha"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                INSERT INTO evidencias (asistencia_id, ruta, metodo_deteccion, fecha_creacion)
+                SELECT id, ?, ?, ? FROM asistencias
+                WHERE estudiante_id = ? AND fecha = ? AND metodo_deteccion = ?
+                ORDER BY id DESC LIMIT 1
+            """, (ruta, metodo_deteccion, fecha, estudiante_id, fecha, metodo_deteccion))
+            conn.commit()
+            return cursor.rowcount > 0
+        except Exception as e:
+            print(f"❌ Error guardando evidencia: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def obtener_evidencias_asistencia(self, asistencia_id):
+        """Obtiene las rutas de evidencia de una asistencia"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT ruta, metodo_deteccion, fecha_creacion FROM evidencias WHERE asistencia_id = ?", (asistencia_id,))
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"❌ Error obteniendo evidencias: {e}")
+            return []
+        finally:
+            conn.close()
+
+    def eliminar_evidencias_anteriores(self, fecha_limite):
+        """Elimina en bloque los registros de evidencia anteriores a la fecha límite"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("DELETE FROM evidencias WHERE fecha_creacion < ?", (fecha_limite,))
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            print(f"❌ Error eliminando evidencias: {e}")
+            return 0
+        finally:
+            conn.close()
+
     def _calcular_hora_limite(self, hora_entrada, tolerancia_minutos):
         """Calcula la hora límite para considerar tardanza"""
         from datetime import datetime, time, timedelta
@@ -1056,85 +1379,97 @@ class DatabaseManager:
     
     # ---------------- MÉTODOS EXISTENTES ---------------- #
     
-    def generar_qr_estudiante(self, estudiante_id, dni, nombre, apellido, intento=0):
-        """Genera un código QR único para el estudiante"""
+    def codigo_qr_estudiante(self, estudiante_id):
+        """Código QR del estudiante, derivado de su id y del secreto del colegio"""
+        return generar_codigo_qr(estudiante_id, self.secreto_qr)
+
+    def generar_qr_estudiante(self, estudiante_id, dni=None, nombre=None, apellido=None):
+        """Código QR del estudiante y su imagen (la imagen se renderiza solo aquí, a pedido)"""
         try:
-            # Limitar intentos para evitar recursión infinita
-            if intento > 5:
-                print(f"❌ No se pudo generar QR único para estudiante {estudiante_id} después de 5 intentos")
-                return None, None
-                
-            # Crear datos únicos combinando múltiples elementos
-            import time
-            import hashlib
-            import random
-            
-            timestamp = int(time.time())
-            random_salt = random.randint(1000, 9999)
-            
-            unique_string = f"EST{estudiante_id:04d}-{dni}-{timestamp}-{random_salt}"
-            hash_unique = hashlib.md5(unique_string.encode()).hexdigest()[:8]
-            
-            # Formato final del QR
-            qr_data = f"EDU-{estudiante_id:04d}-{hash_unique}"
-            
-            # Verificar que este QR no exista ya en la base de datos
-            conn = self._get_connection()
-            cursor = conn.cursor()
-            cursor.execute("SELECT id FROM estudiantes WHERE qr_code = ? AND id != ?", (qr_data, estudiante_id))
-            existing = cursor.fetchone()
-            conn.close()
-            
-            # Si ya existe, generar uno nuevo
-            if existing:
-                print(f"🔄 QR duplicado detectado, regenerando... (intento {intento + 1})")
-                return self.generar_qr_estudiante(estudiante_id, dni, nombre, apellido, intento + 1)
-            
-            # Crear código QR
-            import qrcode
-            qr = qrcode.QRCode(
-                version=1,
-                error_correction=qrcode.constants.ERROR_CORRECT_L,
-                box_size=10,
-                border=4,
-            )
-            qr.add_data(qr_data)
-            qr.make(fit=True)
-            
-            qr_img = qr.make_image(fill_color="black", back_color="white")
-            
-            print(f"✅ QR generado para {nombre} {apellido}: {qr_data}")
-            return qr_data, qr_img
-            
+            qr_data = self.codigo_qr_estudiante(estudiante_id)
+            return qr_data, generar_qr_nitido(qr_data, TAMANO_QR_PNG, borde=4)
         except Exception as e:
             print(f"❌ Error generando QR para estudiante {estudiante_id}: {e}")
             return None, None
 
-    def guardar_encoding_facial(self, estudiante_id, encoding, imagen_path):
+    def guardar_encoding_facial(self, estudiante_id, encoding, imagen_path, version=None):
         import pickle
         conn = self._get_connection()
         cursor = conn.cursor()
         try:
             cursor.execute("""
-                INSERT INTO encodings_faciales (estudiante_id, encoding_data, imagen_path)
-                VALUES (?, ?, ?)
-            """, (estudiante_id, pickle.dumps(encoding), imagen_path))
+                INSERT INTO encodings_faciales (estudiante_id, encoding_data, imagen_path, version)
+                VALUES (?, ?, ?, COALESCE(?, (SELECT version_encodings_activa FROM configuracion WHERE id = 1)))
+            """, (estudiante_id, pickle.dumps(encoding), imagen_path, version))
             conn.commit()
             print(f"✅ Encoding facial guardado para estudiante {estudiante_id}")
+            return True
         except Exception as e:
             print("⚠️ Error guardando encoding facial:", e)
+            return False
         finally:
             conn.close()
 
-    def cargar_encodings_faciales(self):
+    def guardar_encodings_faciales_lote(self, filas, version=None):
+        """Guarda varios encodings con un solo executemany
+        
+        filas: lista de (estudiante_id, encoding, imagen_path). Sin version se
+        etiquetan con la versión activa de la galería.
+        """
         import pickle
+        if not filas:
+            return 0
         conn = self._get_connection()
         cursor = conn.cursor()
-        cursor.execute("""
+        try:
+            cursor.executemany("""
+                INSERT INTO encodings_faciales (estudiante_id, encoding_data, imagen_path, version)
+                VALUES (?, ?, ?, COALESCE(?, (SELECT version_encodings_activa FROM configuracion WHERE id = 1)))
+            """, [(estudiante_id, pickle.dumps(encoding), imagen_path, version) for estudiante_id, encoding, imagen_path in filas])
+            conn.commit()
+            return len(filas)
+        except Exception as e:
+            conn.rollback()
+            print("⚠️ Error guardando encodings en lote:", e)
+            return 0
+        finally:
+            conn.close()
+
+    def obtener_claves_estudiantes(self):
+        """Mapa de DNI, código QR e 'id<N>' → id de estudiante activo (para importaciones)"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT id, dni, qr_code FROM estudiantes WHERE activo = 1")
+            claves = {}
+            for estudiante_id, dni, qr_code in cursor.fetchall():
+                claves[str(dni)] = estudiante_id
+                claves[f"id{estudiante_id}"] = estudiante_id
+                if qr_code:
+                    claves[qr_code] = estudiante_id
+            return claves
+        except Exception as e:
+            print(f"❌ Error obteniendo claves de estudiantes: {e}")
+            return {}
+        finally:
+            conn.close()
+
+    def cargar_encodings_faciales(self, seccion_id=None):
+        import pickle
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        # Solo la versión activa: mezclar versiones compararía vectores incompatibles
+        query = """
             SELECT e.nombre, ef.encoding_data, ef.estudiante_id
             FROM encodings_faciales ef
             JOIN estudiantes e ON ef.estudiante_id = e.id
-        """)
+            WHERE ef.version = (SELECT version_encodings_activa FROM configuracion WHERE id = 1)
+        """
+        params = []
+        if seccion_id:
+            query += " AND e.seccion_id = ? AND e.activo = 1"
+            params.append(seccion_id)
+        cursor.execute(query, params)
         data = cursor.fetchall()
         conn.close()
 
@@ -1145,6 +1480,299 @@ class DatabaseManager:
             encodings.append(pickle.loads(enc))
         return encodings, nombres, ids
 
+    # ---------------- VERSIONES DE LA GALERÍA ---------------- #
+
+    def obtener_version_encodings_activa(self):
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("SELECT version_encodings_activa FROM configuracion WHERE id = 1")
+            fila = cursor.fetchone()
+            return fila[0] if fila and fila[0] else VERSION_ENCODING_INICIAL
+        finally:
+            conn.close()
+
+    def obtener_resumen_versiones_encodings(self):
+        """Cantidad de encodings y estudiantes por versión"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT version, COUNT(*), COUNT(DISTINCT estudiante_id)
+                FROM encodings_faciales
+                GROUP BY version
+                ORDER BY version
+            """)
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def obtener_encodings_pendientes_reencodificar(self, version_origen, version_destino):
+        """Encodings de la versión origen que aún no se procesaron para la versión destino"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT ef.id, ef.estudiante_id, ef.imagen_path
+                FROM encodings_faciales ef
+                WHERE ef.version = ?
+                AND NOT EXISTS (
+                    SELECT 1 FROM reencodificacion_progreso p
+                    WHERE p.version = ? AND p.encoding_id = ef.id
+                )
+                ORDER BY ef.id
+            """, (version_origen, version_destino))
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def guardar_lote_reencodificado(self, version, filas, checkpoint):
+        """Guarda encodings nuevos y su checkpoint en una misma transacción
+        
+        filas: (estudiante_id, encoding, imagen_path); checkpoint: (encoding_id, estado).
+        Si el proceso se interrumpe, el lote completo queda o no queda.
+        """
+        import pickle
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("""
+                INSERT INTO encodings_faciales (estudiante_id, encoding_data, imagen_path, version)
+                VALUES (?, ?, ?, ?)
+            """, [(estudiante_id, pickle.dumps(encoding), imagen_path, version) for estudiante_id, encoding, imagen_path in filas])
+            cursor.executemany("""
+                INSERT OR REPLACE INTO reencodificacion_progreso (version, encoding_id, estado)
+                VALUES (?, ?, ?)
+            """, [(version, encoding_id, estado) for encoding_id, estado in checkpoint])
+            conn.commit()
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error guardando lote re-codificado: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def contar_estudiantes_sin_version(self, version_origen, version_destino):
+        """Estudiantes con encodings en la versión origen pero ninguno en la destino"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT COUNT(DISTINCT estudiante_id) FROM encodings_faciales
+                WHERE version = ?
+                AND estudiante_id NOT IN (SELECT estudiante_id FROM encodings_faciales WHERE version = ?)
+            """, (version_origen, version_destino))
+            return cursor.fetchone()[0]
+        finally:
+            conn.close()
+
+    def activar_version_encodings(self, version):
+        """Cambia la versión activa de la galería en una sola sentencia atómica"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                UPDATE configuracion SET version_encodings_activa = ?, ultima_actualizacion = CURRENT_TIMESTAMP
+                WHERE id = 1
+            """, (version,))
+            conn.commit()
+            print(f"✅ Versión de galería activa: {version}")
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error activando versión de galería: {e}")
+            return False
+        finally:
+            conn.close()
+
+    def obtener_encodings_galeria(self, estudiante_ids=None):
+        """(id, estudiante_id, encoding) de la versión activa, ordenados por estudiante"""
+        import pickle
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            query = """
+                SELECT id, estudiante_id, encoding_data FROM encodings_faciales
+                WHERE version = (SELECT version_encodings_activa FROM configuracion WHERE id = 1)
+            """
+            params = []
+            if estudiante_ids:
+                query += f" AND estudiante_id IN ({','.join('?' * len(estudiante_ids))})"
+                params.extend(estudiante_ids)
+            query += " ORDER BY estudiante_id, id"
+            cursor.execute(query, params)
+            return [(encoding_id, estudiante_id, pickle.loads(datos)) for encoding_id, estudiante_id, datos in cursor.fetchall()]
+        finally:
+            conn.close()
+
+    def eliminar_encodings(self, encoding_ids):
+        """Elimina varios encodings en una sola transacción"""
+        if not encoding_ids:
+            return 0
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("DELETE FROM encodings_faciales WHERE id = ?", [(int(i),) for i in encoding_ids])
+            conn.commit()
+            return cursor.rowcount
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error eliminando encodings: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    # ---------------- PAQUETES DE GALERÍA (KIOSCOS) ---------------- #
+
+    def obtener_delta_galeria(self, ids_enviados=None):
+        """Encodings vigentes que el kiosco aún no tiene y la lista completa de ids vigentes
+        
+        ids_enviados: ids vigentes del paquete anterior (lo que el kiosco ya
+        tiene); None para un paquete completo. Se compara por conjunto y no
+        por el id más alto, porque una re-codificación escribe filas de la
+        versión nueva mientras la anterior sigue activa, y un estudiante
+        reactivado recupera encodings antiguos.
+        Retorna (nuevos, ids_vigentes) donde nuevos es una lista de
+        (id, estudiante_id, encoding).
+        """
+        import pickle
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            # Ids y datos se leen en la misma transacción
+            cursor.execute("BEGIN")
+            cursor.execute("""
+                SELECT ef.id FROM encodings_faciales ef
+                JOIN estudiantes e ON ef.estudiante_id = e.id
+                WHERE ef.version = (SELECT version_encodings_activa FROM configuracion WHERE id = 1)
+                AND e.activo = 1
+                ORDER BY ef.id
+            """)
+            ids_vigentes = [fila[0] for fila in cursor.fetchall()]
+            enviados = set(ids_enviados or ())
+            
+            cursor.execute("CREATE TEMP TABLE faltantes (id INTEGER PRIMARY KEY)")
+            cursor.executemany("INSERT INTO faltantes (id) VALUES (?)", [(i,) for i in ids_vigentes if i not in enviados])
+            cursor.execute("""
+                SELECT ef.id, ef.estudiante_id, ef.encoding_data
+                FROM encodings_faciales ef
+                JOIN faltantes f ON f.id = ef.id
+                ORDER BY ef.id
+            """)
+            nuevos = [(encoding_id, estudiante_id, pickle.loads(datos)) for encoding_id, estudiante_id, datos in cursor.fetchall()]
+            return nuevos, ids_vigentes
+        finally:
+            conn.close()
+
+    def obtener_directorio_kiosko(self):
+        """Estudiantes activos con los datos que necesita un kiosco fuera de línea"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT id, dni, nombre, apellido, qr_code, seccion_id
+                FROM estudiantes WHERE activo = 1
+                ORDER BY id
+            """)
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
+    def obtener_version_estudiantes(self):
+        """Contador que cambia con cada escritura en estudiantes (ver triggers)"""
+        conn = self._get_connection()
+        try:
+            fila = conn.execute("SELECT version FROM contadores_cambios WHERE tabla = 'estudiantes'").fetchone()
+            return fila[0] if fila else 0
+        finally:
+            conn.close()
+
+    def obtener_directorio_estudiantes(self):
+        """Todos los estudiantes con lo necesario para resolver QR y registrar asistencias
+        
+        Retorna la versión leída en la misma transacción que las filas, para
+        que un cambio concurrente no quede marcado como ya cargado.
+        Filas: (id, qr_code, dni, nombre, apellido, fecha_nacimiento, seccion_id, seccion_nombre, activo)
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("BEGIN")
+            cursor.execute("SELECT version FROM contadores_cambios WHERE tabla = 'estudiantes'")
+            fila = cursor.fetchone()
+            cursor.execute("""
+                SELECT e.id, e.qr_code, e.dni, e.nombre, e.apellido, e.fecha_nacimiento,
+                       e.seccion_id, s.nombre, e.activo
+                FROM estudiantes e
+                LEFT JOIN secciones s ON e.seccion_id = s.id
+                ORDER BY e.id
+            """)
+            return (fila[0] if fila else 0), cursor.fetchall()
+        finally:
+            conn.rollback()
+            conn.close()
+
+    # ---------------- TELEMETRÍA DE RECONOCIMIENTO ---------------- #
+
+    def acumular_telemetria_reconocimiento(self, filas):
+        """Suma contadores de telemetría con un solo UPSERT por lote
+        
+        filas: (estudiante_id, fecha, frames_vistos, frames_aceptados, suma_distancia,
+        distancia_minima, confirmaciones_rostro, frames_hasta_confirmar, registros_qr)
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany("""
+                INSERT INTO telemetria_reconocimiento (
+                    estudiante_id, fecha, frames_vistos, frames_aceptados, suma_distancia,
+                    distancia_minima, confirmaciones_rostro, frames_hasta_confirmar, registros_qr
+                ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (estudiante_id, fecha) DO UPDATE SET
+                    frames_vistos = frames_vistos + excluded.frames_vistos,
+                    frames_aceptados = frames_aceptados + excluded.frames_aceptados,
+                    suma_distancia = suma_distancia + excluded.suma_distancia,
+                    distancia_minima = MIN(COALESCE(distancia_minima, excluded.distancia_minima),
+                                           COALESCE(excluded.distancia_minima, distancia_minima)),
+                    confirmaciones_rostro = confirmaciones_rostro + excluded.confirmaciones_rostro,
+                    frames_hasta_confirmar = frames_hasta_confirmar + excluded.frames_hasta_confirmar,
+                    registros_qr = registros_qr + excluded.registros_qr
+            """, filas)
+            conn.commit()
+            return len(filas)
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error guardando telemetría: {e}")
+            return 0
+        finally:
+            conn.close()
+
+    def obtener_resumen_telemetria(self, dias=7):
+        """Resumen por estudiante de los últimos `dias`, los más problemáticos primero"""
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.execute("""
+                SELECT 
+                    e.id, e.nombre || ' ' || e.apellido,
+                    SUM(t.frames_vistos), SUM(t.frames_aceptados),
+                    SUM(t.suma_distancia) / NULLIF(SUM(t.frames_vistos), 0),
+                    MIN(t.distancia_minima),
+                    CAST(SUM(t.frames_hasta_confirmar) AS REAL) / NULLIF(SUM(t.confirmaciones_rostro), 0),
+                    SUM(t.confirmaciones_rostro), SUM(t.registros_qr)
+                FROM telemetria_reconocimiento t
+                JOIN estudiantes e ON t.estudiante_id = e.id
+                WHERE t.fecha >= DATE('now', 'localtime', ?)
+                GROUP BY e.id
+                ORDER BY
+                    CAST(SUM(t.registros_qr) AS REAL) / (SUM(t.registros_qr) + SUM(t.confirmaciones_rostro) + 1) DESC,
+                    SUM(t.suma_distancia) / NULLIF(SUM(t.frames_vistos), 0) DESC
+            """, (f"-{int(dias)} days",))
+            return cursor.fetchall()
+        finally:
+            conn.close()
+
     def obtener_estudiante_por_qr(self, qr_data):
         """Obtiene estudiante por código QR"""
         conn = self._get_connection()
@@ -1287,57 +1915,77 @@ class DatabaseManager:
             conn.close()
 
 
-    def verificar_y_corregir_qr_duplicados(self):
-        """Verifica y corrige códigos QR duplicados en la base de datos"""
+    def reparar_codigos_qr(self, firmar_todos=False):
+        """Asigna códigos QR a quienes no tienen y corrige duplicados en una sola transacción
+        
+        Carga todos los códigos una vez, calcula los nuevos en memoria (derivados
+        del id, ver codigo_qr_estudiante), comprueba que no choquen con ningún
+        código existente y los aplica con un executemany. En cada grupo de
+        duplicados conserva el código el estudiante de menor id.
+        firmar_todos reemplaza además los códigos aleatorios antiguos por
+        códigos firmados (los carnets impresos con el código anterior dejan de valer).
+        """
+        inicio = datetime.now()
+        resumen = {'sin_qr': 0, 'duplicados': 0, 'reemplazados': 0, 'conflictos': 0, 'tiempo': 0.0}
         conn = self._get_connection()
         cursor = conn.cursor()
-        
         try:
-            # Encontrar QR duplicados
+            cursor.execute("SELECT id, qr_code FROM estudiantes ORDER BY id")
+            filas = cursor.fetchall()
+            existentes = {qr for _, qr in filas if qr}
+            
+            vistos = set()
+            cambios = []
+            anteriores = []
+            for estudiante_id, qr_code in filas:
+                nuevo = self.codigo_qr_estudiante(estudiante_id)
+                if not qr_code:
+                    motivo = 'sin_qr'
+                elif qr_code in vistos:
+                    motivo = 'duplicados'
+                elif firmar_todos and qr_code != nuevo:
+                    motivo = 'reemplazados'
+                else:
+                    vistos.add(qr_code)
+                    continue
+                
+                if nuevo in existentes:
+                    resumen['conflictos'] += 1
+                    continue
+                existentes.add(nuevo)
+                resumen[motivo] += 1
+                cambios.append((nuevo, estudiante_id))
+                if qr_code:
+                    anteriores.append(qr_code)
+            
+            cursor.executemany("UPDATE estudiantes SET qr_code = ? WHERE id = ?", cambios)
+            # Códigos reemplazados que ya no tiene ningún estudiante (en un grupo de
+            # duplicados el código sigue siendo de quien lo conserva)
+            cursor.execute("CREATE TEMP TABLE qr_anteriores (qr_code TEXT PRIMARY KEY)")
+            cursor.executemany("INSERT OR IGNORE INTO qr_anteriores (qr_code) VALUES (?)", [(qr,) for qr in anteriores])
             cursor.execute("""
-                SELECT qr_code, COUNT(*) as count 
-                FROM estudiantes 
-                WHERE qr_code IS NOT NULL 
-                GROUP BY qr_code 
-                HAVING COUNT(*) > 1
+                SELECT qr_code FROM qr_anteriores
+                WHERE qr_code NOT IN (SELECT qr_code FROM estudiantes WHERE qr_code IS NOT NULL)
             """)
-            duplicados = cursor.fetchall()
-            
-            if not duplicados:
-                print("✅ No se encontraron QR duplicados")
-                return
-            
-            print(f"🔧 Encontrados {len(duplicados)} QR duplicados, corrigiendo...")
-            
-            for qr_code, count in duplicados:
-                # Obtener todos los estudiantes con este QR
-                cursor.execute("""
-                    SELECT id, dni, nombre, apellido 
-                    FROM estudiantes 
-                    WHERE qr_code = ? 
-                    ORDER BY id
-                """, (qr_code,))
-                estudiantes = cursor.fetchall()
-                
-                # Mantener el primer estudiante con este QR, regenerar los demás
-                for i, (est_id, dni, nombre, apellido) in enumerate(estudiantes):
-                    if i == 0:
-                        continue  # Mantener el primero
-                    
-                    # Generar nuevo QR único
-                    nuevo_qr_data, nuevo_qr_img = self.generar_qr_estudiante(est_id, dni, nombre, apellido)
-                    if nuevo_qr_data:
-                        cursor.execute("UPDATE estudiantes SET qr_code = ? WHERE id = ?", (nuevo_qr_data, est_id))
-                        print(f"✅ QR corregido para {nombre} {apellido}: {nuevo_qr_data}")
-            
+            retirados = [fila[0] for fila in cursor.fetchall()]
             conn.commit()
-            print("✅ Corrección de QR duplicados completada")
-            
         except Exception as e:
-            print(f"❌ Error corrigiendo QR duplicados: {e}")
             conn.rollback()
+            print(f"❌ Error reparando códigos QR: {e}")
+            raise
         finally:
             conn.close()
+        
+        for qr_code in retirados:
+            cache_qr.invalidar(qr_code)
+        resumen['tiempo'] = (datetime.now() - inicio).total_seconds()
+        print(f"✅ Códigos QR: {resumen['sin_qr']} asignados, {resumen['duplicados']} duplicados corregidos, "
+              f"{resumen['reemplazados']} reemplazados, {resumen['conflictos']} conflictos ({resumen['tiempo']:.2f}s)")
+        return resumen
+
+    def verificar_y_corregir_qr_duplicados(self):
+        """Verifica y corrige códigos QR duplicados en la base de datos"""
+        return self.reparar_codigos_qr()
 
     def obtener_estudiantes_con_qr(self):
         """Obtiene estudiantes que tienen QR generado"""
@@ -1358,6 +2006,54 @@ class DatabaseManager:
         finally:
             conn.close()
 
+    def obtener_qr_png(self, estudiante_id, tamano=TAMANO_QR_PNG):
+        """PNG del QR del estudiante desde la caché (memoria y disco), o None si no tiene QR"""
+        conn = self._get_connection()
+        try:
+            fila = conn.execute("SELECT qr_code FROM estudiantes WHERE id = ?", (estudiante_id,)).fetchone()
+        finally:
+            conn.close()
+        if not fila or not fila[0]:
+            return None
+        try:
+            return cache_qr.obtener_png(fila[0], tamano)
+        except Exception as e:
+            print(f"❌ Error generando imagen QR: {e}")
+            return None
+
+    def obtener_estudiantes_para_carnets(self, seccion_id=None, grado_id=None):
+        """Estudiantes activos con QR para imprimir carnets, con su foto de enrolamiento más reciente
+        
+        Filas: (id, nombre, apellido, dni, qr_code, seccion_nombre, imagen_path)
+        """
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            query = """
+                SELECT e.id, e.nombre, e.apellido, e.dni, e.qr_code, s.nombre,
+                       (SELECT ef.imagen_path FROM encodings_faciales ef
+                        WHERE ef.estudiante_id = e.id AND ef.imagen_path IS NOT NULL
+                        ORDER BY ef.id DESC LIMIT 1)
+                FROM estudiantes e
+                LEFT JOIN secciones s ON e.seccion_id = s.id
+                WHERE e.qr_code IS NOT NULL AND e.activo = 1
+            """
+            params = []
+            if seccion_id:
+                query += " AND e.seccion_id = ?"
+                params.append(seccion_id)
+            if grado_id:
+                query += " AND s.grado_id = ?"
+                params.append(grado_id)
+            query += " ORDER BY s.nombre, e.apellido, e.nombre"
+            cursor.execute(query, params)
+            return cursor.fetchall()
+        except Exception as e:
+            print(f"❌ Error obteniendo estudiantes para carnets: {e}")
+            return []
+        finally:
+            conn.close()
+
     def obtener_qr_imagen(self, estudiante_id):
         """Regenera la imagen QR para un estudiante existente"""
         conn = self._get_connection()
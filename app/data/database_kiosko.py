@@ -0,0 +1,315 @@
+import json
+import os
+import sqlite3
+import uuid
+import numpy as np
+from datetime import datetime, date, timedelta
+
+# Configuración que el kiosco copia del servidor central en cada paquete
+CLAVES_CONFIGURACION = [
+    'hora_entrada', 'tolerancia_minutos', 'horas_entrada_adicionales',
+    'margen_antes_minutos', 'margen_despues_minutos', 'ahorro_energia',
+    'version_encodings_activa', 'decodificador_qr',
+    # Permite verificar los QR firmados sin consultar al servidor central
+    'secreto_qr'
+]
+
+
+class DatabaseKiosko:
+    """Base local de un kiosco que reconoce sin conexión al servidor central
+
+    Implementa los métodos de DatabaseManager que usa AsistenciaService, pero
+    sobre una galería importada desde paquetes (ver kiosko_service) y una cola
+    local de asistencias pendientes de enviar. Cada asistencia lleva una
+    `evento_clave` estable, de modo que enviarla dos veces no la duplica.
+    """
+
+    def __init__(self, directorio, kiosko_id=None):
+        os.makedirs(directorio, exist_ok=True)
+        self.directorio = directorio
+        self.ruta = os.path.join(directorio, "kiosko.db")
+        self._init_database()
+        if kiosko_id:
+            self._guardar_meta('kiosko_id', kiosko_id)
+        elif not self._leer_meta('kiosko_id'):
+            self._guardar_meta('kiosko_id', uuid.uuid4().hex[:8])
+        self.kiosko_id = self._leer_meta('kiosko_id')
+
+    def _get_connection(self):
+        return sqlite3.connect(self.ruta)
+
+    def _init_database(self):
+        conn = self._get_connection()
+        conn.executescript("""
+            CREATE TABLE IF NOT EXISTS estudiantes (
+                id INTEGER PRIMARY KEY,
+                dni TEXT,
+                nombre TEXT,
+                apellido TEXT,
+                qr_code TEXT,
+                seccion_id INTEGER
+            );
+            CREATE INDEX IF NOT EXISTS idx_estudiantes_qr ON estudiantes (qr_code);
+
+            -- Mismos ids que encodings_faciales en el servidor central
+            CREATE TABLE IF NOT EXISTS encodings (
+                id INTEGER PRIMARY KEY,
+                estudiante_id INTEGER NOT NULL,
+                encoding BLOB NOT NULL
+            );
+
+            CREATE TABLE IF NOT EXISTS asistencias (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                evento_clave TEXT UNIQUE NOT NULL,
+                estudiante_id INTEGER NOT NULL,
+                fecha DATE NOT NULL,
+                hora TIME NOT NULL,
+                metodo_deteccion TEXT,
+                estado TEXT,
+                confianza REAL,
+                enviada INTEGER DEFAULT 0
+            );
+
+            CREATE TABLE IF NOT EXISTS meta (
+                clave TEXT PRIMARY KEY,
+                valor TEXT
+            );
+        """)
+        conn.commit()
+        conn.close()
+
+    def _leer_meta(self, clave, defecto=None):
+        conn = self._get_connection()
+        try:
+            fila = conn.execute("SELECT valor FROM meta WHERE clave = ?", (clave,)).fetchone()
+            return fila[0] if fila else defecto
+        finally:
+            conn.close()
+
+    def _guardar_meta(self, clave, valor, conn=None):
+        propia = conn is None
+        conn = conn or self._get_connection()
+        try:
+            conn.execute("INSERT OR REPLACE INTO meta (clave, valor) VALUES (?, ?)", (clave, str(valor)))
+            if propia:
+                conn.commit()
+        finally:
+            if propia:
+                conn.close()
+
+    # ---------------- PAQUETES ---------------- #
+
+    def ultimo_paquete(self):
+        return self._leer_meta('ultimo_paquete', '')
+
+    def aplicar_paquete(self, ruta_paquete):
+        """Aplica un paquete de galería (completo o delta) en una sola transacción
+
+        Un delta solo trae los encodings que faltaban respecto del paquete
+        anterior. Si tras aplicarlo algún id vigente no está en el kiosco, el
+        paquete se rechaza sin cambios (ver SincronizacionKiosko.recibir_galeria).
+        """
+        with np.load(ruta_paquete, allow_pickle=False) as paquete:
+            metadatos = json.loads(str(paquete['metadatos']))
+            encodings = paquete['encodings']
+            encoding_ids = paquete['encoding_ids']
+            estudiante_ids = paquete['estudiante_ids']
+            ids_vigentes = paquete['ids_vigentes']
+
+        conn = self._get_connection()
+        cursor = conn.cursor()
+        try:
+            cursor.executemany(
+                "INSERT OR REPLACE INTO encodings (id, estudiante_id, encoding) VALUES (?, ?, ?)",
+                [(int(i), int(e), enc.astype(np.float32).tobytes())
+                 for i, e, enc in zip(encoding_ids, estudiante_ids, encodings)]
+            )
+            # Descartar lo que ya no está vigente en el servidor (poda, re-codificación, bajas)
+            cursor.execute("CREATE TEMP TABLE vigentes (id INTEGER PRIMARY KEY)")
+            cursor.executemany("INSERT INTO vigentes (id) VALUES (?)", [(int(i),) for i in ids_vigentes])
+            cursor.execute("SELECT COUNT(*) FROM vigentes WHERE id NOT IN (SELECT id FROM encodings)")
+            faltantes = cursor.fetchone()[0]
+            if faltantes:
+                conn.rollback()
+                print(f"⚠️ Paquete {os.path.basename(ruta_paquete)}: al kiosco le faltan {faltantes} encodings vigentes")
+                return False
+            cursor.execute("DELETE FROM encodings WHERE id NOT IN (SELECT id FROM vigentes)")
+
+            cursor.execute("DELETE FROM estudiantes")
+            cursor.executemany(
+                "INSERT INTO estudiantes (id, dni, nombre, apellido, qr_code, seccion_id) VALUES (?, ?, ?, ?, ?, ?)",
+                [tuple(fila) for fila in metadatos['estudiantes']]
+            )
+
+            self._guardar_meta('configuracion', json.dumps(metadatos['configuracion']), conn)
+            self._guardar_meta('ultimo_paquete', os.path.basename(ruta_paquete), conn)
+            conn.commit()
+            print(f"📥 Paquete aplicado: {len(encoding_ids)} encodings nuevos, {len(ids_vigentes)} vigentes, "
+                  f"{len(metadatos['estudiantes'])} estudiantes")
+            return True
+        except Exception as e:
+            conn.rollback()
+            print(f"❌ Error aplicando paquete: {e}")
+            return False
+        finally:
+            conn.close()
+
+    # ---------------- INTERFAZ USADA POR AsistenciaService ---------------- #
+
+    def obtener_configuracion(self):
+        configuracion = json.loads(self._leer_meta('configuracion', '{}'))
+        # En el kiosco no hay evidencias ni procesos de búsqueda adicionales
+        configuracion.update(evidencias_habilitadas=0, fragmentos_matcher=0)
+        return configuracion
+
+    def obtener_version_encodings_activa(self):
+        return self.obtener_configuracion().get('version_encodings_activa')
+
+    def cargar_encodings_faciales(self, seccion_id=None):
+        conn = self._get_connection()
+        try:
+            query = """
+                SELECT e.nombre, enc.encoding, enc.estudiante_id
+                FROM encodings enc
+                JOIN estudiantes e ON enc.estudiante_id = e.id
+            """
+            params = []
+            if seccion_id:
+                query += " WHERE e.seccion_id = ?"
+                params.append(seccion_id)
+            filas = conn.execute(query, params).fetchall()
+        finally:
+            conn.close()
+        encodings = [np.frombuffer(datos, dtype=np.float32).astype(np.float64) for _, datos, _ in filas]
+        return encodings, [f[0] for f in filas], [f[2] for f in filas]
+
+    def obtener_estudiante_por_qr(self, qr_data):
+        """Misma forma que DatabaseManager: (id, dni, nombre, apellido, fecha_nacimiento, seccion_id, seccion_nombre)"""
+        conn = self._get_connection()
+        try:
+            fila = conn.execute(
+                "SELECT id, dni, nombre, apellido, seccion_id FROM estudiantes WHERE qr_code = ?", (qr_data,)
+            ).fetchone()
+        finally:
+            conn.close()
+        if not fila:
+            return None
+        return (fila[0], fila[1], fila[2], fila[3], None, fila[4], None)
+
+    def obtener_version_estudiantes(self):
+        # El directorio local solo cambia al aplicar un paquete
+        return self.ultimo_paquete()
+
+    def obtener_directorio_estudiantes(self):
+        """Misma forma que DatabaseManager.obtener_directorio_estudiantes"""
+        conn = self._get_connection()
+        try:
+            filas = conn.execute(
+                "SELECT id, qr_code, dni, nombre, apellido, NULL, seccion_id, NULL, 1 FROM estudiantes ORDER BY id"
+            ).fetchall()
+            version = conn.execute("SELECT valor FROM meta WHERE clave = 'ultimo_paquete'").fetchone()
+        finally:
+            conn.close()
+        return (version[0] if version else ''), filas
+
+    def _estado(self, momento):
+        configuracion = self.obtener_configuracion()
+        hora_entrada = datetime.strptime(configuracion.get('hora_entrada') or '08:00:00', '%H:%M:%S')
+        tolerancia = configuracion.get('tolerancia_minutos')
+        limite = datetime.combine(momento.date(), hora_entrada.time()) + timedelta(
+            minutes=15 if tolerancia is None else tolerancia)
+        return 'tardanza' if momento > limite else 'presente'
+
+    def evento_clave(self, estudiante_id, fecha):
+        """Una asistencia por estudiante, día y kiosco"""
+        return f"{self.kiosko_id}:{estudiante_id}:{fecha.isoformat()}"
+
+    def registrar_asistencia(self, estudiante_id, metodo_deteccion, confianza=None, fecha_hora=None, datos_estudiante=None):
+        momento = fecha_hora or datetime.now()
+        conn = self._get_connection()
+        try:
+            if not datos_estudiante and not conn.execute("SELECT 1 FROM estudiantes WHERE id = ?", (estudiante_id,)).fetchone():
+                print(f"❌ Estudiante {estudiante_id} no está en el paquete del kiosco")
+                return False
+            cursor = conn.execute("""
+                INSERT OR IGNORE INTO asistencias
+                (evento_clave, estudiante_id, fecha, hora, metodo_deteccion, estado, confianza)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+            """, (self.evento_clave(estudiante_id, momento.date()), estudiante_id, momento.date().isoformat(),
+                  momento.strftime('%H:%M:%S'), metodo_deteccion, self._estado(momento), confianza))
+            conn.commit()
+            if cursor.rowcount:
+                print(f"✅ Asistencia en cola local - {metodo_deteccion}")
+            # Igual que la base central: False si el estudiante ya tenía asistencia ese día
+            return bool(cursor.rowcount)
+        finally:
+            conn.close()
+
+    def registrar_asistencias_lote(self, registros, metodo_deteccion, fecha_hora=None):
+        registrados = []
+        for estudiante_id, confianza in registros:
+            if self.registrar_asistencia(estudiante_id, metodo_deteccion, confianza, fecha_hora):
+                registrados.append(estudiante_id)
+        return registrados
+
+    def obtener_asistencias_hoy(self):
+        """Misma forma que DatabaseManager.obtener_asistencias_hoy"""
+        conn = self._get_connection()
+        try:
+            return conn.execute("""
+                SELECT a.id, e.nombre, e.apellido, e.dni, NULL, a.hora, a.metodo_deteccion, a.confianza, a.estado
+                FROM asistencias a
+                JOIN estudiantes e ON a.estudiante_id = e.id
+                WHERE a.fecha = ?
+                ORDER BY a.hora DESC
+            """, (date.today().isoformat(),)).fetchall()
+        finally:
+            conn.close()
+
+    def obtener_estadisticas_hoy(self):
+        filas = self.obtener_asistencias_hoy()
+        return {
+            'total_asistencias': len(filas),
+            'estudiantes_unicos': len(filas),
+            'presentes': sum(1 for f in filas if f[8] == 'presente'),
+            'tardanzas': sum(1 for f in filas if f[8] == 'tardanza'),
+            'por_rostro': sum(1 for f in filas if f[6] == 'rostro'),
+            'por_qr': sum(1 for f in filas if f[6] == 'qr')
+        }
+
+    def guardar_evidencia(self, estudiante_id, fecha, metodo_deteccion, ruta):
+        return False
+
+    def eliminar_evidencias_anteriores(self, fecha_limite):
+        return 0
+
+    def acumular_telemetria_reconocimiento(self, filas):
+        # La telemetría solo se consolida en el servidor central
+        return 0
+
+    # ---------------- COLA DE ENVÍO ---------------- #
+
+    def obtener_asistencias_pendientes(self):
+        conn = self._get_connection()
+        try:
+            filas = conn.execute("""
+                SELECT evento_clave, estudiante_id, fecha, hora, metodo_deteccion, confianza
+                FROM asistencias WHERE enviada = 0 ORDER BY id
+            """).fetchall()
+        finally:
+            conn.close()
+        return [{
+            'evento_clave': clave,
+            'estudiante_id': estudiante_id,
+            'fecha_hora': f"{fecha}T{hora}",
+            'metodo': metodo,
+            'confianza': confianza
+        } for clave, estudiante_id, fecha, hora, metodo, confianza in filas]
+
+    def marcar_asistencias_enviadas(self, claves):
+        conn = self._get_connection()
+        try:
+            conn.executemany("UPDATE asistencias SET enviada = 1 WHERE evento_clave = ?", [(c,) for c in claves])
+            conn.commit()
+        finally:
+            conn.close()
@@ -1,6 +1,7 @@
 # app/main.py
 import streamlit as st
 from app.routes import dashboard_page, estudiantes_page, asistencias_page, reportes_page, configuracion_page
+from app.utils.modelos_utils import gestor_modelos
 
 PAGES = {
     "📊 Dashboard": dashboard_page,
@@ -12,6 +13,18 @@ PAGES = {
 
 st.set_page_config(page_title="Sistema de Asistencias Escolares", page_icon="🎓", layout="wide")
 
+# Cargar los modelos de reconocimiento mientras se navega por la interfaz
+gestor_modelos.precalentar()
+
 st.sidebar.title("Navegación")
 opcion = st.sidebar.radio("Selecciona una opción:", list(PAGES.keys()))
+
+estado_modelos = gestor_modelos.obtener_estado()['estado']
+if estado_modelos == gestor_modelos.LISTO:
+    st.sidebar.caption("🟢 Reconocimiento facial listo")
+elif estado_modelos == gestor_modelos.ERROR:
+    st.sidebar.caption("🔴 Reconocimiento facial no disponible")
+else:
+    st.sidebar.caption("🟡 Cargando modelos de reconocimiento...")
+
 PAGES[opcion].render()
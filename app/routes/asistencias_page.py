@@ -4,11 +4,18 @@ import numpy as np
 import pandas as pd
 from datetime import datetime
 import plotly.express as px
+import os
+import tempfile
+from app.services.video_offline_service import VideoOfflineService
+from app.utils.modelos_utils import gestor_modelos
 
 def registrar_asistencias(service, db):
     st.header("📝 Registrar Asistencias - Reconocimiento Facial + QR")
     
-    tab1, tab2, tab3 = st.tabs(["🎥 Sistema Combinado", "📊 Asistencias del Día", "🔧 Diagnóstico"])
+    tab1, tab_navegador, tab_grupal, tab_video, tab2, tab3 = st.tabs([
+        "🎥 Sistema Combinado", "📱 Cámara del Navegador", "👥 Foto Grupal", "🎞️ Video Grabado",
+        "📊 Asistencias del Día", "🔧 Diagnóstico"
+    ])
     
     with tab1:
         st.subheader("Sistema de Reconocimiento Dual")
@@ -45,16 +52,233 @@ def registrar_asistencias(service, db):
             if st.button("📊 Ver Estadísticas", width='stretch'):
                 mostrar_estadisticas(service)
     
+    with tab_navegador:
+        registrar_desde_navegador(service)
+    
+    with tab_grupal:
+        pase_lista_foto_grupal(service, db)
+    
+    with tab_video:
+        procesar_video_grabado(service)
+    
     with tab2:
         mostrar_asistencias_del_dia(service)
         
     with tab3:
         st.subheader("🔧 Diagnóstico del Sistema")
+        mostrar_estado_modelos()
+        mostrar_telemetria(db)
         if st.button("🔍 Ejecutar Diagnóstico QR", width='stretch'):
             diagnosticar_qr(service)
         if st.button("🔧 Verificar Métodos DB", width='stretch'):
             verificar_metodos_db(db)
 
+def mostrar_estado_modelos():
+    """Estado de carga de los modelos de reconocimiento facial"""
+    estado = gestor_modelos.obtener_estado()
+    etiquetas = {
+        gestor_modelos.SIN_CARGAR: "⚪ Sin cargar",
+        gestor_modelos.CARGANDO: "🟡 Cargando",
+        gestor_modelos.LISTO: "🟢 Listo",
+        gestor_modelos.ERROR: "🔴 Error"
+    }
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        st.metric("Modelos", etiquetas.get(estado['estado'], estado['estado']))
+    with col2:
+        st.metric("Carga", f"{estado['tiempo_carga']:.1f}s" if estado['tiempo_carga'] is not None else "-")
+    with col3:
+        st.metric("Precalentamiento", f"{estado['tiempo_precalentamiento']:.1f}s" if estado['tiempo_precalentamiento'] is not None else "-")
+    if estado['error']:
+        st.error(f"❌ {estado['error']}")
+
+def mostrar_telemetria(db):
+    """Estudiantes que el reconocimiento facial identifica con más dificultad"""
+    st.markdown("#### 📡 Telemetría de Reconocimiento")
+    dias = st.selectbox("Período", [1, 7, 30], index=1, format_func=lambda d: f"Últimos {d} días", key="dias_telemetria")
+    filas = db.obtener_resumen_telemetria(dias)
+    if not filas:
+        st.info("📭 Aún no hay telemetría registrada")
+        return
+    
+    df = pd.DataFrame(filas, columns=[
+        'ID', 'Estudiante', 'Frames Vistos', 'Frames Aceptados', 'Distancia Media',
+        'Distancia Mínima', 'Frames hasta Confirmar', 'Registros por Rostro', 'Registros por QR'
+    ])
+    df['% Aceptados'] = (100 * df['Frames Aceptados'] / df['Frames Vistos'].where(df['Frames Vistos'] > 0)).round(1)
+    st.caption("Ordenado por dependencia del QR y distancia media: los primeros son candidatos a re-enrolar")
+    st.dataframe(df.round(3), width='stretch', hide_index=True)
+
+def registrar_desde_navegador(service):
+    """Registro usando la cámara del dispositivo cliente (tablets/kioscos)"""
+    st.subheader("📱 Registro desde la Cámara del Navegador")
+    st.info("""
+    Usa la cámara de la tablet o del navegador en lugar de la cámara del servidor.
+    Puedes tomar una foto en vivo o subir una ráfaga de fotos; todas pasan por
+    el mismo reconocimiento facial + QR.
+    """)
+    
+    foto = st.camera_input("Tomar foto", key="camara_navegador")
+    rafaga = st.file_uploader(
+        "O subir una ráfaga de fotos",
+        type=["jpg", "jpeg", "png"],
+        accept_multiple_files=True,
+        key="rafaga_navegador"
+    )
+    
+    imagenes = []
+    if foto is not None:
+        imagenes.append(foto)
+    if rafaga:
+        imagenes.extend(rafaga)
+    
+    if not imagenes:
+        return
+    
+    # Cada rerun de Streamlit vuelve a entregar las mismas fotos: se procesan una
+    # sola vez por file_id y los resultados se reutilizan para mostrarlas
+    procesadas = st.session_state.setdefault('resultados_navegador', {})
+    nuevas = [imagen for imagen in imagenes if imagen.file_id not in procesadas]
+    if nuevas:
+        with st.spinner(f"Procesando {len(nuevas)} imagen(es)..."):
+            for imagen, resultado in zip(nuevas, service.procesar_frames_cliente(nuevas)):
+                procesadas[imagen.file_id] = resultado
+    vigentes = {imagen.file_id for imagen in imagenes}
+    for file_id in [f for f in procesadas if f not in vigentes]:
+        del procesadas[file_id]
+    resultados = [procesadas[imagen.file_id] for imagen in imagenes]
+    
+    for i, resultado in enumerate(resultados):
+        if resultado is None:
+            st.error(f"❌ No se pudo leer la imagen {i + 1}")
+            continue
+        
+        col1, col2 = st.columns([2, 1])
+        with col1:
+            st.image(cv2.cvtColor(resultado['frame'], cv2.COLOR_BGR2RGB), caption=f"Imagen {i + 1}")
+        with col2:
+            reconocidos = [r for r in resultado['rostros'] if r['id'] is not None]
+            for r in reconocidos:
+                st.success(f"👤 {r['nombre']} ({r['confianza']:.2f})")
+            for q in resultado['qr']:
+                st.success(f"📄 {q['nombre']}")
+            if not reconocidos and not resultado['qr']:
+                st.warning("⚠️ No se reconoció a ningún estudiante")
+
+def pase_lista_foto_grupal(service, db):
+    """Marca presentes a todos los estudiantes que aparecen en fotos del aula"""
+    st.subheader("👥 Pase de Lista con Foto Grupal")
+    st.info("""
+    Toma una o varias fotos del aula. Todos los estudiantes reconocidos de la sección
+    se registran de una vez; los rostros sin coincidencia quedan para revisión.
+    """)
+    
+    secciones = db.obtener_secciones_activas()
+    opciones = [(None, "Todas las secciones")] + [(s[0], f"{s[4]} - {s[3]} - {s[1]}") for s in secciones]
+    seccion = st.selectbox("Sección", opciones, format_func=lambda x: x[1], key="seccion_foto_grupal")
+    
+    fotos = st.file_uploader(
+        "Fotos del aula",
+        type=["jpg", "jpeg", "png"],
+        accept_multiple_files=True,
+        key="fotos_grupales"
+    )
+    rostros_pequenos = st.checkbox("Buscar rostros pequeños (más lento)", value=True, key="upsample_grupal")
+    
+    if not fotos or not st.button("✅ Pasar Lista", type="primary", key="pasar_lista_grupal"):
+        return
+    
+    with st.spinner("Detectando y reconociendo rostros..."):
+        resultado = service.pase_lista_fotos(fotos, seccion_id=seccion[0], upsample=2 if rostros_pequenos else 1)
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Rostros Detectados", resultado['rostros_detectados'])
+    with col2:
+        st.metric("Reconocidos", len(resultado['reconocidos']))
+    with col3:
+        st.metric("Sin Coincidencia", len(resultado['sin_coincidencia']))
+    with col4:
+        st.metric("Tiempo", f"{resultado['tiempo']:.1f}s")
+    
+    for i, foto in enumerate(resultado['fotos']):
+        st.image(cv2.cvtColor(foto, cv2.COLOR_BGR2RGB), caption=f"Foto {i + 1}")
+    
+    if resultado['reconocidos']:
+        df = pd.DataFrame([{
+            'ID': r['id'],
+            'Nombre': r['nombre'],
+            'Confianza': f"{r['confianza']:.2f}",
+            'Estado': '✅ Registrado' if r['registrado'] else '⚠️ Ya registrado hoy'
+        } for r in resultado['reconocidos']])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+    
+    if resultado['sin_coincidencia']:
+        st.subheader("🔍 Rostros para Revisión")
+        columnas = st.columns(6)
+        for i, rostro in enumerate(resultado['sin_coincidencia']):
+            with columnas[i % 6]:
+                distancia = f"dist: {rostro['distancia']:.2f}" if rostro['distancia'] is not None else "sin galería"
+                st.image(cv2.cvtColor(rostro['recorte'], cv2.COLOR_BGR2RGB), caption=f"Foto {rostro['foto'] + 1} - {distancia}")
+
+def procesar_video_grabado(service):
+    """Reconcilia asistencias a partir de una grabación de la entrada"""
+    st.subheader("🎞️ Procesar Video Grabado")
+    st.info("""
+    Sube la grabación de la entrada (por ejemplo, si la PC de registro falló).
+    El video se divide en fragmentos que se analizan en paralelo y cada estudiante
+    se registra con la hora en que aparece en la grabación.
+    """)
+    
+    video = st.file_uploader("Archivo de video", type=["mp4", "avi", "mov", "mkv"], key="video_offline")
+    
+    col1, col2 = st.columns(2)
+    with col1:
+        fecha = st.date_input("Fecha de la grabación", value=datetime.now().date(), key="video_fecha")
+    with col2:
+        hora = st.time_input("Hora de inicio de la grabación", value=datetime.strptime("07:30", "%H:%M").time(), key="video_hora")
+    
+    if video is None or not st.button("▶️ Procesar Video", type="primary", key="procesar_video"):
+        return
+    
+    # OpenCV necesita una ruta en disco para decodificar el video
+    sufijo = os.path.splitext(video.name)[1] or ".mp4"
+    with tempfile.NamedTemporaryFile(delete=False, suffix=sufijo) as tmp:
+        tmp.write(video.getbuffer())
+        ruta_video = tmp.name
+    
+    barra = st.progress(0.0, text="Iniciando...")
+    
+    def actualizar_progreso(completados, total):
+        barra.progress(completados / total, text=f"Fragmentos procesados: {completados}/{total}")
+    
+    try:
+        procesador = VideoOfflineService(service)
+        resumen = procesador.procesar_video(ruta_video, datetime.combine(fecha, hora), progreso=actualizar_progreso)
+    finally:
+        os.remove(ruta_video)
+    
+    if not resumen:
+        st.error("❌ No se pudo leer el video")
+        return
+    
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.metric("Asistencias", len(resumen['registrados']))
+    with col2:
+        st.metric("FPS Decodificación", f"{resumen['fps_decodificacion']:.1f}")
+    with col3:
+        st.metric("FPS Análisis", f"{resumen['fps_analisis']:.1f}")
+    with col4:
+        st.metric("Velocidad", f"{resumen['velocidad_tiempo_real']:.1f}x")
+    
+    for error in resumen['errores']:
+        st.warning(f"⚠️ {error}")
+    
+    if resumen['registrados']:
+        df = pd.DataFrame(resumen['registrados'])
+        st.dataframe(df, use_container_width=True, hide_index=True)
+
 def diagnosticar_qr(service):
     """Función para diagnosticar problemas con QR"""
     import cv2
@@ -83,6 +307,9 @@ def diagnosticar_qr(service):
         from app.utils.qr_utils import qr_manager
         qr_datos = qr_manager.detectar_qr_en_frame(frame)
         st.success(f"✅ QR Manager funcionando. QR detectados: {len(qr_datos)}")
+        st.caption("⏱️ Tiempo por etapa: " + ", ".join(
+            f"{etapa} {ms:.1f} ms" for etapa, ms in qr_manager.ultimo_detalle.items()
+        ))
         
         for i, qr in enumerate(qr_datos):
             st.write(f"QR {i+1}: {qr['data']}")
@@ -277,6 +504,10 @@ def mostrar_asistencias_del_dia(service):
                             st.info("📄 Código QR")
                             st.success("✅ QR Válido")
                     
+                    for ruta, _, _ in service.db.obtener_evidencias_asistencia(id_asist):
+                        if os.path.exists(ruta):
+                            st.image(ruta, caption="📷 Evidencia", width=160)
+                    
                     # Separador visual
                     st.markdown("---")
         
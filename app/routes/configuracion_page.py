@@ -1,21 +1,218 @@
+import os
 import streamlit as st
 from datetime import datetime
 
+from app.services.galeria_service import GaleriaService
+from app.services.reencodificacion_service import (
+    MODELOS_DETECCION, MODELOS_LANDMARKS, ReencodificacionService
+)
+from app.utils.qr_utils import DECODIFICADORES_QR
+from app.utils.rostros_utils import version_encoding
+
 def mostrar_configuracion(db):
     st.header("⚙️ Configuración del Sistema")
     st.subheader("Horarios")
 
+    config = db.obtener_configuracion()
+    hora_actual = datetime.strptime(config.get('hora_entrada') or "08:00:00", "%H:%M:%S").time()
+
     with st.form("config_form"):
-        hora = st.time_input("Hora de entrada", value=datetime.strptime("08:00", "%H:%M").time())
-        tolerancia = st.number_input("Tolerancia (minutos)", min_value=0, max_value=60, value=15)
+        hora = st.time_input("Hora de entrada", value=hora_actual)
+        tolerancia = st.number_input("Tolerancia (minutos)", min_value=0, max_value=60, value=15 if config.get('tolerancia_minutos') is None else config.get('tolerancia_minutos'))
+        horas_adicionales = st.text_input(
+            "Horas de entrada de otros turnos",
+            value=config.get('horas_entrada_adicionales') or "",
+            help="Separadas por coma, por ejemplo: 13:00, 18:30"
+        )
+
+        st.subheader("Ahorro de Energía")
+        ahorro_energia = st.checkbox(
+            "Reducir el procesamiento fuera del horario de entrada",
+            value=bool(config.get('ahorro_energia', 1)),
+            help="Fuera de las ventanas de entrada solo se revisa movimiento; el reconocimiento se reactiva al detectar actividad"
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            margen_antes = st.number_input("Minutos activos antes de la entrada", min_value=0, max_value=240, value=30 if config.get('margen_antes_minutos') is None else config.get('margen_antes_minutos'))
+        with col2:
+            margen_despues = st.number_input("Minutos activos después de la tolerancia", min_value=0, max_value=240, value=30 if config.get('margen_despues_minutos') is None else config.get('margen_despues_minutos'))
+
+        st.subheader("Evidencias Fotográficas")
+        evidencias_habilitadas = st.checkbox(
+            "Guardar un recorte del rostro o QR por cada asistencia",
+            value=bool(config.get('evidencias_habilitadas', 1))
+        )
+        col1, col2 = st.columns(2)
+        with col1:
+            formatos = ["jpg", "webp"]
+            formato = st.selectbox("Formato", formatos, index=formatos.index(config.get('evidencias_formato') or "jpg"))
+        with col2:
+            dias_retencion = st.number_input("Días de retención", min_value=1, max_value=365, value=config.get('dias_retencion_evidencias') or 30)
+
+        st.subheader("Búsqueda en la Galería")
+        fragmentos_matcher = st.number_input(
+            "Procesos para comparar rostros",
+            min_value=0, max_value=os.cpu_count() or 1,
+            value=min(config.get('fragmentos_matcher') or 0, os.cpu_count() or 1),
+            help="0 o 1 compara en el mismo proceso. Con galerías de decenas de miles de rostros, repartirla entre varios procesos acelera la búsqueda"
+        )
+
+        st.subheader("Lectura de Códigos QR")
+        decodificadores = list(DECODIFICADORES_QR)
+        decodificador_qr = st.selectbox(
+            "Decodificador QR",
+            decodificadores,
+            index=decodificadores.index(config.get('decodificador_qr')) if config.get('decodificador_qr') in decodificadores else 0,
+            help="pyzbar (ZBar) u OpenCV. Compáralos con: python -m app.scripts.benchmark_qr"
+        )
+        etapas_concurrentes = st.checkbox(
+            "Leer QR y rostros en paralelo",
+            value=bool(config.get('etapas_concurrentes', 1)),
+            help="Procesa ambas etapas de cada frame a la vez. Desactívalo en equipos de un solo núcleo"
+        )
+
+        st.subheader("Imágenes de Enrolamiento")
+        directorio_imagenes = st.text_input(
+            "Directorio del almacén de imágenes",
+            value=config.get('directorio_imagenes') or "",
+            help="Vacío para usar app/assets/imagenes_estudiantes/almacen. Al cambiarlo, mueve también su contenido."
+        )
+
         if st.form_submit_button("💾 Guardar Configuración"):
             conn = db._get_connection()
             cursor = conn.cursor()
             cursor.execute('''
                 UPDATE configuracion 
-                SET hora_entrada=?, tolerancia_minutos=?, ultima_actualizacion=CURRENT_TIMESTAMP
+                SET hora_entrada=?, tolerancia_minutos=?, horas_entrada_adicionales=?,
+                    ahorro_energia=?, margen_antes_minutos=?, margen_despues_minutos=?,
+                    evidencias_habilitadas=?, evidencias_formato=?, dias_retencion_evidencias=?,
+                    directorio_imagenes=?, fragmentos_matcher=?, decodificador_qr=?, etapas_concurrentes=?, ultima_actualizacion=CURRENT_TIMESTAMP
                 WHERE id=1
-            ''', (hora.strftime('%H:%M:%S'), tolerancia))
+            ''', (hora.strftime('%H:%M:%S'), tolerancia, horas_adicionales.strip(),
+                  int(ahorro_energia), margen_antes, margen_despues,
+                  int(evidencias_habilitadas), formato, dias_retencion,
+                  directorio_imagenes.strip() or None, fragmentos_matcher, decodificador_qr, int(etapas_concurrentes)))
             conn.commit()
             conn.close()
             st.success("✅ Configuración guardada correctamente")
+
+    gestionar_galeria(db)
+    podar_galeria(db, config)
+    auditar_duplicados(db)
+
+def gestionar_galeria(db):
+    """Re-codificación de la galería con otros parámetros de detección"""
+    st.subheader("Galería de Rostros")
+    servicio = ReencodificacionService(db)
+    modelo_deteccion, modelo_landmarks, num_jitters = servicio.parametros_activos()
+    st.write(f"**Versión activa:** `{db.obtener_version_encodings_activa()}`")
+
+    resumen = db.obtener_resumen_versiones_encodings()
+    if resumen:
+        st.table([{"Versión": version, "Encodings": cantidad, "Estudiantes": estudiantes}
+                  for version, cantidad, estudiantes in resumen])
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        nuevo_deteccion = st.selectbox("Detector", MODELOS_DETECCION, index=MODELOS_DETECCION.index(modelo_deteccion))
+    with col2:
+        nuevo_landmarks = st.selectbox("Modelo de landmarks", MODELOS_LANDMARKS, index=MODELOS_LANDMARKS.index(modelo_landmarks))
+    with col3:
+        nuevo_jitters = st.slider("Re-muestreos por rostro", 1, 10, num_jitters)
+
+    version_destino = version_encoding(nuevo_deteccion, nuevo_landmarks, nuevo_jitters)
+    estado = servicio.estado(version_destino)
+    if version_destino != estado['version_origen']:
+        st.caption(f"{estado['total'] - estado['pendientes']}/{estado['total']} encodings ya procesados para `{version_destino}`")
+
+    forzar = st.checkbox("Activar aunque algunos estudiantes queden sin encodings", value=False)
+
+    if st.button("🔁 Re-codificar Galería"):
+        barra = st.progress(0.0, text="Re-codificando...")
+
+        def actualizar_progreso(procesados, total):
+            barra.progress(procesados / total, text=f"Encodings procesados: {procesados}/{total}")
+
+        reporte = servicio.reencodificar(nuevo_deteccion, nuevo_landmarks, nuevo_jitters,
+                                         forzar=forzar, progreso=actualizar_progreso)
+        if reporte['activada']:
+            st.success(f"✅ Galería activa: {version_destino} ({reporte['guardados']} encodings nuevos)")
+        elif reporte['version_origen'] == version_destino:
+            st.info("ℹ️ La galería ya usa estos parámetros")
+        else:
+            st.warning(f"⚠️ {reporte['estudiantes_sin_encoding']} estudiantes quedarían sin encodings; "
+                       "revisa sus fotos o marca la opción para activar de todas formas")
+        st.write(f"Sin rostro: {reporte['sin_rostro']} · Sin imagen: {reporte['sin_imagen']} · "
+                 f"Tiempo: {reporte['tiempo']:.0f}s")
+
+def podar_galeria(db, config):
+    """Poda de encodings casi idénticos acumulados por capturas repetidas"""
+    st.subheader("Poda de la Galería")
+    col1, col2 = st.columns(2)
+    with col1:
+        maximo = st.number_input("Máximo de encodings por estudiante", min_value=1, max_value=100,
+                                 value=config.get('max_encodings_por_estudiante') or 10)
+    with col2:
+        automatica = st.checkbox("Podar automáticamente tras cada captura o importación",
+                                 value=bool(config.get('poda_automatica', 0)))
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        if st.button("💾 Guardar Política"):
+            conn = db._get_connection()
+            cursor = conn.cursor()
+            cursor.execute('''
+                UPDATE configuracion
+                SET max_encodings_por_estudiante=?, poda_automatica=?, ultima_actualizacion=CURRENT_TIMESTAMP
+                WHERE id=1
+            ''', (maximo, int(automatica)))
+            conn.commit()
+            conn.close()
+            st.success("✅ Política de poda guardada")
+    with col2:
+        simular = st.button("🔍 Simular Poda")
+    with col3:
+        podar = st.button("✂️ Podar Ahora")
+
+    if simular or podar:
+        reporte = GaleriaService(db).podar(maximo, simular=simular)
+        col1, col2, col3 = st.columns(3)
+        with col1:
+            st.metric("Encodings", reporte['despues'], reporte['despues'] - reporte['antes'])
+        with col2:
+            st.metric("Estudiantes Podados", reporte['estudiantes_podados'])
+        with col3:
+            st.metric("Tiempo", f"{reporte['tiempo']:.1f}s")
+
+        antes, despues = reporte['calidad_antes'], reporte['calidad_despues']
+        if antes and despues:
+            st.table([
+                {"Métrica": "Tasa de acierto", "Antes": f"{antes['tasa_acierto']:.1%}", "Después": f"{despues['tasa_acierto']:.1%}"},
+                {"Métrica": "Distancia genuina media", "Antes": f"{antes['distancia_genuina']:.3f}", "Después": f"{despues['distancia_genuina']:.3f}"},
+                {"Métrica": "Margen frente a impostores", "Antes": f"{antes['margen']:.3f}", "Después": f"{despues['margen']:.3f}"}
+            ])
+        elif reporte['antes'] == reporte['despues']:
+            st.info("ℹ️ Ningún estudiante supera el máximo configurado")
+        if podar and reporte['eliminados']:
+            st.success(f"✅ {reporte['eliminados']} encodings eliminados")
+
+def auditar_duplicados(db):
+    """Detecta a la misma persona registrada como dos estudiantes"""
+    st.subheader("Auditoría de Identidades Duplicadas")
+    umbral = st.slider("Distancia máxima entre rostros de estudiantes distintos", 0.2, 0.6, 0.45, 0.01)
+
+    if st.button("🔎 Auditar Galería"):
+        with st.spinner("Comparando todos los rostros de la galería..."):
+            reporte = GaleriaService(db).auditar_duplicados(umbral)
+
+        st.write(f"{reporte['encodings']} encodings de {reporte['estudiantes']} estudiantes "
+                 f"revisados en {reporte['tiempo']:.1f}s")
+        if reporte['pares']:
+            st.warning(f"⚠️ {len(reporte['pares'])} pares sospechosos")
+            st.table([{
+                "Estudiante A": f"{p['nombre_a']} (ID {p['estudiante_a']}, DNI {p['dni_a']})",
+                "Estudiante B": f"{p['nombre_b']} (ID {p['estudiante_b']}, DNI {p['dni_b']})",
+                "Distancia": f"{p['distancia']:.3f}"
+            } for p in reporte['pares']])
+        else:
+            st.success("✅ No se encontraron identidades duplicadas")
@@ -1,9 +1,15 @@
 import io
+import os
+import tempfile
 import qrcode
 import streamlit as st
 import pandas as pd
 from datetime import datetime
 from app.utils.camara_utils import CamaraManager
+from app.services.enrolamiento_service import EnrolamientoMasivoService
+from app.services.galeria_service import GaleriaService
+from app.services.carnets_service import CarnetsService
+from app.utils.rostros_utils import parametros_version
 
 def gestion_estudiantes(service):
     st.header("👥 Gestión de Estudiantes")
@@ -316,6 +322,56 @@ def registrar_nuevo_estudiante(service):
                     st.error(f"❌ {e}")
                 except Exception as e:
                     st.error(f"❌ Error inesperado: {e}")
+    
+    importar_estudiantes_csv(service)
+
+COLUMNAS_CSV_ESTUDIANTES = [
+    'dni', 'nombre', 'apellido', 'fecha_nacimiento', 'genero', 'telefono', 'email', 'direccion',
+    'nombre_contacto_emergencia', 'telefono_contacto_emergencia', 'turno', 'año_escolar', 'seccion_id'
+]
+
+def importar_estudiantes_csv(service):
+    """Registro masivo desde un CSV, en una sola transacción"""
+    with st.expander("📥 Importar estudiantes desde CSV"):
+        st.markdown(
+            "Columnas obligatorias: `dni`, `nombre`, `apellido`, `fecha_nacimiento` (AAAA-MM-DD). "
+            "Opcionales: " + ", ".join(f"`{c}`" for c in COLUMNAS_CSV_ESTUDIANTES[4:]) + ". "
+            "Si algún DNI ya existe no se importa ninguna fila."
+        )
+        archivo = st.file_uploader("Archivo CSV", type=["csv"], key="csv_estudiantes")
+        if not archivo:
+            return
+        
+        df = pd.read_csv(archivo, dtype=str).fillna("")
+        faltantes = [c for c in COLUMNAS_CSV_ESTUDIANTES[:4] if c not in df.columns]
+        if faltantes:
+            st.error(f"❌ Faltan columnas: {', '.join(faltantes)}")
+            return
+        st.dataframe(df.head(20), use_container_width=True)
+        
+        if st.button(f"✅ Registrar {len(df)} estudiantes", key="importar_csv_estudiantes"):
+            filas = []
+            invalidas = []
+            for numero, registro in enumerate(df.to_dict('records'), start=2):
+                fila = [registro.get(c, "").strip() or None for c in COLUMNAS_CSV_ESTUDIANTES]
+                try:
+                    fila[11] = int(fila[11]) if fila[11] else None
+                    fila[12] = int(fila[12]) if fila[12] else None
+                except ValueError:
+                    invalidas.append(numero)
+                    continue
+                filas.append(tuple(fila))
+            if invalidas:
+                st.error(f"❌ `año_escolar` y `seccion_id` deben ser números enteros. "
+                         f"Revisa las filas: {', '.join(map(str, invalidas))}")
+                return
+            try:
+                inicio = datetime.now()
+                ids = service.agregar_estudiantes_lote(filas)
+                segundos = (datetime.now() - inicio).total_seconds()
+                st.success(f"✅ {len(ids)} estudiantes registrados con su código QR en {segundos:.2f}s")
+            except ValueError as e:
+                st.error(f"❌ {e}")
 
 def editar_estudiante(service):
     st.subheader("✏️ Editar Información de Estudiante")
@@ -487,8 +543,8 @@ def capturar_rostros(service):
     1. Selecciona un estudiante de la lista
     2. Haz clic en 'Iniciar Captura de Rostros'
     3. Se abrirá una ventana con la cámara
-    4. **Presiona ESPACIO** para capturar cada imagen (se capturarán 5 imágenes)
-    5. **Presiona ESC** para cancelar en cualquier momento
+    4. Quédate quieto y sigue la indicación de pose: cada imagen se captura sola cuando el recuadro se pone verde (se capturarán 5 imágenes)
+    5. **Presiona ESPACIO** para capturar manualmente o **ESC** para cancelar en cualquier momento
     6. Asegúrate de tener buena iluminación y que el rostro sea visible
     """)
     
@@ -532,6 +588,7 @@ def capturar_rostros(service):
                     )
                     
                     if exito:
+                        GaleriaService(service.db).aplicar_politica([estudiante_id])
                         st.success("✅ ¡Captura de rostros completada exitosamente!")
                         st.balloons()
                     else:
@@ -549,6 +606,61 @@ def capturar_rostros(service):
                 st.write(f"**Encodings guardados para este estudiante:** {encodings_estudiante}")
             except:
                 st.write("**Encodings guardados:** 0")
+    
+    importar_rostros_masivo(service)
+
+def importar_rostros_masivo(service):
+    """Importación masiva de rostros desde un ZIP o una carpeta del servidor"""
+    with st.expander("📦 Importación Masiva de Rostros"):
+        st.info("""
+        Sube un ZIP (o indica una carpeta del servidor) con fotos nombradas por el
+        **DNI**, el **código QR** o `id<N>` del estudiante. Para varias fotos del mismo
+        estudiante usa sufijos: `12345678_1.jpg`, `12345678_2.jpg`.
+        """)
+        
+        archivo_zip = st.file_uploader("Archivo ZIP", type=["zip"], key="zip_rostros")
+        carpeta = st.text_input("O ruta de carpeta en el servidor", key="carpeta_rostros")
+        version = service.db.obtener_version_encodings_activa()
+        st.caption(f"Versión de galería activa: `{version}` ({parametros_version(version)[2]} re-muestreos por rostro). "
+                   "Para cambiar los re-muestreos re-codifica la galería desde Configuración.")
+        
+        if not st.button("🚀 Importar Rostros", key="importar_rostros"):
+            return
+        
+        origen = archivo_zip if archivo_zip is not None else carpeta.strip()
+        if not origen:
+            st.error("❌ Sube un ZIP o indica una carpeta")
+            return
+        
+        barra = st.progress(0.0, text="Preparando imágenes...")
+        
+        def actualizar_progreso(procesadas, total):
+            barra.progress(procesadas / total, text=f"Imágenes procesadas: {procesadas}/{total}")
+        
+        importador = EnrolamientoMasivoService(service.db)
+        reporte = importador.importar(origen, progreso=actualizar_progreso)
+        if reporte['estudiantes']:
+            GaleriaService(service.db).aplicar_politica(sorted(reporte['estudiantes']))
+        
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            st.metric("Encodings Guardados", reporte['guardados'])
+        with col2:
+            st.metric("Estudiantes", len(reporte['estudiantes']))
+        with col3:
+            st.metric("Imágenes", reporte['total'])
+        with col4:
+            st.metric("Tiempo", f"{reporte['tiempo']:.0f}s")
+        
+        for clave, titulo in [
+            ('sin_rostro', "⚠️ Imágenes sin rostro"),
+            ('varios_rostros', "⚠️ Imágenes con varios rostros"),
+            ('sin_estudiante', "❌ Nombre de archivo sin estudiante"),
+            ('ilegibles', "❌ Imágenes ilegibles")
+        ]:
+            if reporte[clave]:
+                st.warning(f"{titulo}: {len(reporte[clave])}")
+                st.dataframe(pd.DataFrame({'Archivo': reporte[clave]}), use_container_width=True, hide_index=True)
 
 '''
 def desactivar_estudiante(service):
@@ -613,6 +725,8 @@ def mostrar_estudiantes_desactivados(service):
 def descargar_qr_estudiantes(service):
     st.subheader("📄 Descargar Códigos QR de Estudiantes")
     
+    mantenimiento_codigos_qr(service)
+    
     # Obtener lista de estudiantes con sus QR
     estudiantes = service.obtener_estudiantes_con_qr()
     
@@ -638,20 +752,14 @@ def descargar_qr_estudiantes(service):
     if estudiante_seleccionado:
         estudiante_id = estudiante_seleccionado[0]
         
-        # Obtener y mostrar QR
-        qr_img = service.obtener_qr_imagen(estudiante_id)
+        # Obtener y mostrar QR (los mismos bytes PNG para la vista previa y la descarga)
+        qr_png = service.obtener_qr_png(estudiante_id)
         
-        if qr_img:
+        if qr_png:
             col1, col2 = st.columns([1, 2])
             
             with col1:
-                # CORRECCIÓN: Convertir PIL Image a bytes para st.image
-                import io
-                buf = io.BytesIO()
-                qr_img.save(buf, format="PNG")
-                buf.seek(0)
-                
-                st.image(buf, caption=f"QR del Estudiante", use_container_width=True)
+                st.image(qr_png, caption=f"QR del Estudiante", use_container_width=True)
             
             with col2:
                 # Información del estudiante
@@ -665,19 +773,85 @@ def descargar_qr_estudiantes(service):
                 """)
             
             # Botón de descarga
-            buf_download = io.BytesIO()
-            qr_img.save(buf_download, format="PNG")
-            buf_download.seek(0)
-            
             st.download_button(
                 label="📥 Descargar Código QR",
-                data=buf_download,
+                data=qr_png,
                 file_name=f"QR_{estudiante_info[1]}_{estudiante_info[2]}.png",
                 mime="image/png",
                 use_container_width=True
             )
         else:
             st.error("❌ No se pudo generar el código QR para este estudiante")
+    
+    descargar_hojas_carnets(service)
+
+def mantenimiento_codigos_qr(service):
+    """Asignación masiva de QR faltantes y corrección de duplicados"""
+    sin_qr = service.obtener_estudiantes_sin_qr()
+    with st.expander(f"🔧 Mantenimiento de códigos QR ({len(sin_qr)} estudiantes sin QR)", expanded=bool(sin_qr)):
+        firmar_todos = st.checkbox(
+            "Reemplazar también los códigos antiguos por códigos firmados",
+            value=False, key="firmar_todos_qr",
+            help="Los códigos firmados se pueden verificar sin base de datos (kioscos). Los carnets ya impresos con el código anterior dejarán de funcionar."
+        )
+        if st.button("🔧 Reparar códigos QR", key="reparar_qr"):
+            try:
+                resumen = service.reparar_codigos_qr(firmar_todos)
+                st.success(
+                    f"✅ {resumen['sin_qr']} asignados, {resumen['duplicados']} duplicados corregidos, "
+                    f"{resumen['reemplazados']} reemplazados en {resumen['tiempo']:.2f}s"
+                )
+                if resumen['conflictos']:
+                    st.warning(f"⚠️ {resumen['conflictos']} estudiantes no se modificaron porque su código nuevo ya estaba en uso")
+            except Exception as e:
+                st.error(f"❌ Error reparando códigos QR: {e}")
+
+def descargar_hojas_carnets(service):
+    """PDF con los carnets QR de toda una sección o grado, listo para imprimir en A4"""
+    st.divider()
+    st.subheader("🖨️ Hojas de Carnets para Imprimir")
+    
+    alcance = st.radio("Generar para", ["Sección", "Grado", "Todos"], horizontal=True, key="alcance_carnets")
+    seccion_id = grado_id = None
+    if alcance == "Sección":
+        secciones = service.obtener_secciones_activas()
+        seleccion = st.selectbox("Sección", secciones, format_func=lambda s: f"{s[3]} - {s[1]}", key="seccion_carnets")
+        seccion_id = seleccion[0] if seleccion else None
+    elif alcance == "Grado":
+        grados = [g for g in service.obtener_grados_activos() if g[4]]
+        seleccion = st.selectbox("Grado", grados, format_func=lambda g: f"{g[3]} - {g[1]}", key="grado_carnets")
+        grado_id = seleccion[0] if seleccion else None
+    incluir_foto = st.checkbox("Incluir foto de enrolamiento", value=False, key="foto_carnets")
+    
+    if st.button("📄 Generar PDF", key="generar_carnets"):
+        barra = st.progress(0.0)
+        # El PDF se escribe a disco hoja por hoja; el botón de descarga lo lee de ahí
+        archivo = tempfile.NamedTemporaryFile(prefix="carnets_", suffix=".pdf", delete=False)
+        with archivo:
+            resumen = CarnetsService(service.db).generar_pdf(
+                archivo, seccion_id=seccion_id, grado_id=grado_id, incluir_foto=incluir_foto,
+                progreso=lambda hechas, total: barra.progress(hechas / total, text=f"Hoja {hechas} de {total}")
+            )
+        anterior = st.session_state.pop('pdf_carnets', None)
+        if anterior and os.path.exists(anterior):
+            os.remove(anterior)
+        if resumen['estudiantes']:
+            st.session_state['pdf_carnets'] = archivo.name
+            st.success(f"✅ {resumen['estudiantes']} carnets en {resumen['hojas']} hojas ({resumen['tiempo']:.1f}s)")
+        else:
+            os.remove(archivo.name)
+            st.warning("📝 No hay estudiantes activos con QR en la selección")
+    
+    ruta = st.session_state.get('pdf_carnets')
+    if ruta and os.path.exists(ruta):
+        with open(ruta, "rb") as pdf:
+            st.download_button(
+                label="📥 Descargar Hojas de Carnets (PDF)",
+                data=pdf,
+                file_name=f"carnets_{datetime.now().strftime('%Y%m%d_%H%M')}.pdf",
+                mime="application/pdf",
+                use_container_width=True
+            )
 
 def gestion_estado_estudiantes(service):
     st.subheader("🚫 Gestión de Estado de Estudiantes")
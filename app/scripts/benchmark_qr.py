@@ -0,0 +1,157 @@
+# benchmark_qr.py - compara los decodificadores QR sobre carnets sintéticos
+import argparse
+import glob
+import json
+import os
+import random
+import time
+import cv2
+import numpy as np
+
+from app.utils.qr_utils import DECODIFICADORES_QR, QRManager, crear_decodificador, qr_manager
+
+ANCHO_FRAME, ALTO_FRAME = 640, 480
+
+
+def _fondo(rng, fondos):
+    """Frame de fondo: una imagen real al azar o textura sintética"""
+    if fondos:
+        imagen = cv2.imread(rng.choice(fondos))
+        if imagen is not None:
+            return cv2.resize(imagen, (ANCHO_FRAME, ALTO_FRAME))
+    ruido = np.random.default_rng(rng.randrange(2 ** 32)).integers(0, 255, (ALTO_FRAME, ANCHO_FRAME, 3), dtype=np.uint8)
+    fondo = cv2.GaussianBlur(ruido, (31, 31), 0)
+    for _ in range(rng.randint(2, 6)):
+        x, y = rng.randrange(ANCHO_FRAME), rng.randrange(ALTO_FRAME)
+        color = tuple(rng.randrange(256) for _ in range(3))
+        cv2.rectangle(fondo, (x, y), (x + rng.randint(30, 200), y + rng.randint(30, 200)), color, -1)
+    return fondo
+
+
+def _pegar_carnet(frame, qr, rng, ocupadas, max_rotacion, max_perspectiva, max_desenfoque):
+    """Pega un QR rotado y con perspectiva en una zona libre del frame"""
+    lado = qr.shape[0]
+    for _ in range(20):
+        x, y = rng.randrange(0, ANCHO_FRAME - lado), rng.randrange(0, ALTO_FRAME - lado)
+        if all(x + lado < ox or ox + ol < x or y + lado < oy or oy + ol < y for ox, oy, ol in ocupadas):
+            break
+    else:
+        return False
+    ocupadas.append((x, y, lado))
+
+    # Esquinas destino: cuadrado rotado con las esquinas desplazadas al azar
+    centro = np.array([x + lado / 2, y + lado / 2])
+    angulo = np.radians(rng.uniform(-max_rotacion, max_rotacion))
+    rotacion = np.array([[np.cos(angulo), -np.sin(angulo)], [np.sin(angulo), np.cos(angulo)]])
+    esquinas = np.array([[-1, -1], [1, -1], [1, 1], [-1, 1]]) * lado / 2
+    desplazamiento = np.array([[rng.uniform(-1, 1), rng.uniform(-1, 1)] for _ in range(4)]) * lado * max_perspectiva
+    destino = (esquinas @ rotacion.T + desplazamiento + centro).astype(np.float32)
+    origen = np.float32([[0, 0], [lado, 0], [lado, lado], [0, lado]])
+
+    matriz = cv2.getPerspectiveTransform(origen, destino)
+    carnet = cv2.warpPerspective(cv2.cvtColor(qr, cv2.COLOR_GRAY2BGR), matriz, (ANCHO_FRAME, ALTO_FRAME))
+    mascara = cv2.warpPerspective(np.full((lado, lado), 255, np.uint8), matriz, (ANCHO_FRAME, ALTO_FRAME))
+    frame[mascara > 0] = carnet[mascara > 0]
+
+    nucleo = rng.choice([k for k in (0, 3, 5, 7) if k <= max_desenfoque])
+    if nucleo:
+        x0, y0 = max(0, x - lado // 2), max(0, y - lado // 2)
+        x1, y1 = min(ANCHO_FRAME, x + lado * 3 // 2), min(ALTO_FRAME, y + lado * 3 // 2)
+        frame[y0:y1, x0:x1] = cv2.GaussianBlur(frame[y0:y1, x0:x1], (nucleo, nucleo), 0)
+    return True
+
+
+def generar_corpus(cantidad, semilla=0, fondos=None, max_codigos=3, max_rotacion=30,
+                   max_perspectiva=0.08, max_desenfoque=5):
+    """Lista de (frame BGR, códigos esperados) con QR generados por generar_qr_imagen"""
+    rng = random.Random(semilla)
+    corpus = []
+    for numero in range(cantidad):
+        frame = _fondo(rng, fondos)
+        esperados = []
+        ocupadas = []
+        for _ in range(rng.randint(1, max_codigos)):
+            codigo = f"EDU-{rng.randrange(10000):04d}-{rng.getrandbits(32):08x}"
+            lado = rng.randint(90, 200)
+            qr = np.array(qr_manager.generar_qr_imagen(codigo, size=lado).convert('L'))
+            if _pegar_carnet(frame, qr, rng, ocupadas, max_rotacion, max_perspectiva, max_desenfoque):
+                esperados.append(codigo)
+        corpus.append((frame, esperados))
+    return corpus
+
+
+def guardar_corpus(corpus, directorio):
+    os.makedirs(directorio, exist_ok=True)
+    esperados = {}
+    for numero, (frame, codigos) in enumerate(corpus):
+        nombre = f"frame_{numero:04d}.png"
+        cv2.imwrite(os.path.join(directorio, nombre), frame)
+        esperados[nombre] = codigos
+    with open(os.path.join(directorio, "esperados.json"), "w", encoding="utf-8") as f:
+        json.dump(esperados, f, indent=1)
+
+
+def cargar_corpus(directorio):
+    with open(os.path.join(directorio, "esperados.json"), encoding="utf-8") as f:
+        esperados = json.load(f)
+    return [(cv2.imread(os.path.join(directorio, nombre)), codigos) for nombre, codigos in sorted(esperados.items())]
+
+
+def medir(decodificador, corpus, escalonado):
+    """Tasa de lectura, lecturas erróneas y latencia por frame de un decodificador"""
+    manager = QRManager(decodificador)
+    manager.detectar_qr_en_frame(corpus[0][0], escalonado)  # calentar
+    manager.reiniciar_tiempos()
+    tiempos, leidos, erroneos, total = [], 0, 0, 0
+    for frame, esperados in corpus:
+        inicio = time.perf_counter()
+        datos = {qr['data'] for qr in manager.detectar_qr_en_frame(frame, escalonado)}
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        total += len(esperados)
+        leidos += len(datos & set(esperados))
+        erroneos += len(datos - set(esperados))
+    return {
+        'tasa_lectura': leidos / total if total else 0.0,
+        'erroneos': erroneos,
+        'ms_promedio': float(np.mean(tiempos)),
+        'ms_p95': float(np.percentile(tiempos, 95)),
+        'etapas': manager.obtener_tiempos_etapas()
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de decodificadores QR sobre carnets sintéticos")
+    parser.add_argument("--frames", type=int, default=200)
+    parser.add_argument("--semilla", type=int, default=0)
+    parser.add_argument("--fondos", help="directorio con fotos reales de la entrada para usar de fondo")
+    parser.add_argument("--corpus", help="directorio de un corpus guardado (se ignora --frames)")
+    parser.add_argument("--guardar", help="guardar el corpus generado en este directorio")
+    parser.add_argument("--decodificadores", nargs="+", default=list(DECODIFICADORES_QR),
+                        choices=list(DECODIFICADORES_QR))
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = cargar_corpus(args.corpus)
+    else:
+        fondos = glob.glob(os.path.join(args.fondos, "*.jpg")) + glob.glob(os.path.join(args.fondos, "*.png")) if args.fondos else None
+        corpus = generar_corpus(args.frames, args.semilla, fondos)
+        if args.guardar:
+            guardar_corpus(corpus, args.guardar)
+    print(f"📊 Corpus: {len(corpus)} frames, {sum(len(e) for _, e in corpus)} códigos")
+
+    for nombre in args.decodificadores:
+        decodificador = crear_decodificador(nombre)
+        if decodificador.nombre != nombre:
+            continue  # no disponible en este equipo
+        for escalonado in (True, False):
+            r = medir(decodificador, corpus, escalonado)
+            modo = "escalonado" if escalonado else "completo"
+            print(f"{nombre:>8} {modo:<11} lectura {r['tasa_lectura']:6.1%}  erróneos {r['erroneos']:3d}  "
+                  f"{r['ms_promedio']:6.1f} ms promedio  {r['ms_p95']:6.1f} ms p95")
+            if escalonado:
+                for etapa, t in r['etapas'].items():
+                    print(f"{'':>21}{etapa:<9} {t['llamadas']:5d} ejecuciones  {t['ms_promedio']:6.1f} ms  {t['exitos']:5d} con QR")
+
+
+if __name__ == "__main__":
+    main()
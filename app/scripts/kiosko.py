@@ -0,0 +1,76 @@
+# kiosko.py - modo kiosco para sedes sin conexión estable al servidor central
+import argparse
+import threading
+
+from app.data.database import DatabaseManager
+from app.data.database_kiosko import DatabaseKiosko
+from app.services.kiosko_service import SincronizacionCentral, SincronizacionKiosko, exportar_paquete
+
+
+def sincronizar_periodicamente(sincronizacion, intervalo, detener):
+    while not detener.wait(intervalo):
+        try:
+            sincronizacion.sincronizar()
+        except Exception as e:
+            print(f"⚠️ Sincronización fallida, se reintentará: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Modo kiosco del sistema de asistencias")
+    sub = parser.add_subparsers(dest="comando", required=True)
+
+    exportar = sub.add_parser("exportar", help="(servidor) exportar un paquete completo de galería")
+    exportar.add_argument("ruta")
+
+    central = sub.add_parser("central", help="(servidor) publicar deltas y recibir asistencias")
+    central.add_argument("directorio", help="directorio compartido con los kioscos")
+
+    importar = sub.add_parser("importar", help="(kiosco) aplicar un paquete de galería")
+    importar.add_argument("ruta")
+    importar.add_argument("--local", default="kiosko_datos")
+
+    iniciar = sub.add_parser("iniciar", help="(kiosco) reconocer con la galería local")
+    iniciar.add_argument("--local", default="kiosko_datos")
+    iniciar.add_argument("--compartido", help="directorio compartido para sincronizar")
+    iniciar.add_argument("--intervalo", type=int, default=300, help="segundos entre sincronizaciones")
+    iniciar.add_argument("--id", dest="kiosko_id", help="identificador del kiosco")
+
+    args = parser.parse_args()
+
+    if args.comando == "exportar":
+        exportar_paquete(DatabaseManager(), args.ruta)
+
+    elif args.comando == "central":
+        SincronizacionCentral(DatabaseManager(), args.directorio).sincronizar()
+
+    elif args.comando == "importar":
+        DatabaseKiosko(args.local).aplicar_paquete(args.ruta)
+
+    elif args.comando == "iniciar":
+        from app.services.asistencias_service import AsistenciaService
+
+        db = DatabaseKiosko(args.local, args.kiosko_id)
+        detener = threading.Event()
+        if args.compartido:
+            sincronizacion = SincronizacionKiosko(db, args.compartido)
+            try:
+                sincronizacion.sincronizar()
+            except Exception as e:
+                print(f"⚠️ Sin acceso al directorio compartido, se usa la galería local: {e}")
+            threading.Thread(target=sincronizar_periodicamente, args=(sincronizacion, args.intervalo, detener),
+                             daemon=True).start()
+
+        print(f"🏫 Kiosco {db.kiosko_id}")
+        try:
+            AsistenciaService(db).iniciar_monitoreo_combinado()
+        finally:
+            detener.set()
+            if args.compartido:
+                try:
+                    SincronizacionKiosko(db, args.compartido).enviar_asistencias()
+                except Exception as e:
+                    print(f"⚠️ Asistencias pendientes quedan en cola local: {e}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,13 +1,31 @@
 import cv2
-import face_recognition
+import threading
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, time
 import time
 from app.utils.qr_utils import qr_manager
+from app.utils.modelos_utils import face_recognition, gestor_modelos
+from app.utils.ciclo_trabajo_utils import ControladorCiclo, PlanificadorActividad
+from app.utils.evidencias_utils import GrabadorEvidencias
+from app.utils.matcher_utils import MatcherFragmentado
+from app.utils.telemetria_utils import TelemetriaReconocimiento
+from app.utils.directorio_utils import DirectorioEstudiantes
+from app.utils.cache_utils import AUSENTE, MapaTTL
+from app.utils.ingesta_utils import decodificar_imagen, decodificar_lote, iterar_lotes
+from app.utils.rostros_utils import (
+    UMBRAL_RECONOCIMIENTO, matriz_galeria, mejores_coincidencias, distancias_matriz,
+    distancias_por_estudiante, asignar_rostros, generar_teselas, suprimir_duplicados, parametros_version
+)
+
+# Distancia adicional al umbral dentro de la cual un rostro cuenta como "visto" en la telemetría
+MARGEN_TELEMETRIA = 0.1
 
 class AsistenciaService:
     def __init__(self, db_manager):
         self.db = db_manager
+        # Cargar los modelos en segundo plano mientras se prepara el resto
+        gestor_modelos.precalentar()
         self.known_face_encodings = []
         self.known_face_names = []
         self.known_face_ids = []
@@ -22,14 +40,53 @@ class AsistenciaService:
         self.estudiantes_registrados_hoy = set()
         self.cargar_registros_del_dia()
         
-        # Control de QR
-        self.ultimo_qr_detectado = None
-        self.tiempo_ultimo_qr = 0
+        # Control de QR: cada código resuelto se recuerda durante el cooldown,
+        # así varios carnets en el mismo frame no se re-resuelven en cada frame
         self.qr_cooldown = 3  # segundos entre detecciones del mismo QR
+        self.qr_recientes = MapaTTL(self.qr_cooldown, maximo=64)
         
         # Historial para suavizado
         self.detection_history = {}
         self.history_length = 3
+        
+        # Contadores por estudiante, volcados a la base periódicamente
+        self.telemetria = TelemetriaReconocimiento(self.db)
+        
+        config = self.db.obtener_configuracion()
+        qr_manager.configurar_decodificador(config.get('decodificador_qr'))
+        
+        # QR → estudiante y datos de registro sin consultar la base por detección;
+        # los códigos firmados se verifican localmente con el secreto del colegio
+        self.directorio = DirectorioEstudiantes(self.db, secreto=config.get('secreto_qr'))
+        
+        # QR y rostro del mismo frame en paralelo: pyzbar/OpenCV y dlib pasan
+        # casi todo su tiempo en código nativo
+        self.etapas_concurrentes = bool(config.get('etapas_concurrentes', 1))
+        self._pool_etapas = None
+        self._lock_registro = threading.Lock()
+        self.tiempos_etapas = {etapa: {'frames': 0, 'ms': 0.0} for etapa in ('qr', 'rostro', 'frame')}
+        
+        # Ciclo de trabajo según horario (bajo consumo fuera de las horas de entrada)
+        self.ciclo = self.crear_controlador_ciclo(config)
+        
+        # Evidencias fotográficas de cada asistencia (se guardan en segundo plano)
+        self.evidencias = None
+        self.dias_retencion_evidencias = config.get('dias_retencion_evidencias') or 30
+        if config.get('evidencias_habilitadas', 1):
+            self.evidencias = GrabadorEvidencias(self.db, formato=config.get('evidencias_formato') or 'jpg')
+
+    def capturar_evidencia(self, estudiante_id, metodo, frame, caja, fecha_hora=None):
+        """Encola el recorte de evidencia de una asistencia recién registrada"""
+        if self.evidencias:
+            self.evidencias.capturar(estudiante_id, metodo, frame, caja, fecha_hora)
+
+    def crear_controlador_ciclo(self, config=None):
+        """Construye el controlador de ciclo de trabajo desde la configuración"""
+        config = config or self.db.obtener_configuracion()
+        return ControladorCiclo(
+            PlanificadorActividad.desde_configuracion(config),
+            habilitado=bool(config.get('ahorro_energia', 1))
+        )
 
     def cargar_registros_del_dia(self):
         """Carga los estudiantes que ya han registrado asistencia hoy"""
@@ -70,34 +127,281 @@ class AsistenciaService:
         except Exception as e:
             print(f"❌ Error cargando encodings: {e}")
             self.known_face_encodings, self.known_face_names, self.known_face_ids = [], [], []
+        
+        # Matriz (N, 128) para comparar todos los rostros con un solo producto matricial
+        self.galeria = matriz_galeria(self.known_face_encodings)
+        
+        # Los rostros a identificar se codifican con el mismo modelo de landmarks
+        # que la galería activa; vectores de modelos distintos no son comparables
+        _, self.modelo_landmarks, _ = parametros_version(self.db.obtener_version_encodings_activa())
+        
+        # Con galerías regionales grandes la búsqueda se reparte entre varios procesos
+        if getattr(self, 'matcher', None):
+            self.matcher.cerrar()
+        self.matcher = None
+        fragmentos = self.db.obtener_configuracion().get('fragmentos_matcher') or 0
+        if fragmentos > 1 and len(self.galeria) >= fragmentos:
+            self.matcher = MatcherFragmentado(self.galeria, fragmentos)
 
-    def cargar_encodings(self):
-        """Cargar encodings faciales desde la base de datos"""
-        try:
-            self.known_face_encodings, self.known_face_names, self.known_face_ids = self.db.cargar_encodings_faciales()
-            print(f"🔍 Sistema listo con {len(self.known_face_encodings)} encodings de {len(set(self.known_face_ids))} estudiantes")
-        except Exception as e:
-            print(f"❌ Error cargando encodings: {e}")
-            self.known_face_encodings, self.known_face_names, self.known_face_ids = [], [], []
+    def identificar_encodings(self, encodings, umbral=UMBRAL_RECONOCIMIENTO, incluir_candidato=False):
+        """Compara un conjunto de encodings contra la galería en un solo paso vectorizado
+        
+        Retorna una lista de (estudiante_id, nombre, distancia); estudiante_id es
+        None cuando la distancia supera el umbral. Con incluir_candidato=True se
+        agrega el id del estudiante más cercano aunque no supere el umbral.
+        """
+        if len(encodings) == 0:
+            return []
+        
+        if self.matcher:
+            indices, distancias = self.matcher.mejores_coincidencias(encodings)
+        else:
+            indices, distancias = mejores_coincidencias(encodings, self.galeria)
+        
+        resultados = []
+        for indice, distancia in zip(indices, distancias):
+            candidato = self.known_face_ids[indice] if indice >= 0 else None
+            if indice >= 0 and distancia < umbral:
+                resultado = (candidato, self.known_face_names[indice], float(distancia))
+            else:
+                resultado = (None, "Desconocido", float(distancia))
+            resultados.append(resultado + (candidato,) if incluir_candidato else resultado)
+        return resultados
 
-    def procesar_frame_combinado(self, frame):
+    def procesar_frame_combinado(self, frame, forzar_rostro=False, suavizar=True):
             """Procesa frame para detección facial Y de QR de forma optimizada"""
             self.frame_count += 1
+            inicio = time.perf_counter()
+            
+            # Procesar rostro solo cada X frames (las fotos del navegador siempre se procesan)
+            modelos_disponibles = gestor_modelos.estado != gestor_modelos.ERROR
+            procesar_rostro = modelos_disponibles and (forzar_rostro or self.frame_count % self.frame_skip_facial == 0)
             
             # Siempre procesar QR (es menos costoso)
-            qr_estudiantes = self.procesar_qr(frame)
+            if procesar_rostro and self.etapas_concurrentes:
+                qr_estudiantes, rostros = self._procesar_etapas_concurrentes(frame)
+            else:
+                qr_estudiantes = self._medir_etapa('qr', self.procesar_qr, frame)
+                rostros = self._medir_etapa('rostro', self.procesar_rostros, frame) if procesar_rostro else None
             
-            # Procesar rostro solo cada X frames
-            if self.frame_count % self.frame_skip_facial == 0:
-                face_locations, face_names, face_ids, confianzas = self.procesar_rostros(frame)
-                face_locations, face_names, face_ids, confianzas = self.aplicar_suavizado(
-                    face_locations, face_names, face_ids, confianzas
-                )
+            if rostros is not None:
+                face_locations, face_names, face_ids, confianzas = rostros
+                if suavizar:
+                    face_locations, face_names, face_ids, confianzas = self.aplicar_suavizado(
+                        face_locations, face_names, face_ids, confianzas
+                    )
             else:
                 face_locations, face_names, face_ids, confianzas = [], [], [], []
             
+            self._acumular_tiempo('frame', inicio)
             return face_locations, face_names, face_ids, confianzas, qr_estudiantes
 
+    def _procesar_etapas_concurrentes(self, frame):
+        """Lanza QR y rostro en el pool y espera ambos; si el pool falla, sigue en secuencia"""
+        try:
+            if self._pool_etapas is None:
+                self._pool_etapas = ThreadPoolExecutor(max_workers=2, thread_name_prefix="etapa")
+            futuro_qr = self._pool_etapas.submit(self._medir_etapa, 'qr', self.procesar_qr, frame)
+            futuro_rostro = self._pool_etapas.submit(self._medir_etapa, 'rostro', self.procesar_rostros, frame)
+        except RuntimeError as e:
+            print(f"⚠️ Etapas en paralelo no disponibles, se procesan en secuencia: {e}")
+            self.etapas_concurrentes = False
+            return (self._medir_etapa('qr', self.procesar_qr, frame),
+                    self._medir_etapa('rostro', self.procesar_rostros, frame))
+        return futuro_qr.result(), futuro_rostro.result()
+
+    def _medir_etapa(self, etapa, funcion, frame):
+        inicio = time.perf_counter()
+        try:
+            return funcion(frame)
+        finally:
+            self._acumular_tiempo(etapa, inicio)
+
+    def _acumular_tiempo(self, etapa, inicio):
+        tiempos = self.tiempos_etapas[etapa]
+        tiempos['frames'] += 1
+        tiempos['ms'] += (time.perf_counter() - inicio) * 1000
+
+    def resumen_tiempos_etapas(self):
+        """ms promedio por etapa y cuánto del tiempo de QR + rostro se solapó"""
+        promedio = {etapa: (t['ms'] / t['frames'] if t['frames'] else 0.0) for etapa, t in self.tiempos_etapas.items()}
+        suma = self.tiempos_etapas['qr']['ms'] + self.tiempos_etapas['rostro']['ms']
+        promedio['solapamiento'] = max(0.0, 1 - self.tiempos_etapas['frame']['ms'] / suma) if suma else 0.0
+        return promedio
+
+    def cerrar_etapas(self):
+        if self._pool_etapas is not None:
+            self._pool_etapas.shutdown(wait=True)
+            self._pool_etapas = None
+
+    def _registrar_una_vez(self, estudiante_id, confianza, metodo, fecha_hora=None):
+        """Registra si el estudiante aún no tiene asistencia hoy; las etapas QR y rostro
+        pueden correr a la vez, así que la comprobación y el registro van juntos.
+        Con fecha_hora de otro día (grabaciones) el duplicado lo resuelve la base."""
+        es_hoy = fecha_hora is None or fecha_hora.date() == datetime.now().date()
+        with self._lock_registro:
+            if es_hoy and estudiante_id in self.estudiantes_registrados_hoy:
+                return False
+            if not self.registrar_asistencia(estudiante_id, confianza, metodo, fecha_hora):
+                return False
+            if es_hoy:
+                self.estudiantes_registrados_hoy.add(estudiante_id)
+        self.telemetria.confirmar(estudiante_id, metodo)
+        return True
+
+    def procesar_frames_cliente(self, imagenes, tam_lote=8):
+        """Procesa frames enviados desde el navegador (st.camera_input o ráfaga subida)
+        
+        Las imágenes se decodifican por lotes y pasan por el mismo pipeline
+        de rostro + QR que la cámara local, sin necesitar /dev/video0.
+        """
+        resultados = []
+        
+        for lote in iterar_lotes(list(imagenes), tam_lote):
+            frames = decodificar_lote(lote)
+            
+            for frame in frames:
+                if frame is None:
+                    resultados.append(None)
+                    continue
+                
+                # Sin suavizado: los frames pueden venir de distintos kioscos
+                face_locations, face_names, face_ids, confianzas, qr_estudiantes = self.procesar_frame_combinado(
+                    frame, forzar_rostro=True, suavizar=False
+                )
+                frame_anotado = self.dibujar_resultados_combinados(
+                    frame.copy(), face_locations, face_names, confianzas, qr_estudiantes
+                )
+                
+                resultados.append({
+                    'frame': frame_anotado,
+                    'rostros': [
+                        {'id': fid, 'nombre': name, 'confianza': float(conf)}
+                        for name, fid, conf in zip(face_names, face_ids, confianzas)
+                    ],
+                    'qr': [{'id': q['id'], 'nombre': q['nombre']} for q in qr_estudiantes]
+                })
+        
+        # Cada ráfaga es una petición independiente: volcar sus contadores al terminar
+        self.telemetria.volcar()
+        return resultados
+
+    def detectar_rostros_grupales(self, rgb, upsample=1, tam_tesela=800):
+        """Detecta todos los rostros de una foto grupal
+        
+        Usa upsampling para rostros pequeños (fondo del aula) y, en fotos
+        grandes, teselas solapadas cuyos duplicados se eliminan por IoU.
+        """
+        alto, ancho = rgb.shape[:2]
+        face_locations = []
+        
+        for top, left, bottom, right in generar_teselas(alto, ancho, tam_tesela):
+            tesela = np.ascontiguousarray(rgb[top:bottom, left:right])
+            for t, r, b, l in face_recognition.face_locations(tesela, number_of_times_to_upsample=upsample, model="hog"):
+                face_locations.append((t + top, r + left, b + top, l + left))
+        
+        return suprimir_duplicados(face_locations)
+
+    def pase_lista_fotos(self, imagenes, seccion_id=None, upsample=1, umbral=UMBRAL_RECONOCIMIENTO):
+        """Pase de lista con una o varias fotos del aula
+        
+        Detecta todos los rostros, los codifica en lote y los compara contra la
+        galería de la sección en un único paso vectorizado. Registra a todos los
+        reconocidos en una sola transacción y devuelve los rostros sin
+        coincidencia para revisión manual.
+        """
+        inicio = time.time()
+        
+        # Galería de la sección (o la general si no se indica sección)
+        if seccion_id:
+            encodings, nombres, ids = self.db.cargar_encodings_faciales(seccion_id)
+            galeria = matriz_galeria(encodings)
+        else:
+            galeria, nombres, ids = self.galeria, self.known_face_names, self.known_face_ids
+        nombres_por_id = dict(zip(ids, nombres))
+        
+        fotos = []
+        encodings_rostros = []
+        origen_rostros = []  # (indice_foto, location)
+        
+        for indice_foto, datos in enumerate(imagenes):
+            frame = decodificar_imagen(datos, ancho_max=2000)
+            if frame is None:
+                continue
+            rgb = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+            
+            face_locations = self.detectar_rostros_grupales(rgb, upsample)
+            # Una sola llamada codifica todos los rostros de la foto
+            encodings_foto = face_recognition.face_encodings(rgb, face_locations, model=self.modelo_landmarks)
+            
+            fotos.append(frame)
+            encodings_rostros.extend(encodings_foto)
+            origen_rostros.extend((len(fotos) - 1, loc) for loc in face_locations)
+        
+        # Matriz rostros × estudiantes con la mínima distancia a cada galería
+        distancias = distancias_matriz(encodings_rostros, galeria)
+        ids_unicos, minimos = distancias_por_estudiante(distancias, ids)
+        
+        # Asignar por foto: dentro de una foto cada estudiante aparece una sola vez
+        indices_foto = np.array([indice_foto for indice_foto, _ in origen_rostros], dtype=np.int64)
+        filas_reconocidas = {}
+        reconocidos = {}
+        for indice_foto in range(len(fotos)):
+            filas_foto = np.nonzero(indices_foto == indice_foto)[0]
+            for fila_local, columna in asignar_rostros(minimos[filas_foto], umbral).items():
+                fila = int(filas_foto[fila_local])
+                estudiante_id = int(ids_unicos[columna])
+                confianza = 1 - float(minimos[fila, columna])
+                filas_reconocidas[fila] = estudiante_id
+                # Un estudiante puede aparecer en varias fotos: quedarse con la mejor
+                if confianza > reconocidos.get(estudiante_id, (None, -1))[1]:
+                    reconocidos[estudiante_id] = (fila, confianza)
+        
+        registrados = self.db.registrar_asistencias_lote(
+            [(estudiante_id, confianza) for estudiante_id, (_, confianza) in reconocidos.items()], 'rostro'
+        )
+        self.estudiantes_registrados_hoy.update(registrados)
+        for estudiante_id in registrados:
+            fila = reconocidos[estudiante_id][0]
+            indice_foto, location = origen_rostros[fila]
+            self.capturar_evidencia(estudiante_id, 'rostro', fotos[indice_foto], location)
+        
+        # Anotar fotos y armar lista de revisión
+        # Recortar antes de dibujar para que los recuadros no tapen los rostros
+        sin_coincidencia = []
+        for fila, (indice_foto, (top, right, bottom, left)) in enumerate(origen_rostros):
+            if fila not in filas_reconocidas:
+                sin_coincidencia.append({
+                    'foto': indice_foto,
+                    'recorte': fotos[indice_foto][max(0, top):bottom, max(0, left):right].copy(),
+                    'distancia': float(minimos[fila].min()) if minimos.shape[1] else None
+                })
+        
+        for fila, (indice_foto, (top, right, bottom, left)) in enumerate(origen_rostros):
+            frame = fotos[indice_foto]
+            if fila in filas_reconocidas:
+                cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
+                cv2.putText(frame, nombres_por_id.get(filas_reconocidas[fila], ""), (left, top - 6),
+                           cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+            else:
+                cv2.rectangle(frame, (left, top), (right, bottom), (0, 0, 255), 2)
+        
+        tiempo = time.time() - inicio
+        print(f"📸 Pase de lista: {len(origen_rostros)} rostros, {len(reconocidos)} reconocidos, "
+              f"{len(registrados)} registrados en {tiempo:.1f}s")
+        
+        return {
+            'fotos': fotos,
+            'rostros_detectados': len(origen_rostros),
+            'reconocidos': [
+                {'id': estudiante_id, 'nombre': nombres_por_id.get(estudiante_id, ""), 'confianza': confianza,
+                 'registrado': estudiante_id in registrados}
+                for estudiante_id, (_, confianza) in reconocidos.items()
+            ],
+            'sin_coincidencia': sin_coincidencia,
+            'tiempo': tiempo
+        }
+
     def procesar_rostros(self, frame):
         """Procesa detección facial optimizada"""
         # Reducir tamaño para mejor performance
@@ -106,46 +410,39 @@ class AsistenciaService:
         
         # DETECCIÓN FACIAL
         face_locations = face_recognition.face_locations(rgb_small_frame, model="hog")
-        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations)
+        face_encodings = face_recognition.face_encodings(rgb_small_frame, face_locations, model=self.modelo_landmarks)
+        
+        # Escalar coordenadas faciales de vuelta al tamaño original
+        face_locations = [(top * 2, right * 2, bottom * 2, left * 2) 
+                         for (top, right, bottom, left) in face_locations]
         
         face_names = []
         face_ids = []
         confianzas = []
         
-        for face_encoding in face_encodings:
-            if len(self.known_face_encodings) == 0:
-                face_names.append("Desconocido")
-                face_ids.append(None)
-                confianzas.append(0.0)
-                continue
-                
-            face_distances = face_recognition.face_distance(self.known_face_encodings, face_encoding)
-            best_match_index = np.argmin(face_distances)
-            best_distance = face_distances[best_match_index]
-            confianza = 1 - best_distance
+        identificados = self.identificar_encodings(face_encodings, incluir_candidato=True)
+        for location, (estudiante_id, name, distancia, candidato) in zip(face_locations, identificados):
+            # Telemetría: rostros cercanos a un estudiante aunque no alcancen el umbral
+            if candidato is not None and distancia < UMBRAL_RECONOCIMIENTO + MARGEN_TELEMETRIA:
+                self.telemetria.observar(candidato, distancia, estudiante_id is not None,
+                                         candidato in self.estudiantes_registrados_hoy)
             
-            if best_distance < 0.6:  # Threshold de reconocimiento
-                name = self.known_face_names[best_match_index]
-                estudiante_id = self.known_face_ids[best_match_index]
+            if len(self.known_face_encodings) == 0:
+                confianza = 0.0
+            elif estudiante_id is not None:
+                confianza = 1 - distancia
                 
                 # Registrar solo si no se ha registrado hoy
-                if estudiante_id not in self.estudiantes_registrados_hoy:
-                    if self.registrar_asistencia(estudiante_id, confianza, 'rostro'):
-                        self.estudiantes_registrados_hoy.add(estudiante_id)
-                        print(f"✅ Asistencia registrada: {name} por rostro (conf: {confianza:.2f})")
+                if self._registrar_una_vez(estudiante_id, confianza, 'rostro'):
+                    self.capturar_evidencia(estudiante_id, 'rostro', frame, location)
+                    print(f"✅ Asistencia registrada: {name} por rostro (conf: {confianza:.2f})")
             else:
-                name = "Desconocido"
-                estudiante_id = None
-                confianza = best_distance
+                confianza = distancia
             
             face_names.append(name)
             face_ids.append(estudiante_id)
             confianzas.append(confianza)
         
-        # Escalar coordenadas faciales de vuelta al tamaño original
-        face_locations = [(top * 2, right * 2, bottom * 2, left * 2) 
-                         for (top, right, bottom, left) in face_locations]
-        
         return face_locations, face_names, face_ids, confianzas
     
     def procesar_qr(self, frame):
@@ -158,33 +455,38 @@ class AsistenciaService:
             for qr in qr_datos:
                 qr_data = qr['data']
                 
-                # Evitar múltiples registros del mismo QR
-                tiempo_actual = time.time()
-                if (self.ultimo_qr_detectado == qr_data and 
-                    tiempo_actual - self.tiempo_ultimo_qr < self.qr_cooldown):
+                # Código visto hace menos del cooldown: solo se vuelve a dibujar
+                reciente = self.qr_recientes.obtener(qr_data, AUSENTE)
+                if reciente is not AUSENTE:
+                    if reciente:
+                        qr_estudiantes.append(dict(reciente, rect=qr['rect']))
                     continue
                 
                 # Buscar estudiante por QR
-                estudiante = self.db.obtener_estudiante_por_qr(qr_data)
-                if estudiante:
-                    estudiante_id = estudiante[0]
-                    nombre = f"{estudiante[2]} {estudiante[3]}"
-                    
-                    # Registrar solo si no se ha registrado hoy
-                    if estudiante_id not in self.estudiantes_registrados_hoy:
-                        if self.registrar_asistencia(estudiante_id, 1.0, 'qr'):
-                            self.estudiantes_registrados_hoy.add(estudiante_id)
-                            print(f"✅ Asistencia registrada: {nombre} por QR")
-                    
-                    qr_estudiantes.append({
-                        'id': estudiante_id,
-                        'nombre': nombre,
-                        'qr_data': qr_data,
-                        'rect': qr['rect']
-                    })
-                    
-                    self.ultimo_qr_detectado = qr_data
-                    self.tiempo_ultimo_qr = tiempo_actual
+                estudiante = self.directorio.resolver_qr(qr_data)
+                if not estudiante:
+                    # Los códigos desconocidos también esperan el cooldown
+                    self.qr_recientes.guardar(qr_data, None)
+                    continue
+                
+                estudiante_id = estudiante[0]
+                nombre = f"{estudiante[2]} {estudiante[3]}"
+                
+                # Registrar solo si no se ha registrado hoy
+                if self._registrar_una_vez(estudiante_id, 1.0, 'qr'):
+                    rect = qr['rect']
+                    self.capturar_evidencia(estudiante_id, 'qr', frame,
+                                            (rect.top, rect.left + rect.width, rect.top + rect.height, rect.left))
+                    print(f"✅ Asistencia registrada: {nombre} por QR")
+                
+                resultado = {
+                    'id': estudiante_id,
+                    'nombre': nombre,
+                    'qr_data': qr_data,
+                    'rect': qr['rect']
+                }
+                qr_estudiantes.append(resultado)
+                self.qr_recientes.guardar(qr_data, resultado)
                     
         except Exception as e:
             print(f"❌ Error en detección QR: {e}")
@@ -304,8 +606,10 @@ class AsistenciaService:
         
         return frame
 
-    def registrar_asistencia(self, estudiante_id, confianza, metodo):
-        return self.db.registrar_asistencia(estudiante_id, metodo, confianza)
+    def registrar_asistencia(self, estudiante_id, confianza, metodo, fecha_hora=None):
+        # Si el directorio aún no conoce al estudiante, la base hace la verificación completa
+        datos = self.directorio.datos_registro(estudiante_id)
+        return self.db.registrar_asistencia(estudiante_id, metodo, confianza, fecha_hora, datos)
         
     def registrar_asistencia_unica(self, estudiante_id, confianza, metodo):
         """Registrar asistencia solo si no se ha registrado hoy"""
@@ -353,6 +657,13 @@ class AsistenciaService:
         cap.set(cv2.CAP_PROP_FRAME_WIDTH, 640)
         cap.set(cv2.CAP_PROP_FRAME_HEIGHT, 480)
         cap.set(cv2.CAP_PROP_FPS, 30)
+        cap.set(cv2.CAP_PROP_BUFFERSIZE, 1)  # En reposo no acumular frames viejos
+        
+        if not gestor_modelos.esperar():
+            print("⚠️ Modelos de reconocimiento no disponibles, solo se detectarán códigos QR")
+        
+        if self.evidencias:
+            self.evidencias.podar_en_segundo_plano(self.dias_retencion_evidencias)
         
         try:
             while True:
@@ -361,26 +672,47 @@ class AsistenciaService:
                     print("❌ Error al capturar frame")
                     break
                 
-                # Procesar frame combinado
-                face_locations, face_names, face_ids, confianzas, qr_estudiantes = self.procesar_frame_combinado(frame)
+                modo = self.ciclo.evaluar(frame)
                 
-                # Dibujar resultados combinados
-                frame = self.dibujar_resultados_combinados(frame, face_locations, face_names, confianzas, qr_estudiantes)
+                if modo == ControladorCiclo.ACTIVO:
+                    # Procesar frame combinado
+                    face_locations, face_names, face_ids, confianzas, qr_estudiantes = self.procesar_frame_combinado(frame)
+                    
+                    # Dibujar resultados combinados
+                    frame = self.dibujar_resultados_combinados(frame, face_locations, face_names, confianzas, qr_estudiantes)
+                    self.telemetria.volcar_si_corresponde()
+                else:
+                    # Fuera de horario: sin HOG ni QR hasta detectar movimiento
+                    cv2.putText(frame, "Modo ahorro de energia", (10, 30),
+                               cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 165, 255), 2)
                 
                 # Mostrar frame
                 cv2.imshow('Sistema de Asistencias - Rostro + QR', frame)
                 
                 # Controles
-                key = cv2.waitKey(1) & 0xFF
+                key = cv2.waitKey(self.ciclo.espera_ms(modo)) & 0xFF
                 if key == ord('q'):
                     break
                 elif key == ord('r'):
                     self.cargar_encodings()
-                    print("✅ Encodings recargados")
+                    self.ciclo = self.crear_controlador_ciclo()
+                    print("✅ Encodings y horario recargados")
                     
         finally:
             cap.release()
             cv2.destroyAllWindows()
+            self.telemetria.volcar()
+            if self.evidencias:
+                self.evidencias.cerrar()
+            qr = self.qr_recientes.estadisticas()
+            print(f"🔁 Cooldown QR: {qr['aciertos']} lecturas repetidas evitadas, {qr['fallos']} resoluciones")
+            self.cerrar_etapas()
+            tiempos = self.resumen_tiempos_etapas()
+            print(f"⏱️ Por frame: QR {tiempos['qr']:.1f} ms, rostro {tiempos['rostro']:.1f} ms, "
+                  f"total {tiempos['frame']:.1f} ms ({tiempos['solapamiento']:.0%} solapado)")
+            for etapa, tiempos in qr_manager.obtener_tiempos_etapas().items():
+                print(f"⏱️ QR etapa {etapa}: {tiempos['llamadas']} ejecuciones, "
+                      f"{tiempos['ms_promedio']:.1f} ms promedio, {tiempos['exitos']} con QR")
             print("✅ Sistema combinado detenido")
    
         """Obtiene las asistencias del día actual"""
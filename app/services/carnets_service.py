@@ -0,0 +1,109 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+from PIL import Image, ImageDraw, ImageFont
+
+from app.utils.almacen_utils import resolver_ruta_imagen
+from app.utils.pdf_utils import EscritorPDF, comprimir_pixeles
+from app.utils.qr_utils import generar_qr_nitido
+
+# Hoja A4 a 150 ppp, 3 x 4 carnets por hoja
+TAMANO_HOJA_PX = (1240, 1754)
+MARGEN_HOJA_PX = 40
+COLUMNAS, FILAS = 3, 4
+CARNETS_POR_HOJA = COLUMNAS * FILAS
+
+
+def _fuente(tamano):
+    try:
+        return ImageFont.truetype("DejaVuSans.ttf", tamano)
+    except OSError:
+        return ImageFont.load_default(size=tamano)
+
+
+def _ajustar_texto(dibujo, texto, fuente, ancho_max):
+    while texto and dibujo.textlength(texto, font=fuente) > ancho_max:
+        texto = texto[:-2] + "…"
+    return texto
+
+
+def _renderizar_hoja(args):
+    """Dibuja una hoja con hasta 12 carnets y la comprime (se ejecuta en un proceso aparte)"""
+    estudiantes, incluir_foto, raiz_almacen = args
+    modo = 'RGB' if incluir_foto else 'L'
+    hoja = Image.new(modo, TAMANO_HOJA_PX, 'white')
+    dibujo = ImageDraw.Draw(hoja)
+    fuente_nombre, fuente_datos, fuente_codigo = _fuente(24), _fuente(19), _fuente(15)
+
+    ancho_celda = (TAMANO_HOJA_PX[0] - 2 * MARGEN_HOJA_PX) // COLUMNAS
+    alto_celda = (TAMANO_HOJA_PX[1] - 2 * MARGEN_HOJA_PX) // FILAS
+    for posicion, (_, nombre, apellido, dni, qr_code, seccion, imagen_path) in enumerate(estudiantes):
+        x = MARGEN_HOJA_PX + (posicion % COLUMNAS) * ancho_celda
+        y = MARGEN_HOJA_PX + (posicion // COLUMNAS) * alto_celda
+        # Línea de corte
+        dibujo.rectangle([x, y, x + ancho_celda - 1, y + alto_celda - 1], outline='gray')
+
+        foto = None
+        ruta = resolver_ruta_imagen(imagen_path, raiz_almacen) if incluir_foto else None
+        if ruta and os.path.exists(ruta):
+            try:
+                with Image.open(ruta) as original:
+                    foto = original.convert(modo)
+                    foto.thumbnail((130, 160))
+            except OSError:
+                foto = None
+
+        lado_qr = 200 if incluir_foto else 260
+        if foto:
+            bloque = foto.width + 16 + lado_qr
+            inicio = x + (ancho_celda - bloque) // 2
+            hoja.paste(foto, (inicio, y + 20 + (lado_qr - foto.height) // 2))
+            hoja.paste(generar_qr_nitido(qr_code, lado_qr).convert(modo), (inicio + foto.width + 16, y + 20))
+        else:
+            hoja.paste(generar_qr_nitido(qr_code, lado_qr).convert(modo), (x + (ancho_celda - lado_qr) // 2, y + 20))
+
+        texto_y = y + 30 + lado_qr
+        for texto, fuente in (
+            (apellido, fuente_nombre),
+            (nombre, fuente_nombre),
+            (f"DNI {dni}  ·  {seccion or 'Sin sección'}", fuente_datos),
+            (qr_code, fuente_codigo)
+        ):
+            texto = _ajustar_texto(dibujo, texto, fuente, ancho_celda - 20)
+            dibujo.text((x + ancho_celda // 2, texto_y), texto, fill='black', font=fuente, anchor='ma')
+            texto_y += fuente.size + 10
+
+    return comprimir_pixeles(hoja.tobytes()), modo == 'L'
+
+
+class CarnetsService:
+    """Hojas A4 imprimibles con los carnets QR de una sección o grado"""
+
+    def __init__(self, db_manager):
+        self.db = db_manager
+
+    def generar_pdf(self, archivo, seccion_id=None, grado_id=None, incluir_foto=False, procesos=None, progreso=None):
+        """Escribe el PDF en `archivo` hoja por hoja y retorna un resumen
+
+        Las hojas se dibujan y comprimen en un pool de procesos; en este proceso
+        solo se escriben, en orden, a medida que llegan.
+        """
+        inicio = time.time()
+        estudiantes = self.db.obtener_estudiantes_para_carnets(seccion_id, grado_id)
+        if not estudiantes:
+            return {'estudiantes': 0, 'hojas': 0, 'tiempo': 0.0}
+
+        raiz_almacen = self.db.obtener_configuracion().get('directorio_imagenes')
+        hojas = [estudiantes[i:i + CARNETS_POR_HOJA] for i in range(0, len(estudiantes), CARNETS_POR_HOJA)]
+        escritor = EscritorPDF(archivo)
+        with ProcessPoolExecutor(max_workers=procesos or os.cpu_count()) as executor:
+            tareas = ((hoja, incluir_foto, raiz_almacen) for hoja in hojas)
+            for numero, (datos, gris) in enumerate(executor.map(_renderizar_hoja, tareas), 1):
+                escritor.agregar_pagina_imagen(*TAMANO_HOJA_PX, datos, gris=gris)
+                if progreso:
+                    progreso(numero, len(hojas))
+        escritor.cerrar()
+
+        tiempo = time.time() - inicio
+        print(f"🖨️ {len(estudiantes)} carnets en {len(hojas)} hojas ({tiempo:.1f}s)")
+        return {'estudiantes': len(estudiantes), 'hojas': len(hojas), 'tiempo': tiempo}
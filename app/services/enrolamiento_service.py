@@ -0,0 +1,182 @@
+import os
+import shutil
+import tempfile
+import time
+import zipfile
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils.almacen_utils import AlmacenImagenes, alinear_rostro
+from app.utils.rostros_utils import parametros_version
+
+EXTENSIONES_IMAGEN = {'.jpg', '.jpeg', '.png', '.bmp', '.webp'}
+
+
+def _codificar_imagen(args):
+    """Detecta y codifica el rostro de una imagen (se ejecuta en un proceso aparte)
+
+    Retorna también el rostro alineado, que es lo único que se conserva.
+    """
+    ruta, modelo_deteccion, modelo_landmarks, num_jitters, ancho_max = args
+
+    import cv2
+    import face_recognition
+
+    try:
+        imagen = cv2.imread(ruta)
+        if imagen is None:
+            return ruta, -1, None, None
+
+        alto, ancho = imagen.shape[:2]
+        if ancho > ancho_max:
+            escala = ancho_max / ancho
+            imagen = cv2.resize(imagen, (ancho_max, int(alto * escala)), interpolation=cv2.INTER_AREA)
+
+        rgb = cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
+        face_locations = face_recognition.face_locations(rgb, model=modelo_deteccion)
+        if len(face_locations) != 1:
+            return ruta, len(face_locations), None, None
+
+        encoding = face_recognition.face_encodings(rgb, face_locations, num_jitters=num_jitters, model=modelo_landmarks)[0]
+        landmarks = face_recognition.face_landmarks(rgb, face_locations)
+        recorte = alinear_rostro(imagen, face_locations[0], landmarks[0] if landmarks else None)
+        return ruta, 1, encoding, recorte
+    except Exception as e:
+        print(f"❌ Error procesando {ruta}: {e}")
+        return ruta, -1, None, None
+
+
+class EnrolamientoMasivoService:
+    """Importación masiva de rostros desde carpetas o archivos ZIP
+
+    Cada imagen debe llamarse con el DNI, el código QR o `id<N>` del
+    estudiante; un sufijo `_2`, `_3`... permite varias fotos por estudiante.
+    """
+
+    def __init__(self, db_manager, procesos=None, tam_lote=200, ancho_max=1024):
+        self.db = db_manager
+        self.procesos = procesos or max(1, (os.cpu_count() or 2) - 1)
+        # Codificar con los mismos parámetros que la galería activa
+        self.version = self.db.obtener_version_encodings_activa()
+        self.modelo_deteccion, self.modelo_landmarks, self.num_jitters = parametros_version(self.version)
+        self.tam_lote = tam_lote
+        self.ancho_max = ancho_max
+
+    def extraer_zip(self, archivo_zip, destino=None):
+        """Extrae las imágenes de un ZIP (ruta o archivo subido) a una carpeta temporal"""
+        destino = destino or tempfile.mkdtemp(prefix="importacion_rostros_")
+        os.makedirs(destino, exist_ok=True)
+
+        with zipfile.ZipFile(archivo_zip) as zf:
+            for miembro in zf.infolist():
+                nombre = os.path.basename(miembro.filename)
+                if miembro.is_dir() or not nombre or os.path.splitext(nombre)[1].lower() not in EXTENSIONES_IMAGEN:
+                    continue
+                # Aplanar rutas internas para evitar escrituras fuera del destino
+                ruta_destino = os.path.join(destino, nombre)
+                if os.path.exists(ruta_destino):
+                    base, extension = os.path.splitext(nombre)
+                    ruta_destino = os.path.join(destino, f"{base}_{miembro.CRC:08x}{extension}")
+                with zf.open(miembro) as origen, open(ruta_destino, "wb") as salida:
+                    salida.write(origen.read())
+        return destino
+
+    def listar_imagenes(self, carpeta):
+        imagenes = []
+        for raiz, _, archivos in os.walk(carpeta):
+            for archivo in archivos:
+                if os.path.splitext(archivo)[1].lower() in EXTENSIONES_IMAGEN:
+                    imagenes.append(os.path.abspath(os.path.join(raiz, archivo)))
+        return sorted(imagenes)
+
+    def resolver_estudiante(self, ruta, claves):
+        """Obtiene el id del estudiante a partir del nombre del archivo"""
+        clave = os.path.splitext(os.path.basename(ruta))[0].strip()
+        while clave:
+            if clave in claves:
+                return claves[clave]
+            if clave.lower() in claves:
+                return claves[clave.lower()]
+            if '_' not in clave:
+                break
+            clave = clave.rsplit('_', 1)[0]
+        return None
+
+    def importar(self, origen, progreso=None):
+        """Importa todas las imágenes de una carpeta o ZIP
+
+        progreso: callback opcional progreso(imagenes_procesadas, total).
+        Retorna un reporte con las imágenes sin rostro, con varios rostros,
+        sin estudiante asociado o ilegibles. De cada foto solo se guarda el
+        rostro alineado en el almacén; lo extraído del ZIP se borra al terminar.
+        """
+        inicio = time.time()
+
+        extraido = zipfile.is_zipfile(origen)
+        carpeta = self.extraer_zip(origen) if extraido else origen
+        almacen = AlmacenImagenes.desde_configuracion(self.db.obtener_configuracion())
+        try:
+            return self._importar_carpeta(carpeta, almacen, progreso, inicio, extraido)
+        finally:
+            almacen.cerrar()
+            if extraido:
+                shutil.rmtree(carpeta, ignore_errors=True)
+
+    def _importar_carpeta(self, carpeta, almacen, progreso, inicio, extraido):
+        # Las rutas temporales del ZIP no le sirven al usuario: reportar el nombre dentro del ZIP
+        def nombre(ruta):
+            return os.path.relpath(ruta, carpeta) if extraido else ruta
+
+        claves = self.db.obtener_claves_estudiantes()
+        reporte = {
+            'total': 0,
+            'guardados': 0,
+            'estudiantes': set(),
+            'sin_rostro': [],
+            'varios_rostros': [],
+            'sin_estudiante': [],
+            'ilegibles': [],
+            'tiempo': 0.0
+        }
+
+        # Resolver estudiantes antes de gastar CPU en imágenes que no se usarán
+        tareas = []
+        destinos = {}
+        for ruta in self.listar_imagenes(carpeta):
+            estudiante_id = self.resolver_estudiante(ruta, claves)
+            if estudiante_id is None:
+                reporte['sin_estudiante'].append(nombre(ruta))
+            else:
+                destinos[ruta] = estudiante_id
+                tareas.append((ruta, self.modelo_deteccion, self.modelo_landmarks, self.num_jitters, self.ancho_max))
+
+        reporte['total'] = len(tareas) + len(reporte['sin_estudiante'])
+        print(f"📦 Importando {len(tareas)} imágenes con {self.procesos} procesos")
+
+        lote = []
+        with ProcessPoolExecutor(max_workers=self.procesos) as executor:
+            resultados = executor.map(_codificar_imagen, tareas, chunksize=8)
+            for procesadas, (ruta, n_rostros, encoding, recorte) in enumerate(resultados, start=1):
+                if n_rostros == 1:
+                    lote.append((destinos[ruta], encoding, almacen.guardar(recorte)))
+                    reporte['estudiantes'].add(destinos[ruta])
+                elif n_rostros == 0:
+                    reporte['sin_rostro'].append(nombre(ruta))
+                elif n_rostros > 1:
+                    reporte['varios_rostros'].append(nombre(ruta))
+                else:
+                    reporte['ilegibles'].append(nombre(ruta))
+
+                if len(lote) >= self.tam_lote:
+                    reporte['guardados'] += self.db.guardar_encodings_faciales_lote(lote, self.version)
+                    lote = []
+
+                if progreso:
+                    progreso(procesadas, len(tareas))
+
+        reporte['guardados'] += self.db.guardar_encodings_faciales_lote(lote, self.version)
+        reporte['tiempo'] = time.time() - inicio
+
+        print(f"📊 Importación: {reporte['guardados']} encodings de {len(reporte['estudiantes'])} estudiantes, "
+              f"{len(reporte['sin_rostro'])} sin rostro, {len(reporte['varios_rostros'])} con varios rostros, "
+              f"{len(reporte['sin_estudiante'])} sin estudiante ({reporte['tiempo']:.1f}s)")
+        return reporte
@@ -5,6 +5,9 @@ class EstudianteService:
     def agregar_estudiante(self, dni, nombre, apellido, fecha_nacimiento, genero, telefono, email, direccion, nombre_contacto_emergencia, telefono_contacto_emergencia, turno, año_escolar, seccion_id):
         return self.db.agregar_estudiante(dni, nombre, apellido, fecha_nacimiento, genero, telefono, email, direccion, nombre_contacto_emergencia, telefono_contacto_emergencia, turno, año_escolar, seccion_id)
 
+    def agregar_estudiantes_lote(self, filas):
+        return self.db.agregar_estudiantes_lote(filas)
+
     def obtener_todos(self):
         return self.db.obtener_estudiantes()
 
@@ -37,10 +40,21 @@ class EstudianteService:
 
     def obtener_niveles_activos(self):
         return self.db.obtener_niveles()
+
+    def obtener_estudiantes_sin_qr(self):
+        return self.db.obtener_estudiantes_sin_qr()
+
+    def reparar_codigos_qr(self, firmar_todos=False):
+        return self.db.reparar_codigos_qr(firmar_todos)
+
     def obtener_estudiantes_con_qr(self):
         """Obtiene lista de estudiantes que tienen QR generado"""
         return self.db.obtener_estudiantes_con_qr()
 
     def obtener_qr_imagen(self, estudiante_id):
         """Genera la imagen QR para un estudiante"""
-        return self.db.obtener_qr_imagen(estudiante_id)
\ No newline at end of file
+        return self.db.obtener_qr_imagen(estudiante_id)
+
+    def obtener_qr_png(self, estudiante_id):
+        """PNG del QR del estudiante, el mismo para la vista previa y la descarga"""
+        return self.db.obtener_qr_png(estudiante_id)
@@ -0,0 +1,171 @@
+import time
+import numpy as np
+
+from app.utils.rostros_utils import (
+    UMBRAL_RECONOCIMIENTO, distancias_matriz, matriz_galeria, seleccion_diversa
+)
+
+
+class GaleriaService:
+    """Mantenimiento de la galería de encodings faciales"""
+
+    def __init__(self, db_manager, tam_bloque=1024):
+        self.db = db_manager
+        self.tam_bloque = tam_bloque
+
+    def _cargar(self, estudiante_ids=None):
+        filas = self.db.obtener_encodings_galeria(estudiante_ids)
+        ids_encoding = np.array([f[0] for f in filas], dtype=np.int64)
+        ids_estudiante = np.array([f[1] for f in filas], dtype=np.int64)
+        return ids_encoding, ids_estudiante, matriz_galeria([f[2] for f in filas])
+
+    def calidad_coincidencia(self, ids_estudiante, matriz, conservar, umbral=UMBRAL_RECONOCIMIENTO):
+        """Evalúa cada encoding original contra la galería `conservar` (máscara booleana)
+
+        Excluye al propio encoding (leave-one-out) y retorna la tasa de aciertos,
+        la distancia media al encoding correcto más cercano y el margen medio
+        frente al estudiante equivocado más cercano.
+        """
+        galeria = matriz[conservar]
+        ids_galeria = ids_estudiante[conservar]
+        posiciones_galeria = np.flatnonzero(conservar)
+        n = matriz.shape[0]
+        if n == 0 or galeria.shape[0] == 0:
+            return {'tasa_acierto': 0.0, 'distancia_genuina': float('nan'), 'margen': float('nan')}
+
+        aciertos = 0
+        genuinas = []
+        margenes = []
+        for inicio in range(0, n, self.tam_bloque):
+            fin = min(inicio + self.tam_bloque, n)
+            distancias = distancias_matriz(matriz[inicio:fin], galeria)
+            # Un encoding no puede emparejarse consigo mismo
+            filas = np.arange(fin - inicio)[:, None]
+            distancias[(posiciones_galeria[None, :] == (filas + inicio))] = np.inf
+
+            mismo = ids_galeria[None, :] == ids_estudiante[inicio:fin, None]
+            genuina = np.where(mismo, distancias, np.inf).min(axis=1)
+            impostora = np.where(mismo, np.inf, distancias).min(axis=1)
+
+            aciertos += int(np.count_nonzero((genuina < impostora) & (genuina < umbral)))
+            validas = np.isfinite(genuina) & np.isfinite(impostora)
+            genuinas.append(genuina[np.isfinite(genuina)])
+            margenes.append((impostora - genuina)[validas])
+
+        genuinas = np.concatenate(genuinas)
+        margenes = np.concatenate(margenes)
+        return {
+            'tasa_acierto': aciertos / n,
+            'distancia_genuina': float(genuinas.mean()) if genuinas.size else float('nan'),
+            'margen': float(margenes.mean()) if margenes.size else float('nan')
+        }
+
+    def podar(self, maximo_por_estudiante, estudiante_ids=None, simular=False):
+        """Conserva por estudiante un subconjunto diverso de hasta `maximo_por_estudiante` encodings
+
+        Con simular=True solo calcula el reporte sin eliminar nada.
+        """
+        inicio = time.time()
+        ids_encoding, ids_estudiante, matriz = self._cargar(estudiante_ids)
+        conservar = np.ones(len(ids_encoding), dtype=bool)
+
+        # Los encodings vienen ordenados por estudiante: recorrer cada tramo contiguo
+        estudiantes_podados = 0
+        if len(ids_estudiante):
+            _, inicios, cantidades = np.unique(ids_estudiante, return_index=True, return_counts=True)
+            for desde, cantidad in zip(inicios, cantidades):
+                if cantidad <= maximo_por_estudiante:
+                    continue
+                elegidos = seleccion_diversa(matriz[desde:desde + cantidad], maximo_por_estudiante)
+                tramo = np.zeros(cantidad, dtype=bool)
+                tramo[elegidos] = True
+                conservar[desde:desde + cantidad] = tramo
+                estudiantes_podados += 1
+
+        eliminar = ids_encoding[~conservar]
+        reporte = {
+            'antes': int(len(ids_encoding)),
+            'despues': int(np.count_nonzero(conservar)),
+            'estudiantes_podados': estudiantes_podados,
+            'calidad_antes': None,
+            'calidad_despues': None,
+            'eliminados': 0,
+            'tiempo': 0.0
+        }
+        if len(eliminar):
+            reporte['calidad_antes'] = self.calidad_coincidencia(ids_estudiante, matriz, np.ones_like(conservar))
+            reporte['calidad_despues'] = self.calidad_coincidencia(ids_estudiante, matriz, conservar)
+            if not simular:
+                reporte['eliminados'] = self.db.eliminar_encodings(eliminar.tolist())
+
+        reporte['tiempo'] = time.time() - inicio
+        print(f"✂️ Galería: {reporte['antes']} → {reporte['despues']} encodings "
+              f"({estudiantes_podados} estudiantes podados, {reporte['tiempo']:.1f}s)")
+        return reporte
+
+    def aplicar_politica(self, estudiante_ids=None):
+        """Poda automática tras una captura o importación si está habilitada en configuración"""
+        config = self.db.obtener_configuracion()
+        if not config.get('poda_automatica'):
+            return None
+        return self.podar(config.get('max_encodings_por_estudiante') or 10, estudiante_ids)
+
+    def auditar_duplicados(self, umbral=0.45, tam_bloque=2048):
+        """Busca pares de estudiantes distintos con rostros casi idénticos
+
+        Recorre la galería en bloques de filas en float32: cada bloque se
+        compara contra toda la galería con un producto de matrices y se reduce
+        a la distancia mínima por par de estudiantes, de modo que la memoria
+        queda acotada a (tam_bloque × N) sin importar el tamaño de la galería.
+        Retorna los pares ordenados de menor a mayor distancia.
+        """
+        inicio = time.time()
+        _, ids_estudiante, matriz = self._cargar()
+        n = matriz.shape[0]
+        pares = {}
+
+        if n:
+            galeria = matriz.astype(np.float32)
+            normas = np.einsum('ij,ij->i', galeria, galeria)
+            umbral_cuadrado = np.float32(umbral * umbral)
+
+            # Tramos contiguos por estudiante (la galería viene ordenada por estudiante)
+            ids_unicos, inicios_columnas = np.unique(ids_estudiante, return_index=True)
+
+            for desde in range(0, n, tam_bloque):
+                hasta = min(desde + tam_bloque, n)
+                cuadrados = normas[desde:hasta, None] + normas[None, :] - 2.0 * (galeria[desde:hasta] @ galeria.T)
+
+                # Mínimo por estudiante en columnas y luego en filas
+                por_columna = np.minimum.reduceat(cuadrados, inicios_columnas, axis=1)
+                ids_bloque = ids_estudiante[desde:hasta]
+                filas_unicas, inicios_filas = np.unique(ids_bloque, return_index=True)
+                por_par = np.minimum.reduceat(por_columna, inicios_filas, axis=0)
+
+                filas, columnas = np.nonzero(por_par < umbral_cuadrado)
+                for fila, columna in zip(filas, columnas):
+                    a, b = int(filas_unicas[fila]), int(ids_unicos[columna])
+                    if a == b:
+                        continue
+                    clave = (min(a, b), max(a, b))
+                    distancia = float(np.sqrt(max(por_par[fila, columna], 0.0)))
+                    if distancia < pares.get(clave, np.inf):
+                        pares[clave] = distancia
+
+        estudiantes = {e[0]: e for e in self.db.obtener_estudiantes()}
+        sospechosos = []
+        for (a, b), distancia in sorted(pares.items(), key=lambda p: p[1]):
+            ea, eb = estudiantes.get(a), estudiantes.get(b)
+            sospechosos.append({
+                'estudiante_a': a,
+                'nombre_a': f"{ea[2]} {ea[3]}" if ea else str(a),
+                'dni_a': ea[1] if ea else None,
+                'estudiante_b': b,
+                'nombre_b': f"{eb[2]} {eb[3]}" if eb else str(b),
+                'dni_b': eb[1] if eb else None,
+                'distancia': distancia
+            })
+
+        tiempo = time.time() - inicio
+        print(f"🔎 Auditoría de duplicados: {len(sospechosos)} pares sospechosos en {n} encodings ({tiempo:.1f}s)")
+        return {'encodings': n, 'estudiantes': len(set(ids_estudiante.tolist())), 'pares': sospechosos, 'tiempo': tiempo}
@@ -0,0 +1,186 @@
+import glob
+import hashlib
+import json
+import os
+import time
+import numpy as np
+from datetime import datetime
+
+from app.data.database_kiosko import CLAVES_CONFIGURACION
+
+PREFIJO_PAQUETE = "paquete_"
+
+
+def _escribir_atomico(ruta, escribir):
+    """Escribe a un temporal y renombra: el otro extremo nunca ve archivos a medias"""
+    temporal = ruta + ".tmp"
+    with open(temporal, "wb") as f:
+        escribir(f)
+    os.replace(temporal, ruta)
+
+
+def exportar_paquete(db, ruta, ids_enviados=None, secuencia=0):
+    """Genera un paquete de galería compacto para un kiosco
+
+    Contiene los encodings (float32) vigentes que no están en ids_enviados,
+    los ids vigentes de toda la galería, el directorio de estudiantes
+    (nombres y QR) y la configuración de horario. Con ids_enviados=None es
+    un paquete completo, que un kiosco puede aplicar sin nada previo.
+    """
+    nuevos, ids_vigentes = db.obtener_delta_galeria(ids_enviados)
+    configuracion = db.obtener_configuracion()
+    estudiantes = [list(fila) for fila in db.obtener_directorio_kiosko()]
+
+    metadatos = {
+        'version': configuracion.get('version_encodings_activa'),
+        'secuencia': secuencia,
+        'completo': ids_enviados is None,
+        'encodings_nuevos': len(nuevos),
+        'generado': datetime.now().isoformat(timespec='seconds'),
+        'estudiantes': estudiantes,
+        'configuracion': {clave: configuracion.get(clave) for clave in CLAVES_CONFIGURACION}
+    }
+    # Huella del contenido que no son encodings nuevos, para no publicar paquetes vacíos
+    metadatos['huella'] = hashlib.sha256(json.dumps(
+        [ids_vigentes, estudiantes, metadatos['configuracion']], sort_keys=True, default=str
+    ).encode()).hexdigest()
+
+    encodings = np.array([fila[2] for fila in nuevos], dtype=np.float32).reshape(-1, 128)
+    _escribir_atomico(ruta, lambda f: np.savez_compressed(
+        f,
+        encodings=encodings,
+        encoding_ids=np.array([fila[0] for fila in nuevos], dtype=np.int64),
+        estudiante_ids=np.array([fila[1] for fila in nuevos], dtype=np.int64),
+        ids_vigentes=np.array(ids_vigentes, dtype=np.int64),
+        metadatos=np.array(json.dumps(metadatos, default=str))
+    ))
+    print(f"📦 Paquete {os.path.basename(ruta)}: {len(nuevos)} encodings nuevos, {len(estudiantes)} estudiantes")
+    return metadatos
+
+
+def _leer_metadatos(ruta):
+    with np.load(ruta, allow_pickle=False) as paquete:
+        return json.loads(str(paquete['metadatos']))
+
+
+def _leer_ids_vigentes(ruta):
+    with np.load(ruta, allow_pickle=False) as paquete:
+        return paquete['ids_vigentes'].tolist()
+
+
+class SincronizacionCentral:
+    """Lado del servidor central de la sincronización por directorio compartido
+
+    Estructura del directorio:
+      galeria/paquete_<secuencia>_<fecha>.npz   paquetes publicados en orden
+      asistencias/<kiosko>_<fecha>.json         colas enviadas por los kioscos
+      asistencias/procesados/                   colas ya importadas
+    """
+
+    def __init__(self, db_manager, directorio):
+        self.db = db_manager
+        self.dir_galeria = os.path.join(directorio, "galeria")
+        self.dir_asistencias = os.path.join(directorio, "asistencias")
+        self.dir_procesados = os.path.join(self.dir_asistencias, "procesados")
+        for carpeta in (self.dir_galeria, self.dir_asistencias, self.dir_procesados):
+            os.makedirs(carpeta, exist_ok=True)
+
+    def _paquetes(self):
+        return sorted(glob.glob(os.path.join(self.dir_galeria, f"{PREFIJO_PAQUETE}*.npz")))
+
+    def publicar_galeria(self):
+        """Publica un delta con los encodings vigentes que no tenía el último paquete publicado
+
+        Al cambiar la versión activa de la galería se publica un paquete
+        completo: los kioscos reemplazan todos sus encodings de una vez.
+        """
+        paquetes = self._paquetes()
+        anterior = _leer_metadatos(paquetes[-1]) if paquetes else None
+        ids_enviados = None
+        if anterior and anterior['version'] == self.db.obtener_version_encodings_activa():
+            ids_enviados = _leer_ids_vigentes(paquetes[-1])
+        secuencia = anterior['secuencia'] + 1 if anterior else 1
+
+        nombre = f"{PREFIJO_PAQUETE}{secuencia:010d}_{time.strftime('%Y%m%d%H%M%S')}.npz"
+        temporal = os.path.join(self.dir_galeria, "borrador.npz")
+        metadatos = exportar_paquete(self.db, temporal, ids_enviados, secuencia)
+
+        if anterior and not metadatos['encodings_nuevos'] and metadatos['huella'] == anterior['huella']:
+            os.remove(temporal)
+            return None  # nada nuevo que publicar
+
+        ruta = os.path.join(self.dir_galeria, nombre)
+        os.replace(temporal, ruta)
+        return ruta
+
+    def recibir_asistencias(self):
+        """Importa las colas de los kioscos; reimportar un archivo no duplica asistencias"""
+        importadas = 0
+        for ruta in sorted(glob.glob(os.path.join(self.dir_asistencias, "*.json"))):
+            try:
+                with open(ruta, encoding="utf-8") as f:
+                    eventos = json.load(f)
+            except (OSError, ValueError) as e:
+                print(f"❌ Cola ilegible {os.path.basename(ruta)}: {e}")
+                continue
+            importadas += self.db.importar_asistencias_externas(eventos)
+            os.replace(ruta, os.path.join(self.dir_procesados, os.path.basename(ruta)))
+        if importadas:
+            print(f"📤 {importadas} asistencias importadas desde kioscos")
+        return importadas
+
+    def sincronizar(self):
+        return {'paquete': self.publicar_galeria(), 'asistencias': self.recibir_asistencias()}
+
+
+class SincronizacionKiosko:
+    """Lado del kiosco: aplica los deltas de galería y envía su cola de asistencias"""
+
+    def __init__(self, db_kiosko, directorio):
+        self.db = db_kiosko
+        self.dir_galeria = os.path.join(directorio, "galeria")
+        self.dir_asistencias = os.path.join(directorio, "asistencias")
+
+    def _aplicar(self, paquetes):
+        aplicados = 0
+        for ruta in paquetes:
+            if not self.db.aplicar_paquete(ruta):
+                break
+            aplicados += 1
+        return aplicados
+
+    def recibir_galeria(self):
+        """Aplica en orden los paquetes posteriores al último aplicado
+
+        Si uno no se puede aplicar (por ejemplo, al kiosco le faltan encodings
+        vigentes porque se saltó un paquete) se reconstruye la galería desde
+        el último paquete completo publicado.
+        """
+        paquetes = sorted(glob.glob(os.path.join(self.dir_galeria, f"{PREFIJO_PAQUETE}*.npz")))
+        ultimo = self.db.ultimo_paquete()
+        pendientes = [ruta for ruta in paquetes if os.path.basename(ruta) > ultimo]
+        aplicados = self._aplicar(pendientes)
+        if aplicados == len(pendientes):
+            return aplicados
+
+        completos = [ruta for ruta in paquetes if _leer_metadatos(ruta).get('completo')]
+        if not completos:
+            return aplicados
+        print(f"🔄 Reconstruyendo la galería desde {os.path.basename(completos[-1])}")
+        return self._aplicar(paquetes[paquetes.index(completos[-1]):])
+
+    def enviar_asistencias(self):
+        """Deja la cola pendiente en el directorio compartido y la marca como enviada"""
+        eventos = self.db.obtener_asistencias_pendientes()
+        if not eventos:
+            return 0
+        os.makedirs(self.dir_asistencias, exist_ok=True)
+        ruta = os.path.join(self.dir_asistencias, f"{self.db.kiosko_id}_{time.strftime('%Y%m%d%H%M%S')}.json")
+        contenido = json.dumps(eventos, ensure_ascii=False).encode("utf-8")
+        _escribir_atomico(ruta, lambda f: f.write(contenido))
+        self.db.marcar_asistencias_enviadas([e['evento_clave'] for e in eventos])
+        print(f"📤 {len(eventos)} asistencias enviadas")
+        return len(eventos)
+
+    def sincronizar(self):
+        return {'paquetes': self.recibir_galeria(), 'asistencias': self.enviar_asistencias()}
@@ -0,0 +1,151 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from app.utils.almacen_utils import resolver_ruta_imagen
+from app.utils.rostros_utils import parametros_version, version_encoding
+
+MODELOS_DETECCION = ["hog", "cnn"]
+MODELOS_LANDMARKS = ["large", "small"]
+
+# Estados del checkpoint por encoding de origen
+PROCESADO = 'procesado'
+SIN_ROSTRO = 'sin_rostro'
+SIN_IMAGEN = 'sin_imagen'
+
+
+def _reencodificar_imagen(args):
+    """Vuelve a codificar la imagen de un encoding (se ejecuta en un proceso aparte)"""
+    encoding_id, imagen_path, raiz_almacen, modelo_deteccion, modelo_landmarks, num_jitters = args
+
+    import cv2
+    import face_recognition
+
+    ruta = resolver_ruta_imagen(imagen_path, raiz_almacen)
+    if not ruta or not os.path.exists(ruta):
+        return encoding_id, SIN_IMAGEN, None
+
+    try:
+        imagen = cv2.imread(ruta)
+        if imagen is None:
+            return encoding_id, SIN_IMAGEN, None
+
+        rgb = cv2.cvtColor(imagen, cv2.COLOR_BGR2RGB)
+        face_locations = face_recognition.face_locations(rgb, model=modelo_deteccion)
+        if not face_locations:
+            return encoding_id, SIN_ROSTRO, None
+
+        # Las capturas de cámara pueden incluir a otra persona al fondo: usar el rostro más grande
+        mayor = max(face_locations, key=lambda c: (c[2] - c[0]) * (c[1] - c[3]))
+        encoding = face_recognition.face_encodings(rgb, [mayor], num_jitters=num_jitters, model=modelo_landmarks)[0]
+        return encoding_id, PROCESADO, encoding
+    except Exception as e:
+        print(f"❌ Error re-codificando {ruta}: {e}")
+        return encoding_id, SIN_IMAGEN, None
+
+
+class ReencodificacionService:
+    """Re-codifica la galería con otros parámetros sin detener el reconocimiento
+
+    Los encodings nuevos se guardan junto a los actuales con otra etiqueta de
+    versión. Cada lote se confirma junto con su checkpoint, de modo que si el
+    proceso se interrumpe basta con volver a ejecutarlo para continuar. La
+    versión activa solo cambia al terminar, con una única sentencia UPDATE.
+    """
+
+    def __init__(self, db_manager, procesos=None, tam_lote=100):
+        self.db = db_manager
+        self.procesos = procesos or max(1, (os.cpu_count() or 2) - 1)
+        self.tam_lote = tam_lote
+
+    def estado(self, version_destino):
+        """Avance de la re-codificación hacia version_destino"""
+        version_origen = self.db.obtener_version_encodings_activa()
+        pendientes = self.db.obtener_encodings_pendientes_reencodificar(version_origen, version_destino)
+        total = sum(cantidad for version, cantidad, _ in self.db.obtener_resumen_versiones_encodings()
+                    if version == version_origen)
+        return {
+            'version_origen': version_origen,
+            'version_destino': version_destino,
+            'total': total,
+            'pendientes': len(pendientes),
+            'estudiantes_sin_encoding': self.db.contar_estudiantes_sin_version(version_origen, version_destino)
+        }
+
+    def reencodificar(self, modelo_deteccion="hog", modelo_landmarks="large", num_jitters=1,
+                      activar=True, forzar=False, progreso=None):
+        """Re-codifica los encodings pendientes de la versión activa
+
+        progreso: callback opcional progreso(procesados, total).
+        Con activar=True, al no quedar pendientes se cambia la versión activa,
+        salvo que algún estudiante se quede sin encodings y no se indique forzar.
+        """
+        version_destino = version_encoding(modelo_deteccion, modelo_landmarks, num_jitters)
+        version_origen = self.db.obtener_version_encodings_activa()
+        reporte = {
+            'version_origen': version_origen,
+            'version_destino': version_destino,
+            'procesados': 0,
+            'guardados': 0,
+            'sin_rostro': 0,
+            'sin_imagen': 0,
+            'activada': False,
+            'estudiantes_sin_encoding': 0,
+            'tiempo': 0.0
+        }
+
+        if version_destino == version_origen:
+            print(f"ℹ️ La galería ya usa la versión {version_destino}")
+            return reporte
+
+        inicio = time.time()
+        pendientes = self.db.obtener_encodings_pendientes_reencodificar(version_origen, version_destino)
+        estudiante_por_encoding = {encoding_id: (estudiante_id, imagen_path)
+                                   for encoding_id, estudiante_id, imagen_path in pendientes}
+        raiz_almacen = self.db.obtener_configuracion().get('directorio_imagenes') or None
+        tareas = [(encoding_id, imagen_path, raiz_almacen, modelo_deteccion, modelo_landmarks, num_jitters)
+                  for encoding_id, _, imagen_path in pendientes]
+        print(f"🔁 Re-codificando {len(tareas)} encodings {version_origen} → {version_destino} con {self.procesos} procesos")
+
+        filas = []
+        checkpoint = []
+        if tareas:
+            with ProcessPoolExecutor(max_workers=self.procesos) as executor:
+                resultados = executor.map(_reencodificar_imagen, tareas, chunksize=4)
+                for procesados, (encoding_id, estado, encoding) in enumerate(resultados, start=1):
+                    estudiante_id, imagen_path = estudiante_por_encoding[encoding_id]
+                    if estado == PROCESADO:
+                        filas.append((estudiante_id, encoding, imagen_path))
+                    else:
+                        reporte[estado] += 1
+                    checkpoint.append((encoding_id, estado))
+
+                    if len(checkpoint) >= self.tam_lote:
+                        if not self.db.guardar_lote_reencodificado(version_destino, filas, checkpoint):
+                            break
+                        reporte['guardados'] += len(filas)
+                        filas, checkpoint = [], []
+
+                    reporte['procesados'] = procesados
+                    if progreso:
+                        progreso(procesados, len(tareas))
+
+            if checkpoint and self.db.guardar_lote_reencodificado(version_destino, filas, checkpoint):
+                reporte['guardados'] += len(filas)
+
+        reporte['tiempo'] = time.time() - inicio
+        restantes = self.db.obtener_encodings_pendientes_reencodificar(version_origen, version_destino)
+        reporte['estudiantes_sin_encoding'] = self.db.contar_estudiantes_sin_version(version_origen, version_destino)
+
+        if activar and not restantes:
+            if reporte['estudiantes_sin_encoding'] and not forzar:
+                print(f"⚠️ {reporte['estudiantes_sin_encoding']} estudiantes quedarían sin encodings; no se activa {version_destino}")
+            else:
+                reporte['activada'] = self.db.activar_version_encodings(version_destino)
+
+        print(f"📊 Re-codificación: {reporte['guardados']} encodings nuevos, {reporte['sin_rostro']} sin rostro, "
+              f"{reporte['sin_imagen']} sin imagen ({reporte['tiempo']:.1f}s)")
+        return reporte
+
+    def parametros_activos(self):
+        return parametros_version(self.db.obtener_version_encodings_activa())
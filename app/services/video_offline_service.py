@@ -0,0 +1,223 @@
+import cv2
+import os
+import time
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import timedelta
+
+
+def obtener_info_video(ruta_video):
+    """Obtiene FPS y cantidad de frames de un archivo de video"""
+    cap = cv2.VideoCapture(ruta_video)
+    if not cap.isOpened():
+        return None
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.0
+    total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    cap.release()
+    return {'fps': fps, 'total_frames': total_frames, 'duracion': total_frames / fps}
+
+
+def _procesar_fragmento(args):
+    """Decodifica y analiza un fragmento del video (se ejecuta en un proceso aparte)"""
+    ruta_video, frame_inicio, frame_fin, paso, fps, escala, modelo_landmarks = args
+
+    # Importar aquí para que cada proceso cargue sus propios modelos
+    import face_recognition
+    from app.utils.qr_utils import qr_manager
+
+    resultado = {
+        'detecciones': [],
+        'frames_decodificados': 0,
+        'frames_analizados': 0,
+        'error': None
+    }
+
+    cap = cv2.VideoCapture(ruta_video)
+    if not cap.isOpened():
+        resultado['error'] = f"No se pudo abrir {ruta_video}"
+        return resultado
+
+    try:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, frame_inicio)
+
+        for indice in range(frame_inicio, frame_fin):
+            # grab() avanza sin convertir el frame; solo se recupera uno cada `paso`
+            if (indice - frame_inicio) % paso != 0:
+                if not cap.grab():
+                    break
+                resultado['frames_decodificados'] += 1
+                continue
+
+            ret, frame = cap.read()
+            if not ret:
+                break
+            resultado['frames_decodificados'] += 1
+            resultado['frames_analizados'] += 1
+
+            small_frame = cv2.resize(frame, (0, 0), fx=escala, fy=escala)
+            rgb_small_frame = cv2.cvtColor(small_frame, cv2.COLOR_BGR2RGB)
+            face_locations = face_recognition.face_locations(rgb_small_frame, model="hog")
+            face_encodings = face_recognition.face_encodings(
+                rgb_small_frame, face_locations, model=modelo_landmarks
+            ) if face_locations else []
+
+            qr_datos = [qr['data'] for qr in qr_manager.detectar_qr_en_frame(frame)]
+
+            if face_encodings or qr_datos:
+                resultado['detecciones'].append((indice / fps, face_encodings, qr_datos))
+    except Exception as e:
+        resultado['error'] = str(e)
+    finally:
+        cap.release()
+
+    return resultado
+
+
+class VideoOfflineService:
+    """Reconciliación de asistencias a partir de una grabación de la entrada"""
+
+    def __init__(self, asistencia_service, procesos=None, duracion_fragmento=30, intervalo_muestreo=0.25, escala=0.5,
+                 confirmaciones_rostro=3, ventana_confirmacion=5.0):
+        self.asistencias = asistencia_service
+        self.db = asistencia_service.db
+        self.procesos = procesos or max(1, (os.cpu_count() or 2) - 1)
+        self.duracion_fragmento = duracion_fragmento  # segundos de video por fragmento
+        self.intervalo_muestreo = intervalo_muestreo  # segundos entre frames analizados
+        self.escala = escala
+        self.confirmaciones_rostro = confirmaciones_rostro  # matches necesarios para aceptar un rostro
+        self.ventana_confirmacion = ventana_confirmacion  # segundos en los que deben ocurrir
+
+    def _dividir_fragmentos(self, ruta_video, info):
+        """Divide el video en fragmentos de tiempo independientes"""
+        fps = info['fps']
+        frames_por_fragmento = max(1, int(self.duracion_fragmento * fps))
+        paso = max(1, int(round(self.intervalo_muestreo * fps)))
+
+        fragmentos = []
+        for inicio in range(0, info['total_frames'], frames_por_fragmento):
+            fin = min(inicio + frames_por_fragmento, info['total_frames'])
+            fragmentos.append((ruta_video, inicio, fin, paso, fps, self.escala, self.asistencias.modelo_landmarks))
+        return fragmentos
+
+    def procesar_video(self, ruta_video, inicio_grabacion, progreso=None):
+        """Procesa un video completo y registra las asistencias detectadas
+
+        inicio_grabacion: datetime en que empezó la grabación; cada detección se
+        registra con inicio_grabacion + tiempo del frame.
+        progreso: callback opcional progreso(fragmentos_completados, total_fragmentos).
+        """
+        info = obtener_info_video(ruta_video)
+        if not info or info['total_frames'] <= 0:
+            print(f"❌ No se puede leer el video: {ruta_video}")
+            return None
+
+        fragmentos = self._dividir_fragmentos(ruta_video, info)
+        print(f"🎞️ Procesando {info['duracion']:.0f}s de video en {len(fragmentos)} fragmentos con {self.procesos} procesos")
+
+        inicio = time.time()
+        detecciones = []
+        frames_decodificados = 0
+        frames_analizados = 0
+        errores = []
+
+        with ProcessPoolExecutor(max_workers=self.procesos) as executor:
+            futuros = [executor.submit(_procesar_fragmento, args) for args in fragmentos]
+
+            for completados, futuro in enumerate(as_completed(futuros), start=1):
+                try:
+                    resultado = futuro.result()
+                except Exception as e:
+                    errores.append(str(e))
+                    resultado = None
+
+                if resultado:
+                    detecciones.extend(resultado['detecciones'])
+                    frames_decodificados += resultado['frames_decodificados']
+                    frames_analizados += resultado['frames_analizados']
+                    if resultado['error']:
+                        errores.append(resultado['error'])
+
+                if progreso:
+                    progreso(completados, len(fragmentos))
+
+        tiempo_analisis = time.time() - inicio
+        registrados = self._registrar_detecciones(detecciones, inicio_grabacion)
+        tiempo_total = time.time() - inicio
+
+        resumen = {
+            'duracion_video': info['duracion'],
+            'fragmentos': len(fragmentos),
+            'frames_decodificados': frames_decodificados,
+            'frames_analizados': frames_analizados,
+            'fps_decodificacion': frames_decodificados / tiempo_analisis if tiempo_analisis > 0 else 0.0,
+            'fps_analisis': frames_analizados / tiempo_analisis if tiempo_analisis > 0 else 0.0,
+            'velocidad_tiempo_real': info['duracion'] / tiempo_total if tiempo_total > 0 else 0.0,
+            'tiempo_total': tiempo_total,
+            'registrados': registrados,
+            'errores': errores
+        }
+
+        print(f"📊 Video procesado en {tiempo_total:.1f}s: {frames_decodificados} frames decodificados "
+              f"({resumen['fps_decodificacion']:.1f} FPS), {frames_analizados} analizados "
+              f"({resumen['fps_analisis']:.1f} FPS), {len(registrados)} asistencias")
+        return resumen
+
+    def _registrar_detecciones(self, detecciones, inicio_grabacion):
+        """Registra la primera aparición confirmada de cada estudiante por el flujo normal"""
+        detecciones.sort(key=lambda d: d[0])
+
+        # Identificar todos los rostros del video en un solo paso vectorizado
+        tiempos_rostros = []
+        encodings = []
+        for segundo, face_encodings, _ in detecciones:
+            for encoding in face_encodings:
+                tiempos_rostros.append(segundo)
+                encodings.append(encoding)
+        identificados = self.asistencias.identificar_encodings(encodings)
+
+        # Un rostro cuenta solo si se repite en varios frames cercanos, como el
+        # suavizado del monitor en vivo; un único match bajo el umbral no alcanza
+        aciertos = defaultdict(list)
+        for segundo, (estudiante_id, nombre, distancia) in zip(tiempos_rostros, identificados):
+            if estudiante_id is not None:
+                aciertos[estudiante_id].append((segundo, nombre, 1 - distancia))
+
+        eventos = []
+        n = self.confirmaciones_rostro
+        for estudiante_id, hits in aciertos.items():
+            for i in range(len(hits) - n + 1):
+                if hits[i + n - 1][0] - hits[i][0] <= self.ventana_confirmacion:
+                    ventana = hits[i:i + n]
+                    confianza = sum(hit[2] for hit in ventana) / n
+                    eventos.append((hits[i][0], estudiante_id, hits[i][1], 'rostro', confianza))
+                    break
+
+        # Resolver cada código QR una sola vez
+        cache_qr = {}
+        for segundo, _, qr_datos in detecciones:
+            for qr_data in qr_datos:
+                if qr_data not in cache_qr:
+                    cache_qr[qr_data] = self.asistencias.directorio.resolver_qr(qr_data)
+                estudiante = cache_qr[qr_data]
+                if estudiante:
+                    eventos.append((segundo, estudiante[0], f"{estudiante[2]} {estudiante[3]}", 'qr', 1.0))
+
+        eventos.sort(key=lambda e: e[0])
+
+        registrados = []
+        vistos = set()
+        for segundo, estudiante_id, nombre, metodo, confianza in eventos:
+            if estudiante_id in vistos:
+                continue
+            vistos.add(estudiante_id)
+
+            fecha_hora = inicio_grabacion + timedelta(seconds=segundo)
+            if self.asistencias._registrar_una_vez(estudiante_id, confianza, metodo, fecha_hora):
+                registrados.append({
+                    'id': estudiante_id,
+                    'nombre': nombre,
+                    'metodo': metodo,
+                    'hora': fecha_hora.strftime('%H:%M:%S'),
+                    'confianza': confianza
+                })
+        return registrados
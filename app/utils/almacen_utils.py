@@ -0,0 +1,140 @@
+import cv2
+import hashlib
+import math
+import os
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
+
+from app.data.database import BASE_DIR
+
+DIRECTORIO_ALMACEN = os.path.join(BASE_DIR, "app", "assets", "imagenes_estudiantes", "almacen")
+PREFIJO_REFERENCIA = "sha256:"
+
+
+def es_referencia(imagen_path):
+    return bool(imagen_path) and imagen_path.startswith(PREFIJO_REFERENCIA)
+
+
+def ruta_referencia(referencia, raiz=None, miniatura=False):
+    """Ruta en disco de una referencia `sha256:<hash>` bajo la raíz del almacén"""
+    if not es_referencia(referencia):
+        return None
+    digest = referencia[len(PREFIJO_REFERENCIA):]
+    nombre = f"{digest}_min.jpg" if miniatura else f"{digest}.jpg"
+    return os.path.join(raiz or DIRECTORIO_ALMACEN, digest[:2], nombre)
+
+
+def resolver_ruta_imagen(imagen_path, raiz_almacen=None):
+    """Ruta en disco de la imagen de un encoding
+
+    Acepta referencias del almacén (`sha256:<hash>`) y rutas de archivo; las
+    capturas antiguas guardan rutas relativas al directorio del proyecto.
+    """
+    if not imagen_path:
+        return None
+    if es_referencia(imagen_path):
+        return ruta_referencia(imagen_path, raiz_almacen)
+    if os.path.isabs(imagen_path):
+        return imagen_path
+    return os.path.join(BASE_DIR, imagen_path)
+
+
+def _escribir_atomico(ruta, datos):
+    """Escribe a un temporal único de la misma carpeta y renombra, para no dejar
+    archivos a medias ni pisarse con otra escritura del mismo contenido"""
+    fd, temporal = tempfile.mkstemp(suffix=".tmp", dir=os.path.dirname(ruta))
+    try:
+        with os.fdopen(fd, "wb") as f:
+            f.write(datos)
+        os.replace(temporal, ruta)
+    except Exception:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+        raise
+
+
+def alinear_rostro(frame, caja, landmarks=None, margen=0.5, lado_maximo=320):
+    """Recorta el rostro con margen y lo rota para dejar los ojos horizontales
+
+    El margen generoso permite volver a detectar el rostro en el recorte
+    cuando se re-codifica la galería con otros parámetros.
+    """
+    top, right, bottom, left = caja
+    centro = ((left + right) / 2.0, (top + bottom) / 2.0)
+
+    if landmarks and landmarks.get('left_eye') and landmarks.get('right_eye'):
+        ojo_izq = [sum(p) / len(landmarks['left_eye']) for p in zip(*landmarks['left_eye'])]
+        ojo_der = [sum(p) / len(landmarks['right_eye']) for p in zip(*landmarks['right_eye'])]
+        angulo = math.degrees(math.atan2(ojo_der[1] - ojo_izq[1], ojo_der[0] - ojo_izq[0]))
+        rotacion = cv2.getRotationMatrix2D(centro, angulo, 1.0)
+        frame = cv2.warpAffine(frame, rotacion, (frame.shape[1], frame.shape[0]), borderMode=cv2.BORDER_REPLICATE)
+
+    lado = int(max(bottom - top, right - left) * (1 + 2 * margen))
+    alto, ancho = frame.shape[:2]
+    y0 = max(0, int(centro[1] - lado / 2))
+    x0 = max(0, int(centro[0] - lado / 2))
+    recorte = frame[y0:min(alto, y0 + lado), x0:min(ancho, x0 + lado)]
+
+    if recorte.size and max(recorte.shape[:2]) > lado_maximo:
+        escala = lado_maximo / max(recorte.shape[:2])
+        recorte = cv2.resize(recorte, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+    return recorte.copy()
+
+
+class AlmacenImagenes:
+    """Almacén de imágenes de enrolamiento direccionado por contenido
+
+    Cada recorte se guarda como `<raiz>/<ab>/<hash>.jpg` junto a una miniatura
+    `<hash>_min.jpg`, donde el hash es el SHA-256 del JPEG. La base de datos
+    solo guarda la referencia `sha256:<hash>`, así que dos capturas idénticas
+    ocupan un único archivo y la raíz puede moverse sin tocar la base.
+    La compresión se hace al guardar (es lo que define el hash) y la
+    escritura en disco en un hilo aparte.
+    """
+
+    def __init__(self, raiz=None, calidad=90, tam_miniatura=96, hilos=2):
+        self.raiz = raiz or DIRECTORIO_ALMACEN
+        self.calidad = calidad
+        self.tam_miniatura = tam_miniatura
+        self.executor = ThreadPoolExecutor(max_workers=hilos, thread_name_prefix="almacen")
+
+    @classmethod
+    def desde_configuracion(cls, config, **kwargs):
+        return cls(config.get('directorio_imagenes') or None, **kwargs)
+
+    def resolver(self, referencia, miniatura=False):
+        return ruta_referencia(referencia, self.raiz, miniatura)
+
+    def guardar(self, recorte):
+        """Comprime el recorte, encola su escritura y retorna la referencia"""
+        ok, buffer = cv2.imencode(".jpg", recorte, [cv2.IMWRITE_JPEG_QUALITY, self.calidad])
+        if not ok:
+            return None
+        datos = buffer.tobytes()
+        digest = hashlib.sha256(datos).hexdigest()
+        self.executor.submit(self._escribir, digest, datos, recorte)
+        return PREFIJO_REFERENCIA + digest
+
+    def _escribir(self, digest, datos, recorte):
+        referencia = PREFIJO_REFERENCIA + digest
+        ruta, ruta_miniatura = self.resolver(referencia), self.resolver(referencia, miniatura=True)
+        if os.path.exists(ruta) and os.path.exists(ruta_miniatura):
+            return  # mismo contenido ya almacenado
+        try:
+            os.makedirs(os.path.dirname(ruta), exist_ok=True)
+            # La miniatura va primero: si el proceso cae entre ambas escrituras,
+            # la próxima captura igual encuentra la imagen principal pendiente
+            if not os.path.exists(ruta_miniatura):
+                escala = self.tam_miniatura / max(recorte.shape[:2])
+                miniatura = cv2.resize(recorte, None, fx=escala, fy=escala, interpolation=cv2.INTER_AREA)
+                ok, buffer = cv2.imencode(".jpg", miniatura, [cv2.IMWRITE_JPEG_QUALITY, 80])
+                if ok:
+                    _escribir_atomico(ruta_miniatura, buffer.tobytes())
+            if not os.path.exists(ruta):
+                _escribir_atomico(ruta, datos)
+        except Exception as e:
+            print(f"❌ Error escribiendo imagen {digest[:12]}: {e}")
+
+    def cerrar(self):
+        """Espera a que terminen las escrituras pendientes"""
+        self.executor.shutdown(wait=True)
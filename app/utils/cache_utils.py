@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import OrderedDict
+
+# Distingue "no está" de una clave guardada con valor None
+AUSENTE = object()
+
+
+class MapaTTL:
+    """Mapa acotado cuyas entradas caducan `ttl` segundos después de guardarse
+
+    Las claves se mantienen en orden de inserción; como todas tienen el mismo
+    TTL, ese también es el orden de caducidad y purgar consiste en sacar del
+    frente mientras haya entradas vencidas. Al superar `maximo` se descarta
+    la más antigua. Cuenta aciertos y fallos de `obtener`.
+    """
+
+    def __init__(self, ttl, maximo=256):
+        self.ttl = ttl
+        self.maximo = maximo
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def _purgar(self, ahora):
+        while self._entradas:
+            clave, (expira, _) = next(iter(self._entradas.items()))
+            if expira > ahora:
+                break
+            del self._entradas[clave]
+
+    def obtener(self, clave, defecto=None):
+        """Valor vigente de la clave, o `defecto` si no está o ya caducó"""
+        with self._lock:
+            self._purgar(time.monotonic())
+            entrada = self._entradas.get(clave, AUSENTE)
+            if entrada is AUSENTE:
+                self.fallos += 1
+                return defecto
+            self.aciertos += 1
+            return entrada[1]
+
+    def __contains__(self, clave):
+        return self.obtener(clave, AUSENTE) is not AUSENTE
+
+    def guardar(self, clave, valor=None):
+        """Guarda (o renueva) la clave con un TTL completo"""
+        with self._lock:
+            ahora = time.monotonic()
+            self._purgar(ahora)
+            self._entradas.pop(clave, None)
+            self._entradas[clave] = (ahora + self.ttl, valor)
+            while len(self._entradas) > self.maximo:
+                self._entradas.popitem(last=False)
+
+    def limpiar(self):
+        with self._lock:
+            self._entradas.clear()
+
+    def __len__(self):
+        with self._lock:
+            self._purgar(time.monotonic())
+            return len(self._entradas)
+
+    def estadisticas(self):
+        consultas = self.aciertos + self.fallos
+        return {
+            'entradas': len(self),
+            'aciertos': self.aciertos,
+            'fallos': self.fallos,
+            'tasa_aciertos': self.aciertos / consultas if consultas else 0.0
+        }
+
+
+class CacheLRU:
+    """Caché acotada que descarta la entrada usada hace más tiempo"""
+
+    def __init__(self, capacidad=256):
+        self.capacidad = capacidad
+        self._entradas = OrderedDict()
+        self._lock = threading.Lock()
+        self.aciertos = 0
+        self.fallos = 0
+
+    def obtener(self, clave, defecto=None):
+        with self._lock:
+            valor = self._entradas.get(clave, AUSENTE)
+            if valor is AUSENTE:
+                self.fallos += 1
+                return defecto
+            self._entradas.move_to_end(clave)
+            self.aciertos += 1
+            return valor
+
+    def guardar(self, clave, valor):
+        with self._lock:
+            self._entradas[clave] = valor
+            self._entradas.move_to_end(clave)
+            while len(self._entradas) > self.capacidad:
+                self._entradas.popitem(last=False)
+
+    def descartar(self, predicado):
+        """Elimina las entradas cuya clave cumple el predicado"""
+        with self._lock:
+            for clave in [c for c in self._entradas if predicado(c)]:
+                del self._entradas[clave]
+
+    def __len__(self):
+        return len(self._entradas)
@@ -1,9 +1,46 @@
 # camara_utils.py
 import cv2
-import face_recognition
 import time
 import os
 import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils.almacen_utils import AlmacenImagenes, alinear_rostro
+from app.utils.modelos_utils import face_recognition
+from app.utils.rostros_utils import VERSION_ENCODING_INICIAL, iou_cajas, parametros_version
+
+INDICACIONES_POSE = [
+    "Mira de frente",
+    "Gira levemente a la izquierda",
+    "Gira levemente a la derecha",
+    "Levanta un poco la barbilla",
+    "Baja un poco la barbilla",
+]
+
+
+def evaluar_calidad_rostro(frame, caja, lado_minimo=90, nitidez_minima=60.0, brillo=(60, 200)):
+    """Control de calidad rápido de un rostro antes de capturarlo
+
+    Retorna (aprobado, motivo) considerando tamaño, nitidez (varianza del
+    Laplaciano) y brillo medio del recorte.
+    """
+    top, right, bottom, left = caja
+    if min(bottom - top, right - left) < lado_minimo:
+        return False, "Acercate a la camara"
+
+    recorte = frame[max(0, top):bottom, max(0, left):right]
+    if recorte.size == 0:
+        return False, "Centra tu rostro"
+    gris = cv2.cvtColor(recorte, cv2.COLOR_BGR2GRAY)
+
+    brillo_medio = float(gris.mean())
+    if brillo_medio < brillo[0]:
+        return False, "Falta iluminacion"
+    if brillo_medio > brillo[1]:
+        return False, "Demasiada luz"
+    if cv2.Laplacian(gris, cv2.CV_64F).var() < nitidez_minima:
+        return False, "Imagen borrosa, quedate quieto"
+    return True, ""
 
 class CamaraManager:
     def __init__(self, db_manager):
@@ -12,12 +49,14 @@ class CamaraManager:
         self.encodings = []
         self.nombres = []
         self.ids = []
+        _, self.modelo_landmarks, _ = parametros_version(VERSION_ENCODING_INICIAL)
         self.cargar_encodings()
     
     def cargar_encodings(self):
         """Carga encodings desde la base de datos."""
         try:
             self.encodings, self.nombres, self.ids = self.db.cargar_encodings_faciales()
+            _, self.modelo_landmarks, _ = parametros_version(self.db.obtener_version_encodings_activa())
             print(f"✅ {len(self.encodings)} rostros cargados en memoria")
         except Exception as e:
             print(f"❌ Error al cargar encodings: {e}")
@@ -54,93 +93,150 @@ class CamaraManager:
             self.cap.release()
             cv2.destroyAllWindows()
 
-    def capturar_rostros_interactivo(self, estudiante_id, nombre, apellido, num_capturas=5):
-        """Función mejorada para captura de rostros"""
+    def capturar_rostros_interactivo(self, estudiante_id, nombre, apellido, num_capturas=5,
+                                     escala_vista=0.5, intervalo_deteccion=0.15, frames_estables=5,
+                                     pausa_entre_capturas=1.0):
+        """Captura de rostros con disparo automático
+
+        La vista previa detecta sobre un frame reducido y solo cada
+        `intervalo_deteccion` segundos. Cuando un único rostro pasa el control
+        de calidad y se mantiene quieto durante `frames_estables` detecciones,
+        se captura solo; ESPACIO sigue capturando de forma manual. El encoding
+        y el guardado corren en segundo plano para no congelar la vista previa.
+        """
         print(f"📸 Capturando {num_capturas} imágenes para: {nombre} {apellido}")
-        print("Presiona ESPACIO para capturar, ESC para cancelar")
+        print("Captura automática activa. ESPACIO para capturar, ESC para cancelar")
         
         if not self.inicializar_camara():
             print("❌ No se puede acceder a la cámara")
             return False
         
-        # Crear carpeta de imágenes si no existe
-        carpeta_imagenes = "app/assets/imagenes_estudiantes"
-        os.makedirs(carpeta_imagenes, exist_ok=True)
+        # Los recortes se guardan en el almacén direccionado por contenido
+        almacen = AlmacenImagenes.desde_configuracion(self.db.obtener_configuracion())
+        version = self.db.obtener_version_encodings_activa()
+        _, modelo_landmarks, num_jitters = parametros_version(version)
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="enrolamiento")
+
+        def codificar_y_guardar(rgb_frame, frame_limpio, caja):
+            face_encodings = face_recognition.face_encodings(rgb_frame, [caja], num_jitters=num_jitters, model=modelo_landmarks)
+            if not face_encodings:
+                return False
+            # Guardar solo el rostro alineado
+            landmarks = face_recognition.face_landmarks(rgb_frame, [caja])
+            recorte = alinear_rostro(frame_limpio, caja, landmarks[0] if landmarks else None)
+            referencia = almacen.guardar(recorte)
+            return self.db.guardar_encoding_facial(estudiante_id, face_encodings[0], referencia, version)
 
+        pendientes = []
         capturas_exitosas = 0
         encoding_count = 0
+        caja_anterior = None
+        estables = 0
+        ultima_deteccion = 0.0
+        ultima_captura = 0.0
+        face_locations = []
+        calidad_ok, motivo = False, ""
         
         try:
-            while capturas_exitosas < num_capturas:
+            while capturas_exitosas + len(pendientes) < num_capturas or pendientes:
+                # Recoger los encodings terminados en segundo plano
+                for futuro in [f for f in pendientes if f.done()]:
+                    pendientes.remove(futuro)
+                    try:
+                        guardado = futuro.result()
+                    except Exception as e:
+                        print(f"❌ Error al guardar: {e}")
+                        guardado = False
+                    if guardado:
+                        encoding_count += 1
+                        capturas_exitosas += 1
+                        print(f"✅ Imagen {capturas_exitosas} capturada y guardada")
+                    else:
+                        print("❌ No se pudo extraer encoding facial")
+
                 frame, success = self.capturar_frame()
                 if not success:
                     print("❌ Error al capturar frame")
                     break
+                frame_limpio = frame.copy()
+                ahora = time.time()
+                
+                # Detectar sobre un frame reducido y no en cada frame
+                if ahora - ultima_deteccion >= intervalo_deteccion:
+                    ultima_deteccion = ahora
+                    pequeno = cv2.resize(frame, (0, 0), fx=escala_vista, fy=escala_vista)
+                    ubicaciones = face_recognition.face_locations(cv2.cvtColor(pequeno, cv2.COLOR_BGR2RGB), model="hog")
+                    face_locations = [tuple(int(v / escala_vista) for v in caja) for caja in ubicaciones]
+
+                    if len(face_locations) == 1:
+                        calidad_ok, motivo = evaluar_calidad_rostro(frame, face_locations[0])
+                        if calidad_ok and caja_anterior and iou_cajas(caja_anterior, face_locations[0]) >= 0.8:
+                            estables += 1
+                        else:
+                            estables = 0
+                        caja_anterior = face_locations[0]
+                    else:
+                        calidad_ok = False
+                        motivo = "Un solo rostro frente a la cámara" if face_locations else ""
+                        estables = 0
+                        caja_anterior = None
+
+                total_iniciadas = capturas_exitosas + len(pendientes)
+                indicacion = INDICACIONES_POSE[total_iniciadas % len(INDICACIONES_POSE)]
                 
                 # Mostrar instrucciones en el frame
                 cv2.putText(frame, f"Capturando: {nombre} {apellido}", (10, 30), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.7, (0, 255, 0), 2)
-                cv2.putText(frame, f"Imagen {capturas_exitosas + 1}/{num_capturas}", (10, 60), 
+                cv2.putText(frame, f"Imagen {min(total_iniciadas + 1, num_capturas)}/{num_capturas} - {indicacion}", (10, 60), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
                 cv2.putText(frame, "ESPACIO: Capturar | ESC: Cancelar", (10, 90), 
                         cv2.FONT_HERSHEY_SIMPLEX, 0.6, (255, 255, 255), 1)
-                
-                # Detectar rostros
-                rgb_frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-                face_locations = face_recognition.face_locations(rgb_frame, model="hog")
+                if motivo:
+                    cv2.putText(frame, motivo, (10, 120), cv2.FONT_HERSHEY_SIMPLEX, 0.6, (0, 165, 255), 2)
                 
                 # Dibujar rectángulo si se detecta rostro
-                rostro_detectado = len(face_locations) > 0
+                rostro_detectado = len(face_locations) == 1
+                color = (0, 255, 0) if calidad_ok else (0, 165, 255)
                 for top, right, bottom, left in face_locations:
-                    cv2.rectangle(frame, (left, top), (right, bottom), (0, 255, 0), 2)
-                    cv2.putText(frame, "ROSTRO DETECTADO", (left, top-10), 
-                            cv2.FONT_HERSHEY_SIMPLEX, 0.5, (0, 255, 0), 1)
+                    cv2.rectangle(frame, (left, top), (right, bottom), color, 2)
+                    if calidad_ok:
+                        cv2.putText(frame, f"ESTABLE {min(estables, frames_estables)}/{frames_estables}", (left, top-10), 
+                                cv2.FONT_HERSHEY_SIMPLEX, 0.5, color, 1)
                 
                 cv2.imshow('Captura de Rostros', frame)
-                
-                # MEJORA: Usar waitKey más largo y verificar tecla presionada
-                key = cv2.waitKey(50) & 0xFF  # 50ms para mejor respuesta
-                
-                if key == 32:  # Tecla ESPACIO
-                    if rostro_detectado:
-                        try:
-                            # Guardar imagen
-                            timestamp = int(time.time())
-                            filename = f"{carpeta_imagenes}/{estudiante_id}_{nombre}_{apellido}_{timestamp}_{capturas_exitosas + 1}.jpg"
-                            cv2.imwrite(filename, frame)
-                            
-                            # Extraer encoding
-                            face_encodings = face_recognition.face_encodings(rgb_frame, face_locations)
-                            if face_encodings:
-                                encoding = face_encodings[0]
-                                # ✅ CORREGIDO: Usamos self.db en lugar del parámetro db
-                                self.db.guardar_encoding_facial(estudiante_id, encoding, filename)
-                                encoding_count += 1
-                                capturas_exitosas += 1
-                                print(f"✅ Imagen {capturas_exitosas} capturada y guardada")
-                                
-                                # Feedback visual
-                                for _ in range(10):  # Mostrar tick verde por 0.5 segundos
-                                    frame_feedback = frame.copy()
-                                    cv2.putText(frame_feedback, "✅ CAPTURADO", (50, 120), 
-                                            cv2.FONT_HERSHEY_SIMPLEX, 1, (0, 255, 0), 2)
-                                    cv2.imshow('Captura de Rostros', frame_feedback)
-                                    cv2.waitKey(50)
-                            else:
-                                print("❌ No se pudo extraer encoding facial")
-                        except Exception as e:
-                            print(f"❌ Error al guardar: {e}")
-                    else:
-                        print("❌ No se detectó rostro. Posiciónate frente a la cámara.")
-                        
-                elif key == 27:  # Tecla ESC
+                key = cv2.waitKey(1) & 0xFF
+
+                if key == 27:  # Tecla ESC
                     print("⏹️ Captura cancelada por el usuario")
                     break
+
+                if total_iniciadas >= num_capturas:
+                    continue  # esperando a que terminen los encodings en curso
+
+                automatica = calidad_ok and estables >= frames_estables and ahora - ultima_captura >= pausa_entre_capturas
+                if key == 32 and not rostro_detectado:  # Tecla ESPACIO
+                    print("❌ No se detectó rostro. Posiciónate frente a la cámara.")
+                elif automatica or (key == 32 and rostro_detectado):
+                    rgb_frame = cv2.cvtColor(frame_limpio, cv2.COLOR_BGR2RGB)
+                    pendientes.append(executor.submit(codificar_y_guardar, rgb_frame, frame_limpio, face_locations[0]))
+                    ultima_captura = ahora
+                    # La siguiente captura necesita una nueva pose estable
+                    estables = 0
+                    caja_anterior = None
                     
         except Exception as e:
             print(f"❌ Error durante la captura: {e}")
         finally:
             self.liberar_camara()
+            executor.shutdown(wait=True)
+            for futuro in pendientes:
+                try:
+                    if futuro.result():
+                        encoding_count += 1
+                        capturas_exitosas += 1
+                except Exception as e:
+                    print(f"❌ Error al guardar: {e}")
+            almacen.cerrar()
         
         print(f"📊 Resumen: {capturas_exitosas}/{num_capturas} imágenes capturadas, {encoding_count} encodings guardados")
         return capturas_exitosas > 0
@@ -181,7 +277,7 @@ class CamaraManager:
         """Reconoce un rostro específico dentro del frame."""
         rostro_img = frame[y:y+h, x:x+w]
         rgb = cv2.cvtColor(rostro_img, cv2.COLOR_BGR2RGB)
-        encodings = face_recognition.face_encodings(rgb)
+        encodings = face_recognition.face_encodings(rgb, model=self.modelo_landmarks)
         if not encodings:
             return None, None, None
 
@@ -0,0 +1,122 @@
+import cv2
+import time
+import numpy as np
+from datetime import datetime, timedelta
+
+
+def _parsear_hora(texto):
+    """Convierte 'HH:MM' o 'HH:MM:SS' a datetime.time"""
+    texto = texto.strip()
+    formato = '%H:%M:%S' if texto.count(':') == 2 else '%H:%M'
+    return datetime.strptime(texto, formato).time()
+
+
+class PlanificadorActividad:
+    """Ventanas de actividad derivadas del horario de entrada de cada turno"""
+
+    def __init__(self, ventanas):
+        # Lista de (inicio, fin) como datetime.time
+        self.ventanas = ventanas
+
+    @classmethod
+    def desde_configuracion(cls, config):
+        """Construye las ventanas a partir de la fila de `configuracion`
+
+        Cada turno queda activo desde `margen_antes` minutos antes de su hora de
+        entrada hasta la tolerancia más `margen_despues` minutos.
+        """
+        horas = [config.get('hora_entrada') or '08:00:00']
+        adicionales = config.get('horas_entrada_adicionales') or ''
+        horas.extend(h for h in adicionales.split(',') if h.strip())
+
+        tolerancia = config.get('tolerancia_minutos') or 0
+        antes = config.get('margen_antes_minutos') or 0
+        despues = config.get('margen_despues_minutos') or 0
+
+        ventanas = []
+        for texto in horas:
+            try:
+                entrada = datetime.combine(datetime.today(), _parsear_hora(texto))
+            except ValueError:
+                print(f"⚠️ Hora de entrada inválida en configuración: {texto}")
+                continue
+            inicio = entrada - timedelta(minutes=antes)
+            fin = entrada + timedelta(minutes=tolerancia + despues)
+            ventanas.append((inicio.time(), fin.time()))
+        return cls(ventanas)
+
+    def en_ventana_activa(self, ahora=None):
+        """Indica si la hora dada cae dentro de alguna ventana de actividad"""
+        hora = (ahora or datetime.now()).time()
+        for inicio, fin in self.ventanas:
+            if inicio <= fin:
+                if inicio <= hora <= fin:
+                    return True
+            elif hora >= inicio or hora <= fin:  # ventana que cruza la medianoche
+                return True
+        return False
+
+
+class DetectorMovimiento:
+    """Detección de movimiento muy barata sobre una miniatura en escala de grises"""
+
+    def __init__(self, umbral_pixel=25, fraccion_minima=0.02, tamano=(80, 60)):
+        self.umbral_pixel = umbral_pixel
+        self.fraccion_minima = fraccion_minima
+        self.tamano = tamano
+        self.anterior = None
+
+    def hay_movimiento(self, frame):
+        miniatura = cv2.resize(frame, self.tamano, interpolation=cv2.INTER_AREA)
+        gris = cv2.GaussianBlur(cv2.cvtColor(miniatura, cv2.COLOR_BGR2GRAY), (5, 5), 0)
+
+        if self.anterior is None:
+            self.anterior = gris
+            return False
+
+        diferencia = cv2.absdiff(gris, self.anterior)
+        self.anterior = gris
+        return np.count_nonzero(diferencia > self.umbral_pixel) >= self.fraccion_minima * diferencia.size
+
+
+class ControladorCiclo:
+    """Decide en cada frame si el pipeline corre a tasa completa o en bajo consumo
+
+    Dentro de las ventanas del horario todo se procesa normalmente. Fuera de
+    ellas solo se revisa movimiento a `fps_reposo` y, al detectar actividad, el
+    sistema se despierta durante `segundos_despierto`.
+    """
+
+    ACTIVO = 'activo'
+    REPOSO = 'reposo'
+
+    def __init__(self, planificador, detector=None, fps_reposo=2, segundos_despierto=30, habilitado=True):
+        self.planificador = planificador
+        self.detector = detector or DetectorMovimiento()
+        self.intervalo_reposo = 1.0 / fps_reposo
+        self.segundos_despierto = segundos_despierto
+        self.habilitado = habilitado
+        self.despierto_hasta = 0.0
+        self.ultima_revision = 0.0
+
+    def evaluar(self, frame, ahora=None):
+        """Retorna ACTIVO si el frame debe pasar por rostro + QR"""
+        instante = time.monotonic()
+        if (not self.habilitado or instante < self.despierto_hasta
+                or self.planificador.en_ventana_activa(ahora)):
+            # Al volver a reposo la referencia de movimiento debe ser reciente
+            self.detector.anterior = None
+            return self.ACTIVO
+
+        if instante - self.ultima_revision >= self.intervalo_reposo:
+            self.ultima_revision = instante
+            if self.detector.hay_movimiento(frame):
+                self.despierto_hasta = instante + self.segundos_despierto
+                print("👀 Movimiento detectado, reanudando reconocimiento")
+                return self.ACTIVO
+
+        return self.REPOSO
+
+    def espera_ms(self, modo):
+        """Milisegundos a esperar antes del siguiente frame según el modo"""
+        return 1 if modo == self.ACTIVO else int(self.intervalo_reposo * 1000)
@@ -0,0 +1,114 @@
+import threading
+import time
+
+from app.utils.tokens_qr import verificar_codigo_qr
+
+
+class DirectorioEstudiantes:
+    """Directorio de estudiantes en memoria para el bucle de cámara
+
+    Un dict QR→id y listas indexadas por id con sección, nombre y estado
+    activo, cargados una sola vez. Resolver un QR o preparar el registro de
+    una asistencia no consulta la base: solo se lee el contador de cambios
+    de `estudiantes` (mantenido por triggers, así que también ve los cambios
+    hechos desde otro proceso) como máximo cada `intervalo_verificacion`
+    segundos, y se recarga todo si cambió.
+
+    Con `secreto`, los códigos firmados (ver tokens_qr) se resuelven
+    verificando la firma y buscando el id en memoria, sin ninguna E/S; los
+    códigos aleatorios antiguos siguen resolviéndose por el dict.
+    """
+
+    def __init__(self, db_manager, intervalo_verificacion=2.0, secreto=None):
+        self.db = db_manager
+        self.secreto = secreto
+        self.intervalo_verificacion = intervalo_verificacion
+        self._lock = threading.Lock()
+        self.version = None
+        self.ultima_verificacion = 0.0
+        self.recargas = 0
+        self._por_qr = {}
+        self._filas = []
+        self._seccion = []
+        self._nombre = []
+        self._activo = []
+
+    def invalidar(self):
+        """Fuerza la recarga en la próxima consulta (p. ej. tras editar un estudiante en este proceso)"""
+        with self._lock:
+            self.version = None
+
+    def recargar(self):
+        version, filas = self.db.obtener_directorio_estudiantes()
+        tamano = (max(fila[0] for fila in filas) + 1) if filas else 0
+        por_qr = {}
+        filas_por_id = [None] * tamano
+        seccion = [None] * tamano
+        nombre = [None] * tamano
+        activo = [False] * tamano
+        for estudiante_id, qr_code, dni, nom, apellido, fecha_nacimiento, seccion_id, seccion_nombre, es_activo in filas:
+            activo[estudiante_id] = bool(es_activo)
+            seccion[estudiante_id] = seccion_id
+            nombre[estudiante_id] = f"{nom} {apellido}"
+            # Misma forma que DatabaseManager.obtener_estudiante_por_qr
+            filas_por_id[estudiante_id] = (estudiante_id, dni, nom, apellido, fecha_nacimiento, seccion_id, seccion_nombre)
+            if qr_code and es_activo:
+                por_qr[qr_code] = estudiante_id
+
+        with self._lock:
+            self._por_qr, self._filas = por_qr, filas_por_id
+            self._seccion, self._nombre, self._activo = seccion, nombre, activo
+            self.version = version
+            self.ultima_verificacion = time.monotonic()
+            self.recargas += 1
+
+    def _vigente(self):
+        """Recarga si nunca se cargó o si el contador de cambios avanzó"""
+        ahora = time.monotonic()
+        if self.version is not None and ahora - self.ultima_verificacion < self.intervalo_verificacion:
+            return
+        try:
+            if self.version is not None and self.db.obtener_version_estudiantes() == self.version:
+                self.ultima_verificacion = ahora
+                return
+            self.recargar()
+        except Exception as e:
+            # Sin base disponible se sigue con lo que ya estaba cargado
+            print(f"⚠️ No se pudo actualizar el directorio de estudiantes: {e}")
+            self.ultima_verificacion = ahora
+
+    def resolver_qr(self, qr_data):
+        """Estudiante activo con ese QR, con la forma de obtener_estudiante_por_qr, o None"""
+        estudiante_id = verificar_codigo_qr(qr_data, self.secreto)
+        if estudiante_id is not None:
+            fila = self._fila_activa(estudiante_id)
+            if fila:
+                return fila
+            # Firmado pero desconocido o inactivo en memoria: puede ser un alta reciente
+            self._vigente()
+            return self._fila_activa(estudiante_id)
+
+        self._vigente()
+        with self._lock:
+            por_qr, filas = self._por_qr, self._filas
+        estudiante_id = por_qr.get(qr_data)
+        return filas[estudiante_id] if estudiante_id is not None else None
+
+    def _fila_activa(self, estudiante_id):
+        with self._lock:
+            filas, activo = self._filas, self._activo
+        if 0 <= estudiante_id < len(activo) and activo[estudiante_id]:
+            return filas[estudiante_id]
+        return None
+
+    def datos_registro(self, estudiante_id):
+        """(seccion_id, nombre_completo) de un estudiante activo, o None"""
+        self._vigente()
+        with self._lock:
+            seccion, nombre, activo = self._seccion, self._nombre, self._activo
+        if not (0 <= estudiante_id < len(activo)) or not activo[estudiante_id]:
+            return None
+        return seccion[estudiante_id], nombre[estudiante_id]
+
+    def __len__(self):
+        return len(self._por_qr)
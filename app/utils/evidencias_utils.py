@@ -0,0 +1,121 @@
+import cv2
+import os
+import shutil
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, date, timedelta
+
+from app.data.database import BASE_DIR
+
+DIRECTORIO_EVIDENCIAS = os.path.join(BASE_DIR, "app", "assets", "evidencias")
+
+
+class GrabadorEvidencias:
+    """Guarda un recorte comprimido del rostro o del QR por cada asistencia registrada
+
+    La codificación JPEG/WebP y la escritura a disco se hacen en un pool de
+    hilos en segundo plano. Como máximo hay `max_pendientes` recortes en cola:
+    si el disco no da abasto se descartan evidencias en lugar de frenar el
+    bucle de reconocimiento.
+    """
+
+    def __init__(self, db_manager, directorio=DIRECTORIO_EVIDENCIAS, formato='jpg', calidad=80,
+                 hilos=2, max_pendientes=32, margen=0.2):
+        self.db = db_manager
+        self.directorio = directorio
+        self.formato = 'webp' if formato == 'webp' else 'jpg'
+        self.calidad = calidad
+        self.margen = margen
+        self.hilos = hilos
+        self.executor = None
+        self._lock_pool = threading.Lock()
+        self.cupos = threading.BoundedSemaphore(max_pendientes)
+        self.guardadas = 0
+        self.descartadas = 0
+
+    def capturar(self, estudiante_id, metodo, frame, caja, fecha_hora=None):
+        """Encola el recorte de la caja (top, right, bottom, left) sin bloquear"""
+        if not self.cupos.acquire(blocking=False):
+            self.descartadas += 1
+            return False
+
+        try:
+            top, right, bottom, left = caja
+            alto, ancho = frame.shape[:2]
+            margen_y = int((bottom - top) * self.margen)
+            margen_x = int((right - left) * self.margen)
+            # Copiar solo el recorte: el frame completo sigue usándose en el bucle
+            recorte = frame[max(0, top - margen_y):min(alto, bottom + margen_y),
+                            max(0, left - margen_x):min(ancho, right + margen_x)].copy()
+            self._pool().submit(self._guardar, estudiante_id, metodo, recorte, fecha_hora or datetime.now())
+            return True
+        except Exception as e:
+            self.cupos.release()
+            print(f"❌ Error preparando evidencia: {e}")
+            return False
+
+    def _guardar(self, estudiante_id, metodo, recorte, fecha_hora):
+        try:
+            if recorte.size == 0:
+                return
+
+            if self.formato == 'webp':
+                ok, buffer = cv2.imencode(".webp", recorte, [cv2.IMWRITE_WEBP_QUALITY, self.calidad])
+            else:
+                ok, buffer = cv2.imencode(".jpg", recorte, [cv2.IMWRITE_JPEG_QUALITY, self.calidad])
+            if not ok:
+                return
+
+            # Una carpeta por día permite podar días completos de una vez
+            carpeta = os.path.join(self.directorio, fecha_hora.strftime('%Y-%m-%d'))
+            os.makedirs(carpeta, exist_ok=True)
+            ruta = os.path.join(carpeta, f"{estudiante_id}_{metodo}_{fecha_hora.strftime('%H%M%S')}.{self.formato}")
+            with open(ruta, "wb") as f:
+                f.write(buffer.tobytes())
+
+            if self.db.guardar_evidencia(estudiante_id, fecha_hora.date(), metodo, ruta):
+                self.guardadas += 1
+        except Exception as e:
+            print(f"❌ Error guardando evidencia: {e}")
+        finally:
+            self.cupos.release()
+
+    def podar(self, dias_retencion):
+        """Elimina las evidencias con más de `dias_retencion` días
+
+        Borra carpetas de días completos y luego los registros con un solo DELETE.
+        """
+        fecha_limite = date.today() - timedelta(days=dias_retencion)
+        carpetas_eliminadas = 0
+
+        if os.path.isdir(self.directorio):
+            for nombre in os.listdir(self.directorio):
+                try:
+                    fecha_carpeta = datetime.strptime(nombre, '%Y-%m-%d').date()
+                except ValueError:
+                    continue
+                if fecha_carpeta < fecha_limite:
+                    shutil.rmtree(os.path.join(self.directorio, nombre), ignore_errors=True)
+                    carpetas_eliminadas += 1
+
+        registros = self.db.eliminar_evidencias_anteriores(fecha_limite)
+        if carpetas_eliminadas or registros:
+            print(f"🧹 Evidencias podadas: {carpetas_eliminadas} días, {registros} registros")
+        return carpetas_eliminadas, registros
+
+    def podar_en_segundo_plano(self, dias_retencion):
+        return self._pool().submit(self.podar, dias_retencion)
+
+    def _pool(self):
+        # Se crea al primer uso para poder seguir grabando tras cerrar()
+        with self._lock_pool:
+            if self.executor is None:
+                self.executor = ThreadPoolExecutor(max_workers=self.hilos, thread_name_prefix="evidencias")
+            return self.executor
+
+    def cerrar(self):
+        """Espera a que terminen las escrituras pendientes"""
+        with self._lock_pool:
+            executor, self.executor = self.executor, None
+        if executor is not None:
+            executor.shutdown(wait=True)
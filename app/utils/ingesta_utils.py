@@ -0,0 +1,51 @@
+import cv2
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+
+ANCHO_MAXIMO_FRAME = 1280
+
+
+def leer_bytes(origen):
+    """Obtiene los bytes de un archivo subido (UploadedFile), ruta o bytes"""
+    if isinstance(origen, (bytes, bytearray, memoryview)):
+        return bytes(origen)
+    if hasattr(origen, "getvalue"):
+        return origen.getvalue()
+    if hasattr(origen, "read"):
+        return origen.read()
+    with open(origen, "rb") as f:
+        return f.read()
+
+
+def decodificar_imagen(datos, ancho_max=ANCHO_MAXIMO_FRAME):
+    """Decodifica bytes JPEG/PNG a un frame BGR, reduciendo fotos muy grandes"""
+    try:
+        buffer = np.frombuffer(leer_bytes(datos), dtype=np.uint8)
+        frame = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+        if frame is None:
+            return None
+
+        # Las fotos de tablets/celulares suelen venir a 1080p o más
+        alto, ancho = frame.shape[:2]
+        if ancho_max and ancho > ancho_max:
+            escala = ancho_max / ancho
+            frame = cv2.resize(frame, (ancho_max, int(alto * escala)), interpolation=cv2.INTER_AREA)
+        return frame
+    except Exception as e:
+        print(f"❌ Error decodificando imagen: {e}")
+        return None
+
+
+def decodificar_lote(lista_datos, ancho_max=ANCHO_MAXIMO_FRAME, hilos=4):
+    """Decodifica un lote de imágenes en paralelo (cv2.imdecode libera el GIL)"""
+    if not lista_datos:
+        return []
+    with ThreadPoolExecutor(max_workers=min(hilos, len(lista_datos))) as executor:
+        return list(executor.map(lambda d: decodificar_imagen(d, ancho_max), lista_datos))
+
+
+def iterar_lotes(elementos, tam_lote):
+    """Divide una lista en lotes de tamaño fijo"""
+    for i in range(0, len(elementos), tam_lote):
+        yield elementos[i:i + tam_lote]
+
@@ -0,0 +1,118 @@
+import atexit
+import multiprocessing
+import os
+import shutil
+import tempfile
+import numpy as np
+
+from app.utils.rostros_utils import distancias_matriz
+
+
+def _top_k(distancias, k):
+    """Índices y distancias de los k menores por fila, ordenados"""
+    k = min(k, distancias.shape[1])
+    if k == 0:
+        return np.empty((distancias.shape[0], 0), dtype=np.int64), np.empty((distancias.shape[0], 0))
+    parcial = np.argpartition(distancias, k - 1, axis=1)[:, :k]
+    valores = np.take_along_axis(distancias, parcial, axis=1)
+    orden = np.argsort(valores, axis=1, kind='stable')
+    return np.take_along_axis(parcial, orden, axis=1), np.take_along_axis(valores, orden, axis=1)
+
+
+def _trabajador_fragmento(ruta_fragmento, desplazamiento, conexion):
+    """Atiende consultas contra un fragmento de la galería (se ejecuta en un proceso aparte)"""
+    # mmap: el fragmento no se copia al heap del proceso, el SO comparte sus páginas
+    fragmento = np.load(ruta_fragmento, mmap_mode='r')
+    try:
+        while True:
+            mensaje = conexion.recv()
+            if mensaje is None:
+                break
+            consultas, k = mensaje
+            try:
+                indices, distancias = _top_k(distancias_matriz(consultas, fragmento), k)
+                conexion.send((indices + desplazamiento, distancias))
+            except Exception as e:
+                conexion.send(e)
+    except (EOFError, KeyboardInterrupt):
+        pass
+    finally:
+        conexion.close()
+
+
+class MatcherFragmentado:
+    """Galería repartida entre K procesos que buscan en paralelo
+
+    Cada proceso mapea en memoria su porción contigua de la galería (.npy).
+    Las consultas se envían a todos los fragmentos a la vez y se combinan los
+    top-k parciales. Expone la misma firma que
+    `rostros_utils.mejores_coincidencias` para sustituirla sin cambios.
+    """
+
+    def __init__(self, galeria, fragmentos=2, directorio=None):
+        galeria = np.ascontiguousarray(galeria, dtype=np.float64)
+        self.tamano = galeria.shape[0]
+        self.directorio = directorio or tempfile.mkdtemp(prefix="galeria_fragmentos_")
+        self.trabajadores = []
+
+        fragmentos = max(1, min(fragmentos, self.tamano))
+        limites = np.linspace(0, self.tamano, fragmentos + 1, dtype=np.int64)
+        for numero, (inicio, fin) in enumerate(zip(limites[:-1], limites[1:])):
+            ruta = os.path.join(self.directorio, f"fragmento_{numero}.npy")
+            np.save(ruta, galeria[inicio:fin])
+            propia, remota = multiprocessing.Pipe()
+            proceso = multiprocessing.Process(
+                target=_trabajador_fragmento, args=(ruta, int(inicio), remota),
+                name=f"matcher-{numero}", daemon=True
+            )
+            proceso.start()
+            remota.close()
+            self.trabajadores.append((proceso, propia))
+
+        print(f"🧩 Galería de {self.tamano} encodings repartida en {len(self.trabajadores)} procesos")
+        atexit.register(self.cerrar)
+
+    def top_k(self, consultas, k=1):
+        """(indices, distancias) de forma (Q, k) sobre la galería completa"""
+        consultas = np.atleast_2d(np.asarray(consultas, dtype=np.float64))
+        if consultas.shape[0] == 0 or not self.trabajadores:
+            return np.empty((consultas.shape[0], 0), dtype=np.int64), np.empty((consultas.shape[0], 0))
+
+        # Dispersar a todos los fragmentos antes de esperar a ninguno
+        for _, conexion in self.trabajadores:
+            conexion.send((consultas, k))
+
+        # Leer todas las respuestas aunque alguna sea un error: una respuesta
+        # sin leer quedaría en su tubería y contestaría la consulta siguiente
+        respuestas = [conexion.recv() for _, conexion in self.trabajadores]
+        for respuesta in respuestas:
+            if isinstance(respuesta, Exception):
+                raise respuesta
+        indices = [respuesta[0] for respuesta in respuestas]
+        distancias = [respuesta[1] for respuesta in respuestas]
+
+        seleccion, distancias_k = _top_k(np.hstack(distancias), k)
+        return np.take_along_axis(np.hstack(indices), seleccion, axis=1), distancias_k
+
+    def mejores_coincidencias(self, consultas):
+        """Índice y distancia del encoding más cercano para cada consulta"""
+        indices, distancias = self.top_k(consultas, 1)
+        if indices.shape[1] == 0:
+            n = indices.shape[0]
+            return np.full(n, -1, dtype=np.int64), np.full(n, np.inf)
+        return indices[:, 0], distancias[:, 0]
+
+    def cerrar(self):
+        # Al recargar la galería se crea otro matcher: no dejar este retenido por atexit
+        atexit.unregister(self.cerrar)
+        for proceso, conexion in self.trabajadores:
+            try:
+                conexion.send(None)
+                conexion.close()
+            except (BrokenPipeError, OSError):
+                pass
+            proceso.join(timeout=2)
+            if proceso.is_alive():
+                proceso.terminate()
+        self.trabajadores = []
+        shutil.rmtree(self.directorio, ignore_errors=True)
@@ -0,0 +1,103 @@
+import threading
+import time
+import numpy as np
+
+
+class GestorModelos:
+    """Carga perezosa y precalentamiento de los modelos de face_recognition
+
+    Importar face_recognition carga los modelos de dlib (detector, landmarks y
+    encoder), y la primera inferencia además inicializa BLAS. Aquí esa carga
+    se difiere hasta que alguien la necesita y `precalentar()` la adelanta en
+    un hilo en segundo plano, corriendo una inferencia completa sobre un
+    frame sintético para que el primer estudiante no pague la espera.
+    """
+
+    SIN_CARGAR = 'sin_cargar'
+    CARGANDO = 'cargando'
+    LISTO = 'listo'
+    ERROR = 'error'
+
+    def __init__(self):
+        self._modulo = None
+        self._lock = threading.Lock()
+        self._listo = threading.Event()
+        self._hilo = None
+        self.estado = self.SIN_CARGAR
+        self.error = None
+        self.tiempo_carga = None
+        self.tiempo_precalentamiento = None
+
+    def _importar(self):
+        with self._lock:
+            if self._modulo is None:
+                inicio = time.time()
+                import face_recognition
+                self._modulo = face_recognition
+                self.tiempo_carga = time.time() - inicio
+                print(f"🧠 Modelos de reconocimiento cargados en {self.tiempo_carga:.1f}s")
+        return self._modulo
+
+    @property
+    def face_recognition(self):
+        """Módulo face_recognition, cargándolo si aún no se hizo"""
+        return self._modulo or self._importar()
+
+    def _precalentar(self):
+        try:
+            self.estado = self.CARGANDO
+            fr = self._importar()
+            inicio = time.time()
+
+            # Frame sintético: basta con recorrer detector, landmarks y encoder una vez
+            frame = np.full((240, 320, 3), 128, dtype=np.uint8)
+            caja = [(60, 220, 180, 100)]
+            fr.face_locations(frame, model="hog")
+            fr.face_landmarks(frame, caja)
+            fr.face_encodings(frame, caja)
+
+            self.tiempo_precalentamiento = time.time() - inicio
+            self.estado = self.LISTO
+            print(f"🔥 Modelos precalentados en {self.tiempo_precalentamiento:.1f}s")
+        except Exception as e:
+            self.error = str(e)
+            self.estado = self.ERROR
+            print(f"❌ Error cargando modelos de reconocimiento: {e}")
+        finally:
+            self._listo.set()
+
+    def precalentar(self):
+        """Inicia la carga en segundo plano (solo la primera vez)"""
+        with self._lock:
+            if self._hilo is None:
+                self._hilo = threading.Thread(target=self._precalentar, name="precalentar-modelos", daemon=True)
+                self._hilo.start()
+        return self._hilo
+
+    def esperar(self, timeout=None):
+        """Bloquea hasta que termine el precalentamiento; retorna True si quedó listo"""
+        self.precalentar()
+        self._listo.wait(timeout)
+        return self.estado == self.LISTO
+
+    def obtener_estado(self):
+        return {
+            'estado': self.estado,
+            'tiempo_carga': self.tiempo_carga,
+            'tiempo_precalentamiento': self.tiempo_precalentamiento,
+            'error': self.error
+        }
+
+
+class _ModuloPerezoso:
+    """Sustituto de `import face_recognition` que delega en el gestor al primer uso"""
+
+    def __init__(self, gestor):
+        self._gestor = gestor
+
+    def __getattr__(self, nombre):
+        return getattr(self._gestor.face_recognition, nombre)
+
+
+gestor_modelos = GestorModelos()
+face_recognition = _ModuloPerezoso(gestor_modelos)
@@ -0,0 +1,80 @@
+import zlib
+
+# A4 en puntos PDF (1/72 de pulgada)
+A4_PUNTOS = (595.28, 841.89)
+
+
+def comprimir_pixeles(datos, nivel=6):
+    """Píxeles crudos en el formato que espera /FlateDecode"""
+    return zlib.compress(datos, nivel)
+
+
+class EscritorPDF:
+    """Escritor PDF mínimo de páginas formadas por una sola imagen
+
+    Cada página se escribe en `archivo` en cuanto se agrega, de modo que un
+    documento de cientos de páginas nunca está completo en memoria. Solo se
+    guardan los desplazamientos de cada objeto para la tabla xref final.
+    """
+
+    def __init__(self, archivo, tamano_pagina=A4_PUNTOS):
+        self.archivo = archivo
+        self.ancho, self.alto = tamano_pagina
+        self.posicion = 0
+        self.desplazamientos = {}
+        self.paginas = []
+        # 1 = catálogo y 2 = árbol de páginas, se escriben al cerrar
+        self.siguiente_objeto = 3
+        self._escribir(b"%PDF-1.4\n%\xe2\xe3\xcf\xd3\n")
+
+    def _escribir(self, datos):
+        self.archivo.write(datos)
+        self.posicion += len(datos)
+
+    def _objeto(self, numero, cuerpo, flujo=None):
+        self.desplazamientos[numero] = self.posicion
+        self._escribir(f"{numero} 0 obj\n".encode() + cuerpo)
+        if flujo is not None:
+            self._escribir(b"\nstream\n" + flujo + b"\nendstream")
+        self._escribir(b"\nendobj\n")
+
+    def _reservar(self):
+        numero = self.siguiente_objeto
+        self.siguiente_objeto += 1
+        return numero
+
+    def agregar_pagina_imagen(self, ancho_px, alto_px, datos, gris=True, jpeg=False):
+        """Agrega una página cubierta por una imagen
+
+        datos: píxeles de 8 bits (L o RGB) ya pasados por `comprimir_pixeles`,
+        o un JPEG si jpeg=True. Comprimir fuera permite hacerlo en otro proceso.
+        """
+        imagen, contenido, pagina = self._reservar(), self._reservar(), self._reservar()
+        espacio = "/DeviceGray" if gris else "/DeviceRGB"
+        filtro = "/DCTDecode" if jpeg else "/FlateDecode"
+        self._objeto(imagen, (
+            f"<< /Type /XObject /Subtype /Image /Width {ancho_px} /Height {alto_px} "
+            f"/ColorSpace {espacio} /BitsPerComponent 8 /Filter {filtro} /Length {len(datos)} >>"
+        ).encode(), datos)
+
+        dibujo = f"q {self.ancho:.2f} 0 0 {self.alto:.2f} 0 0 cm /Im0 Do Q".encode()
+        self._objeto(contenido, f"<< /Length {len(dibujo)} >>".encode(), dibujo)
+        self._objeto(pagina, (
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {self.ancho:.2f} {self.alto:.2f}] "
+            f"/Resources << /XObject << /Im0 {imagen} 0 R >> >> /Contents {contenido} 0 R >>"
+        ).encode())
+        self.paginas.append(pagina)
+
+    def cerrar(self):
+        """Escribe el árbol de páginas, el catálogo y la tabla xref"""
+        hijos = " ".join(f"{p} 0 R" for p in self.paginas)
+        self._objeto(2, f"<< /Type /Pages /Kids [{hijos}] /Count {len(self.paginas)} >>".encode())
+        self._objeto(1, b"<< /Type /Catalog /Pages 2 0 R >>")
+
+        inicio_xref = self.posicion
+        total = self.siguiente_objeto
+        lineas = [f"xref\n0 {total}\n", "0000000000 65535 f \n"]
+        lineas += [f"{self.desplazamientos[n]:010d} 00000 n \n" for n in range(1, total)]
+        lineas.append(f"trailer\n<< /Size {total} /Root 1 0 R >>\nstartxref\n{inicio_xref}\n%%EOF\n")
+        self._escribir("".join(lineas).encode())
+        return len(self.paginas)
@@ -1,13 +1,229 @@
 import cv2
+import hashlib
 import numpy as np
+import os
 import qrcode
-from pyzbar.pyzbar import decode
+import threading
+import time
+from pyzbar.locations import Point, Rect
 import io
 from PIL import Image
 
-class QRManager:
+from app.utils.cache_utils import CacheLRU
+
+# Ancho al que se reduce el frame en la primera etapa de decodificación
+ANCHO_REDUCIDO = 320
+# Regiones candidatas (contornos cuadrados) que se prueban en la segunda etapa
+MAX_REGIONES_CANDIDATAS = 4
+ETAPAS_DECODIFICACION = ('reducida', 'regiones', 'completa')
+
+DIRECTORIO_CACHE_QR = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "assets", "qr_cache"))
+TAMANO_QR_PNG = 300
+
+
+def generar_qr_nitido(datos, lado, borde=2):
+    """Imagen QR en escala de grises con módulos nítidos: se escala la matriz sin interpolar"""
+    qr = qrcode.QRCode(error_correction=qrcode.constants.ERROR_CORRECT_L, box_size=1, border=borde)
+    qr.add_data(datos)
+    qr.make(fit=True)
+    matriz = np.array(qr.get_matrix(), dtype=np.uint8)
+    return Image.fromarray((1 - matriz) * 255).resize((lado, lado), Image.NEAREST)
+
+
+class CacheQRPng:
+    """PNG de códigos QR ya renderizados: LRU en memoria delante de un almacén en disco
+
+    La clave es (qr_code, tamaño), así que un estudiante con QR nuevo nunca
+    recibe la imagen anterior; `invalidar` libera la del código viejo.
+    """
+
+    def __init__(self, directorio=DIRECTORIO_CACHE_QR, capacidad=256):
+        self.directorio = directorio
+        self.memoria = CacheLRU(capacidad)
+
+    def _ruta(self, qr_code, tamano=None):
+        """Ruta del PNG; sin tamaño, la carpeta y el prefijo común a todos los tamaños"""
+        digest = hashlib.sha256(qr_code.encode('utf-8')).hexdigest()[:24]
+        carpeta = os.path.join(self.directorio, digest[:2])
+        return (carpeta, f"{digest}_") if tamano is None else os.path.join(carpeta, f"{digest}_{tamano}.png")
+
+    def obtener_png(self, qr_code, tamano=TAMANO_QR_PNG):
+        clave = (qr_code, tamano)
+        png = self.memoria.obtener(clave)
+        if png is not None:
+            return png
+
+        ruta = self._ruta(qr_code, tamano)
+        try:
+            with open(ruta, "rb") as f:
+                png = f.read()
+        except OSError:
+            buffer = io.BytesIO()
+            generar_qr_nitido(qr_code, tamano, borde=4).save(buffer, format="PNG", optimize=True)
+            png = buffer.getvalue()
+            try:
+                os.makedirs(os.path.dirname(ruta), exist_ok=True)
+                temporal = f"{ruta}.{threading.get_ident()}.tmp"
+                with open(temporal, "wb") as f:
+                    f.write(png)
+                os.replace(temporal, ruta)
+            except OSError as e:
+                print(f"⚠️ No se pudo guardar el QR en la caché de disco: {e}")
+
+        self.memoria.guardar(clave, png)
+        return png
+
+    def invalidar(self, qr_code):
+        """Descarta todas las imágenes de un código (en memoria y en disco)"""
+        if not qr_code:
+            return
+        self.memoria.descartar(lambda clave: clave[0] == qr_code)
+        carpeta, prefijo = self._ruta(qr_code)
+        if os.path.isdir(carpeta):
+            for nombre in os.listdir(carpeta):
+                if nombre.startswith(prefijo):
+                    try:
+                        os.remove(os.path.join(carpeta, nombre))
+                    except OSError:
+                        pass
+
+
+class DecodificadorPyzbar:
+    """ZBar restringido a símbolos QR"""
+    nombre = 'pyzbar'
+
     def __init__(self):
-        pass
+        # Import diferido: sin la biblioteca zbar del sistema se puede usar OpenCV
+        from pyzbar.pyzbar import decode, ZBarSymbol
+        self._decode = decode
+        self._simbolos = [ZBarSymbol.QRCODE]
+
+    def decodificar(self, gris):
+        """Lista de (texto, [(x, y), ...]) en coordenadas de la imagen recibida"""
+        return [(obj.data.decode('utf-8'), [(p.x, p.y) for p in obj.polygon])
+                for obj in self._decode(gris, symbols=self._simbolos)]
+
+
+class DecodificadorOpenCV:
+    """cv2.QRCodeDetector.detectAndDecodeMulti: varios códigos por imagen y tolera inclinación"""
+    nombre = 'opencv'
+
+    def __init__(self):
+        # QRCodeDetector guarda estado interno: uno por hilo
+        self._local = threading.local()
+
+    def decodificar(self, gris):
+        detector = getattr(self._local, 'detector', None)
+        if detector is None:
+            detector = self._local.detector = cv2.QRCodeDetector()
+        encontrado, textos, puntos, _ = detector.detectAndDecodeMulti(gris)
+        if not encontrado or puntos is None:
+            return []
+        return [(texto, [(float(x), float(y)) for x, y in esquinas])
+                for texto, esquinas in zip(textos, puntos) if texto]
+
+
+DECODIFICADORES_QR = {
+    DecodificadorPyzbar.nombre: DecodificadorPyzbar,
+    DecodificadorOpenCV.nombre: DecodificadorOpenCV
+}
+
+
+def crear_decodificador(nombre):
+    """Instancia el decodificador por nombre; si pyzbar no está disponible se usa OpenCV"""
+    clase = DECODIFICADORES_QR.get(nombre or DecodificadorPyzbar.nombre, DecodificadorPyzbar)
+    try:
+        return clase()
+    except ImportError as e:
+        print(f"⚠️ Decodificador QR '{clase.nombre}' no disponible ({e}), se usa OpenCV")
+        return DecodificadorOpenCV()
+
+
+def _trasladar(texto, poligono, factor=1.0, dx=0, dy=0):
+    """Resultado sobre una imagen reducida o recortada, en coordenadas del frame"""
+    puntos = [Point(int(x / factor) + dx, int(y / factor) + dy) for x, y in poligono]
+    xs = [p.x for p in puntos]
+    ys = [p.y for p in puntos]
+    return {
+        'data': texto,
+        'polygon': puntos,
+        'rect': Rect(min(xs), min(ys), max(xs) - min(xs), max(ys) - min(ys))
+    }
+
+
+def buscar_regiones_candidatas(gris, maximo=MAX_REGIONES_CANDIDATAS, lado_minimo=24):
+    """Cajas (x, y, w, h) aproximadamente cuadradas con textura densa, las más grandes primero
+    
+    Gradiente morfológico + umbral de Otsu + cierre: los módulos de un QR se
+    funden en una mancha compacta. Es un filtro barato, no un detector.
+    """
+    nucleo = cv2.getStructuringElement(cv2.MORPH_RECT, (3, 3))
+    gradiente = cv2.morphologyEx(gris, cv2.MORPH_GRADIENT, nucleo)
+    _, binaria = cv2.threshold(gradiente, 0, 255, cv2.THRESH_BINARY + cv2.THRESH_OTSU)
+    binaria = cv2.morphologyEx(binaria, cv2.MORPH_CLOSE, cv2.getStructuringElement(cv2.MORPH_RECT, (9, 9)))
+    contornos, _ = cv2.findContours(binaria, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+
+    alto_img, ancho_img = gris.shape[:2]
+    cajas = []
+    for contorno in contornos:
+        x, y, w, h = cv2.boundingRect(contorno)
+        if min(w, h) < lado_minimo or w * h > 0.8 * ancho_img * alto_img:
+            continue
+        if not 0.6 <= w / h <= 1.6:
+            continue
+        # La mancha de un QR llena buena parte de su caja
+        if cv2.contourArea(contorno) < 0.5 * w * h:
+            continue
+        cajas.append((x, y, w, h))
+    cajas.sort(key=lambda c: c[2] * c[3], reverse=True)
+    return cajas[:maximo]
+
+
+class QRManager:
+    def __init__(self, decodificador=None):
+        self._lock = threading.Lock()
+        self._decodificador = decodificador
+        self.reiniciar_tiempos()
+
+    @property
+    def decodificador(self):
+        # Se crea al primer uso para que importar el módulo no requiera zbar
+        if self._decodificador is None:
+            self._decodificador = crear_decodificador(None)
+        return self._decodificador
+
+    def configurar_decodificador(self, nombre):
+        """Cambia el decodificador si el configurado es otro"""
+        if self._decodificador is None or self._decodificador.nombre != nombre:
+            self._decodificador = crear_decodificador(nombre)
+            self.reiniciar_tiempos()
+        return self._decodificador.nombre
+
+    def reiniciar_tiempos(self):
+        with self._lock:
+            self._tiempos = {etapa: {'llamadas': 0, 'ms': 0.0, 'exitos': 0} for etapa in ETAPAS_DECODIFICACION}
+            self.ultimo_detalle = {}
+
+    def _medir(self, detalle, etapa, inicio, resultados):
+        ms = (time.perf_counter() - inicio) * 1000
+        detalle[etapa] = ms
+        with self._lock:
+            tiempos = self._tiempos[etapa]
+            tiempos['llamadas'] += 1
+            tiempos['ms'] += ms
+            tiempos['exitos'] += bool(resultados)
+
+    def obtener_tiempos_etapas(self):
+        """Por etapa: veces que se ejecutó, tiempo medio en ms y veces que encontró algún QR"""
+        with self._lock:
+            return {
+                etapa: {
+                    'llamadas': t['llamadas'],
+                    'ms_promedio': t['ms'] / t['llamadas'] if t['llamadas'] else 0.0,
+                    'exitos': t['exitos']
+                }
+                for etapa, t in self._tiempos.items()
+            }
     
     def generar_qr_imagen(self, data, size=200):
         """Genera una imagen QR a partir de datos"""
@@ -25,30 +241,78 @@ class QRManager:
         
         return qr_img
     
-    def detectar_qr_en_frame(self, frame):
-        """Detecta y decodifica códigos QR en un frame de cámara"""
+    def detectar_qr_en_frame(self, frame, escalonado=True):
+        """Detecta y decodifica códigos QR en un frame de cámara
+        
+        Escalonado: primero el frame reducido, luego recortes a resolución
+        completa de las regiones candidatas que ningún código leído cubre y,
+        si quedó alguna candidata sin leer (o no se leyó nada), el frame
+        completo, siempre con el decodificador configurado. El tiempo de cada
+        etapa del último frame queda en `ultimo_detalle` (ms).
+        """
         try:
-            # Convertir frame de OpenCV a formato PIL
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+            detalle = {}
+            qr_datos, pendientes = self._decodificar_escalonado(gray, detalle) if escalonado else ([], True)
             
-            # Detectar QR codes
-            decoded_objects = decode(gray)
-            
-            qr_datos = []
-            for obj in decoded_objects:
-                if obj.type == 'QRCODE':
-                    qr_data = obj.data.decode('utf-8')
-                    qr_datos.append({
-                        'data': qr_data,
-                        'polygon': obj.polygon,
-                        'rect': obj.rect
-                    })
+            if not qr_datos or pendientes:
+                inicio = time.perf_counter()
+                vistos = {qr['data'] for qr in qr_datos}
+                completa = [_trasladar(*qr) for qr in self.decodificador.decodificar(gray)]
+                qr_datos += [qr for qr in completa if qr['data'] not in vistos]
+                self._medir(detalle, 'completa', inicio, completa)
             
+            self.ultimo_detalle = detalle
             return qr_datos
         except Exception as e:
             print(f"❌ Error detectando QR: {e}")
             return []
     
+    def _decodificar_escalonado(self, gray, detalle):
+        """(qr_datos, pendientes): pendientes indica que alguna región candidata no se pudo leer"""
+        alto, ancho = gray.shape[:2]
+        if ancho <= ANCHO_REDUCIDO:
+            return [], True  # el frame ya es pequeño, la etapa completa cuesta lo mismo
+        
+        # 1. Frame reducido
+        inicio = time.perf_counter()
+        factor = ANCHO_REDUCIDO / ancho
+        reducida = cv2.resize(gray, (ANCHO_REDUCIDO, int(alto * factor)), interpolation=cv2.INTER_AREA)
+        qr_datos = [_trasladar(*qr, factor=factor) for qr in self.decodificador.decodificar(reducida)]
+        self._medir(detalle, 'reducida', inicio, qr_datos)
+        
+        # 2. Recortes a resolución completa alrededor de las regiones candidatas
+        # que no cubre ningún código ya leído (varios carnets en el mismo frame)
+        inicio = time.perf_counter()
+        vistos = {qr['data'] for qr in qr_datos}
+        encontrados = []
+        pendientes = False
+        regiones = 0
+        for x, y, w, h in buscar_regiones_candidatas(reducida, maximo=None):
+            centro_x, centro_y = (x + w / 2) / factor, (y + h / 2) / factor
+            if any(r.left <= centro_x <= r.left + r.width and r.top <= centro_y <= r.top + r.height
+                   for r in (qr['rect'] for qr in qr_datos)):
+                continue
+            if regiones == MAX_REGIONES_CANDIDATAS:
+                pendientes = True  # quedan candidatas sin probar
+                break
+            regiones += 1
+            margen = int(max(w, h) * 0.25)
+            x0 = max(0, int((x - margen) / factor))
+            y0 = max(0, int((y - margen) / factor))
+            x1 = min(ancho, int((x + w + margen) / factor))
+            y1 = min(alto, int((y + h + margen) / factor))
+            leidos = self.decodificador.decodificar(gray[y0:y1, x0:x1])
+            pendientes |= not leidos
+            for texto, poligono in leidos:
+                qr = _trasladar(texto, poligono, dx=x0, dy=y0)
+                if qr['data'] not in vistos:
+                    vistos.add(qr['data'])
+                    encontrados.append(qr)
+        if regiones:
+            self._medir(detalle, 'regiones', inicio, encontrados)
+        return qr_datos + encontrados, pendientes
+    
     def dibujar_qr_detectado(self, frame, qr_datos):
         """Dibuja rectángulos alrededor de los QR detectados"""
         for qr in qr_datos:
@@ -69,4 +333,5 @@ class QRManager:
         return frame
 
 # Instancia global para fácil acceso
-qr_manager = QRManager()
\ No newline at end of file
+qr_manager = QRManager()
+cache_qr = CacheQRPng()
\ No newline at end of file
@@ -0,0 +1,174 @@
+import numpy as np
+
+UMBRAL_RECONOCIMIENTO = 0.6  # Distancia máxima para aceptar una coincidencia
+DIMENSION_ENCODING = 128
+
+# Parámetros con los que se generó la galería original (face_recognition por defecto:
+# detector HOG, modelo de 5 puntos "small" y un solo muestreo)
+VERSION_ENCODING_INICIAL = "hog-small-j1"
+
+
+def version_encoding(modelo_deteccion="hog", modelo_landmarks="large", num_jitters=1):
+    """Etiqueta que identifica los parámetros que produjeron un encoding"""
+    return f"{modelo_deteccion}-{modelo_landmarks}-j{int(num_jitters)}"
+
+
+def parametros_version(version):
+    """Inverso de version_encoding: 'hog-large-j1' → ('hog', 'large', 1)"""
+    try:
+        modelo_deteccion, modelo_landmarks, jitters = version.split("-")
+        return modelo_deteccion, modelo_landmarks, int(jitters.lstrip("j"))
+    except (AttributeError, ValueError):
+        return parametros_version(VERSION_ENCODING_INICIAL)
+
+
+def matriz_galeria(encodings):
+    """Convierte la lista de encodings en una matriz (N, 128) contigua"""
+    if len(encodings) == 0:
+        return np.empty((0, DIMENSION_ENCODING), dtype=np.float64)
+    return np.ascontiguousarray(np.vstack(encodings), dtype=np.float64)
+
+
+def distancias_matriz(consultas, galeria):
+    """Distancias euclidianas entre cada consulta y cada encoding de la galería
+
+    Usa ||a - b||² = ||a||² + ||b||² - 2·a·b para resolver todo con un
+    único producto de matrices en lugar de un bucle por rostro.
+    """
+    consultas = np.asarray(consultas, dtype=np.float64).reshape(-1, DIMENSION_ENCODING)
+    galeria = np.asarray(galeria, dtype=np.float64).reshape(-1, DIMENSION_ENCODING)
+    if consultas.shape[0] == 0 or galeria.shape[0] == 0:
+        return np.empty((consultas.shape[0], galeria.shape[0]), dtype=np.float64)
+
+    cuadrados = (
+        np.einsum('ij,ij->i', consultas, consultas)[:, None]
+        + np.einsum('ij,ij->i', galeria, galeria)[None, :]
+        - 2.0 * consultas @ galeria.T
+    )
+    np.maximum(cuadrados, 0.0, out=cuadrados)
+    return np.sqrt(cuadrados)
+
+
+def mejores_coincidencias(consultas, galeria):
+    """Índice y distancia del encoding más cercano para cada consulta"""
+    distancias = distancias_matriz(consultas, galeria)
+    if distancias.shape[1] == 0:
+        n = distancias.shape[0]
+        return np.full(n, -1, dtype=np.int64), np.full(n, np.inf)
+    indices = np.argmin(distancias, axis=1)
+    return indices, distancias[np.arange(len(indices)), indices]
+
+
+def distancias_por_estudiante(distancias, ids_galeria):
+    """Reduce una matriz (F, N) a la distancia mínima por estudiante (F, E)
+
+    Retorna (ids_unicos, matriz_minimos). Ordena la galería por estudiante una
+    vez y usa np.minimum.reduceat para evitar recorrer estudiante por estudiante.
+    """
+    ids_galeria = np.asarray(ids_galeria)
+    orden = np.argsort(ids_galeria, kind='stable')
+    ids_ordenados = ids_galeria[orden]
+    ids_unicos, inicios = np.unique(ids_ordenados, return_index=True)
+    if distancias.shape[0] == 0 or len(ids_unicos) == 0:
+        return ids_unicos, np.empty((distancias.shape[0], len(ids_unicos)))
+    return ids_unicos, np.minimum.reduceat(distancias[:, orden], inicios, axis=1)
+
+
+def asignar_rostros(minimos, umbral=UMBRAL_RECONOCIMIENTO):
+    """Asignación voraz rostro→estudiante sin repetir ninguno de los dos
+
+    Recorre los pares (rostro, estudiante) de menor a mayor distancia, de modo
+    que dos rostros parecidos no se lleven al mismo estudiante.
+    """
+    asignaciones = {}
+    if minimos.size == 0:
+        return asignaciones
+
+    filas, columnas = np.nonzero(minimos < umbral)
+    orden = np.argsort(minimos[filas, columnas], kind='stable')
+    estudiantes_usados = set()
+    for fila, columna in zip(filas[orden], columnas[orden]):
+        if fila in asignaciones or columna in estudiantes_usados:
+            continue
+        asignaciones[int(fila)] = int(columna)
+        estudiantes_usados.add(columna)
+    return asignaciones
+
+
+def generar_teselas(alto, ancho, tam_tesela=800, solapamiento=0.25):
+    """Divide una imagen grande en teselas solapadas (top, left, bottom, right)"""
+    if alto <= tam_tesela and ancho <= tam_tesela:
+        return [(0, 0, alto, ancho)]
+
+    paso = max(1, int(tam_tesela * (1 - solapamiento)))
+    teselas = []
+    for top in range(0, max(alto - tam_tesela, 0) + paso, paso):
+        for left in range(0, max(ancho - tam_tesela, 0) + paso, paso):
+            bottom = min(top + tam_tesela, alto)
+            right = min(left + tam_tesela, ancho)
+            teselas.append((max(0, bottom - tam_tesela), max(0, right - tam_tesela), bottom, right))
+    return list(dict.fromkeys(teselas))
+
+
+def suprimir_duplicados(face_locations, umbral_iou=0.4):
+    """Elimina rostros detectados dos veces en teselas solapadas (NMS por IoU)"""
+    if len(face_locations) <= 1:
+        return list(face_locations)
+
+    cajas = np.asarray(face_locations, dtype=np.float64)  # (top, right, bottom, left)
+    areas = (cajas[:, 2] - cajas[:, 0]) * (cajas[:, 1] - cajas[:, 3])
+    orden = np.argsort(-areas)
+    conservadas = []
+
+    while orden.size > 0:
+        i = orden[0]
+        conservadas.append(i)
+        resto = orden[1:]
+        alto = np.minimum(cajas[i, 2], cajas[resto, 2]) - np.maximum(cajas[i, 0], cajas[resto, 0])
+        ancho = np.minimum(cajas[i, 1], cajas[resto, 1]) - np.maximum(cajas[i, 3], cajas[resto, 3])
+        interseccion = np.clip(alto, 0, None) * np.clip(ancho, 0, None)
+        iou = interseccion / (areas[i] + areas[resto] - interseccion)
+        # También descartar cajas casi contenidas en la conservada (cortes en el borde de la tesela)
+        contenida = interseccion / areas[resto]
+        orden = resto[(iou < umbral_iou) & (contenida < 0.7)]
+
+    return [tuple(int(v) for v in face_locations[i]) for i in conservadas]
+
+
+def seleccion_diversa(encodings, maximo):
+    """Índices de un subconjunto diverso de encodings (farthest-point sampling)
+
+    Parte del encoding más cercano al promedio y agrega en cada paso el que
+    está más lejos de todos los ya elegidos, actualizando las distancias
+    mínimas con una sola fila de distancias por paso.
+    """
+    encodings = np.asarray(encodings, dtype=np.float64)
+    n = encodings.shape[0]
+    if n <= maximo:
+        return np.arange(n)
+
+    centro = encodings.mean(axis=0)
+    inicial = int(np.argmin(distancias_matriz(centro, encodings)[0]))
+    elegidos = [inicial]
+    minimas = distancias_matriz(encodings[inicial], encodings)[0]
+
+    while len(elegidos) < maximo:
+        siguiente = int(np.argmax(minimas))
+        if minimas[siguiente] <= 0.0:
+            break  # el resto son copias exactas de encodings ya elegidos
+        elegidos.append(siguiente)
+        np.minimum(minimas, distancias_matriz(encodings[siguiente], encodings)[0], out=minimas)
+
+    return np.sort(np.asarray(elegidos))
+
+
+def iou_cajas(caja_a, caja_b):
+    """Intersección sobre unión de dos cajas (top, right, bottom, left)"""
+    alto = min(caja_a[2], caja_b[2]) - max(caja_a[0], caja_b[0])
+    ancho = min(caja_a[1], caja_b[1]) - max(caja_a[3], caja_b[3])
+    if alto <= 0 or ancho <= 0:
+        return 0.0
+    interseccion = alto * ancho
+    area_a = (caja_a[2] - caja_a[0]) * (caja_a[1] - caja_a[3])
+    area_b = (caja_b[2] - caja_b[0]) * (caja_b[1] - caja_b[3])
+    return interseccion / float(area_a + area_b - interseccion)
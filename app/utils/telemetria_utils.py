@@ -0,0 +1,82 @@
+import threading
+import time
+from datetime import date
+
+
+class TelemetriaReconocimiento:
+    """Contadores por estudiante del reconocimiento en vivo
+
+    Se acumulan en memoria por cada frame y se vuelcan a la tabla
+    `telemetria_reconocimiento` cada `intervalo_volcado` segundos con un único
+    executemany, de modo que el bucle de cámara no escribe en la base por frame.
+    """
+
+    def __init__(self, db_manager, intervalo_volcado=60):
+        self.db = db_manager
+        self.intervalo_volcado = intervalo_volcado
+        self.ultimo_volcado = time.monotonic()
+        self._lock = threading.Lock()
+        self._contadores = {}
+        # Frames en que el estudiante fue el candidato más cercano antes de confirmarlo;
+        # se cuentan solo hasta la confirmación y se descartan al cambiar el día
+        self._frames_sin_confirmar = {}
+        self._dia = date.today()
+
+    def _contador(self, estudiante_id):
+        contador = self._contadores.get(estudiante_id)
+        if contador is None:
+            contador = self._contadores[estudiante_id] = {
+                'frames_vistos': 0,
+                'frames_aceptados': 0,
+                'suma_distancia': 0.0,
+                'distancia_minima': None,
+                'confirmaciones_rostro': 0,
+                'frames_hasta_confirmar': 0,
+                'registros_qr': 0
+            }
+        return contador
+
+    def observar(self, estudiante_id, distancia, aceptada, ya_registrado=False):
+        """Un rostro cuyo candidato más cercano es el estudiante, aceptado o no"""
+        with self._lock:
+            hoy = date.today()
+            if hoy != self._dia:
+                self._dia = hoy
+                self._frames_sin_confirmar.clear()
+            contador = self._contador(estudiante_id)
+            contador['frames_vistos'] += 1
+            contador['suma_distancia'] += distancia
+            if contador['distancia_minima'] is None or distancia < contador['distancia_minima']:
+                contador['distancia_minima'] = distancia
+            if aceptada:
+                contador['frames_aceptados'] += 1
+            if not ya_registrado:
+                self._frames_sin_confirmar[estudiante_id] = self._frames_sin_confirmar.get(estudiante_id, 0) + 1
+
+    def confirmar(self, estudiante_id, metodo):
+        """La asistencia del estudiante quedó registrada por `metodo`"""
+        with self._lock:
+            contador = self._contador(estudiante_id)
+            frames = self._frames_sin_confirmar.pop(estudiante_id, 0)
+            if metodo == 'qr':
+                contador['registros_qr'] += 1
+            else:
+                contador['confirmaciones_rostro'] += 1
+                contador['frames_hasta_confirmar'] += max(frames, 1)
+
+    def volcar(self):
+        """Escribe los contadores acumulados y los reinicia"""
+        with self._lock:
+            contadores, self._contadores = self._contadores, {}
+        self.ultimo_volcado = time.monotonic()
+        if not contadores:
+            return 0
+        filas = [(estudiante_id, date.today().isoformat(), c['frames_vistos'], c['frames_aceptados'], c['suma_distancia'],
+                  c['distancia_minima'], c['confirmaciones_rostro'], c['frames_hasta_confirmar'], c['registros_qr'])
+                 for estudiante_id, c in contadores.items()]
+        return self.db.acumular_telemetria_reconocimiento(filas)
+
+    def volcar_si_corresponde(self):
+        if time.monotonic() - self.ultimo_volcado >= self.intervalo_volcado:
+            return self.volcar()
+        return 0
@@ -0,0 +1,42 @@
+import hashlib
+import hmac
+import re
+
+PREFIJO_QR = "EDU"
+LONGITUD_FIRMA = 8
+
+
+def firmar(estudiante_id, secreto):
+    """Primeros caracteres hex del HMAC-SHA256 del id con el secreto del colegio"""
+    mensaje = f"{PREFIJO_QR}-{estudiante_id:04d}".encode()
+    return hmac.new(secreto.encode(), mensaje, hashlib.sha256).hexdigest()[:LONGITUD_FIRMA]
+
+
+def generar_codigo_qr(estudiante_id, secreto):
+    """Código QR determinista `EDU-<id>-<firma>`
+
+    Es único porque lleva el id de la fila, así que no hace falta comprobarlo
+    contra la base; la firma evita que se pueda adivinar el código de otro.
+    Tiene la misma forma que los códigos aleatorios anteriores.
+    """
+    return f"{PREFIJO_QR}-{estudiante_id:04d}-{firmar(estudiante_id, secreto)}"
+
+
+_FORMATO = re.compile(rf"^{PREFIJO_QR}-(\d{{4,}})-([0-9a-f]{{{LONGITUD_FIRMA}}})$")
+
+
+def verificar_codigo_qr(codigo, secreto):
+    """Id del estudiante si el código está firmado con el secreto, si no None
+
+    No consulta la base: sirve para kioscos sin conexión. Los códigos
+    aleatorios antiguos no verifican y deben resolverse por el directorio.
+    """
+    if not secreto or not codigo:
+        return None
+    coincidencia = _FORMATO.match(codigo)
+    if not coincidencia:
+        return None
+    estudiante_id = int(coincidencia.group(1))
+    if not hmac.compare_digest(coincidencia.group(2), firmar(estudiante_id, secreto)):
+        return None
+    return estudiante_id
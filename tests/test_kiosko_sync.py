@@ -0,0 +1,139 @@
+import os
+import shutil
+import numpy as np
+import pytest
+
+import app.data.database as database
+from app.data.database_kiosko import DatabaseKiosko
+from app.services.kiosko_service import SincronizacionCentral, SincronizacionKiosko, _leer_metadatos
+
+
+@pytest.fixture
+def central(tmp_path, monkeypatch):
+    monkeypatch.setattr(database, "DB_PATH", str(tmp_path / "central.db"))
+    return database.DatabaseManager()
+
+
+@pytest.fixture
+def compartido(tmp_path):
+    return str(tmp_path / "compartido")
+
+
+@pytest.fixture
+def kiosko(tmp_path):
+    return DatabaseKiosko(str(tmp_path / "kiosko"), kiosko_id="k1")
+
+
+def _estudiante(db, dni):
+    return db.agregar_estudiante(dni, f"Nombre{dni}", f"Apellido{dni}", "2015-01-01", "M", "", "", "",
+                                 "", "", "mañana", "2025")
+
+
+def _encoding(db, estudiante_id, version=None):
+    db.guardar_encoding_facial(estudiante_id, np.random.rand(128), None, version)
+    return max(fila[0] for fila in db.obtener_delta_galeria()[0])
+
+
+def _ids_kiosko(kiosko):
+    conn = kiosko._get_connection()
+    try:
+        return {fila[0] for fila in conn.execute("SELECT id FROM encodings")}
+    finally:
+        conn.close()
+
+
+def _sincronizar(central, kiosko, compartido):
+    ruta = SincronizacionCentral(central, compartido).publicar_galeria()
+    SincronizacionKiosko(kiosko, compartido).recibir_galeria()
+    return ruta
+
+
+def test_paquete_completo_y_delta(central, kiosko, compartido):
+    estudiante = _estudiante(central, "10000001")
+    primeros = {_encoding(central, estudiante) for _ in range(3)}
+
+    ruta = _sincronizar(central, kiosko, compartido)
+    assert _leer_metadatos(ruta)['completo']
+    assert _ids_kiosko(kiosko) == primeros
+
+    nuevo = _encoding(central, estudiante)
+    ruta = _sincronizar(central, kiosko, compartido)
+    metadatos = _leer_metadatos(ruta)
+    assert not metadatos['completo']
+    assert metadatos['encodings_nuevos'] == 1
+    assert _ids_kiosko(kiosko) == primeros | {nuevo}
+
+    # Sin cambios no se publica nada
+    assert SincronizacionCentral(central, compartido).publicar_galeria() is None
+
+
+def test_poda_elimina_encodings_del_kiosko(central, kiosko, compartido):
+    estudiante = _estudiante(central, "10000002")
+    ids = [_encoding(central, estudiante) for _ in range(3)]
+    _sincronizar(central, kiosko, compartido)
+
+    central.eliminar_encodings([ids[0]])
+    _sincronizar(central, kiosko, compartido)
+    assert _ids_kiosko(kiosko) == set(ids[1:])
+
+
+def test_reenvio_de_cola_es_idempotente(central, kiosko, compartido):
+    estudiante = _estudiante(central, "10000003")
+    _encoding(central, estudiante)
+    _sincronizar(central, kiosko, compartido)
+
+    assert kiosko.registrar_asistencia(estudiante, 'qr', 1.0)
+    assert not kiosko.registrar_asistencia(estudiante, 'rostro', 0.9)
+    sincronizacion = SincronizacionCentral(central, compartido)
+    assert SincronizacionKiosko(kiosko, compartido).enviar_asistencias() == 1
+    assert sincronizacion.recibir_asistencias() == 1
+
+    # El mismo archivo vuelve a llegar (reintento del kiosco)
+    procesados = os.path.join(compartido, "asistencias", "procesados")
+    for nombre in os.listdir(procesados):
+        shutil.copy(os.path.join(procesados, nombre), os.path.join(compartido, "asistencias", "reenvio_" + nombre))
+    assert sincronizacion.recibir_asistencias() == 0
+    assert len(central.obtener_asistencias_hoy()) == 1
+
+
+def test_cambio_de_version_con_reencodificacion_en_curso(central, kiosko, compartido):
+    estudiante = _estudiante(central, "10000004")
+    v1 = central.obtener_version_encodings_activa()
+    anteriores = {_encoding(central, estudiante) for _ in range(2)}
+    _sincronizar(central, kiosko, compartido)
+
+    # La re-codificación escribe la versión nueva mientras v1 sigue activa...
+    assert central.guardar_lote_reencodificado("hog-large-j1", [(estudiante, np.random.rand(128), None)], [])
+    # ...y un enrolamiento en v1 publicado entretanto queda con un id mayor
+    enrolado = _encoding(central, estudiante, v1)
+    _sincronizar(central, kiosko, compartido)
+    assert _ids_kiosko(kiosko) == anteriores | {enrolado}
+
+    assert central.activar_version_encodings("hog-large-j1")
+    vigentes = {fila[0] for fila in central.obtener_delta_galeria()[0]}
+    ruta = _sincronizar(central, kiosko, compartido)
+    assert _leer_metadatos(ruta)['completo']
+    assert _ids_kiosko(kiosko) == vigentes
+    assert vigentes and not vigentes & (anteriores | {enrolado})
+
+
+def test_kiosko_detecta_encodings_faltantes_y_reconstruye(central, kiosko, compartido):
+    estudiante = _estudiante(central, "10000005")
+    _encoding(central, estudiante)
+    _sincronizar(central, kiosko, compartido)
+
+    # El kiosco perdió un encoding que el servidor considera ya enviado
+    conn = kiosko._get_connection()
+    conn.execute("DELETE FROM encodings")
+    conn.commit()
+    conn.close()
+
+    sincronizacion = SincronizacionCentral(central, compartido)
+    _encoding(central, estudiante)
+    delta = sincronizacion.publicar_galeria()
+    assert not kiosko.aplicar_paquete(delta)
+    assert _ids_kiosko(kiosko) == set()
+
+    # La recepción reconstruye desde el último paquete completo
+    SincronizacionKiosko(kiosko, compartido).recibir_galeria()
+    assert _ids_kiosko(kiosko) == {fila[0] for fila in central.obtener_delta_galeria()[0]}